@@ -5,8 +5,15 @@ from django.contrib import admin
 from .models import Article, Authors, Affiliations, Authorship
 
 admin.site.register(Article)
-admin.site.register(Authors)
-admin.site.register(Affiliations)
-admin.site.register(Authorship)
 
 
+@admin.register(Authors, Affiliations)
+class NameAdmin(admin.ModelAdmin):
+    search_fields = ['name']
+
+
+@admin.register(Authorship)
+class AuthorshipAdmin(admin.ModelAdmin):
+    # Ids are typed instead of choosing them in select boxes listing the whole tables
+    raw_id_fields = ['article', 'author', 'affiliation']
+    list_select_related = ['article', 'author', 'affiliation']
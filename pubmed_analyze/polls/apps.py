@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class PollsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'polls'
+
+    def ready(self):
+        # Connects the signals invalidating the name cache, refreshing the articles view and indexing the articles
+        import polls.indexing.realtime
+        import polls.ingestion.denormalize
+        import polls.ingestion.interning
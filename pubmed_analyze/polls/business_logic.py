@@ -1,5 +1,6 @@
 
-import csv
+import contextlib
+from datetime import date
 import functools
 import os
 import re
@@ -7,19 +8,25 @@ import re
 import pandas as pd
 from elasticsearch_dsl import Search
 import numpy as np
-from sentence_transformers import CrossEncoder
 import requests
 from bs4 import BeautifulSoup
-import time
 from .utils import text_processing
-from .models import Article, ArticlesWithAuthors, model
+from .inference.backends import load_reranker
+from .models import RERANKER_MODEL, Article, model
 import json
 from pathlib import Path
-from .models import Authors, Affiliations, Article, Authorship
 from django.conf import settings
-from .utils import format_date, get_absolute_url, error_handling
+from .utils import error_handling
 from polls.es_config import INDEX_NAME
-from django.db import transaction
+from polls.scraping.fetcher import RateLimitedFetcher
+from polls.scraping.export import CsvWriter, JsonlWriter
+from polls.scraping.efetch import esearch_count, esearch_pmids, fetch_pubmed_articles
+from polls.scraping.parser import ArticlePageParser
+from polls.scraping.checkpoint import CrawlCheckpoint, pmid_from_url
+from polls.scraping.archive import PageArchive, replay_archive
+from polls.scraping.planner import CrawlPlanner, DateWindow, search_filter
+from polls.ingestion.denormalize import refresh_articles_with_authors
+from polls.ingestion.loader import ingest_inputs
 
 
 @error_handling
@@ -37,6 +44,10 @@ def init_soup(url, session):
     url : str
         The URL from which to fetch the content and initialize a
         BeautifulSoup object.
+    session : requests.Session or RateLimitedFetcher
+        The object used to perform the GET request. Passing a
+        RateLimitedFetcher makes the request count against the
+        scraper rate limit.
 
     Returns
     -------
@@ -53,14 +64,116 @@ def init_soup(url, session):
 
 
 @error_handling
-def extract_pubmed_url(base_url, term, filter, session):
+def fetch_page(url, session):
+    """
+    Downloads the raw HTML of a page.
+
+    Parameters
+    ----------
+    url : str
+        The URL of the page.
+    session : requests.Session or RateLimitedFetcher
+        The object used to perform the GET request.
+
+    Returns
+    -------
+    bytes or None
+        The body of the response if the status code is 200, otherwise None.
+    """
+
+    response = session.get(url)
+    if response.status_code == 200:
+        return response.content
+    return None
+
+
+def iter_result_pages(base_url, term, filter, session, checkpoint=None, failed=None):
+    """
+    Yields the article URLs of the PubMed search results, one result page at a time.
+
+    The first result page gives the number of pages. The other pages are then
+    fetched concurrently through `session.imap` when `session` is a
+    RateLimitedFetcher, so discovery proceeds at the rate budget instead of one
+    page per round trip; with a plain session they are fetched in sequence. Pages
+    are yielded in order as soon as they are read, and a URL already yielded by
+    a previous page is dropped, so the caller can start downloading articles
+    before discovery is over.
+
+    Parameters
+    ----------
+    base_url : str
+        The base URL of PubMed.
+    term : str
+        The search term to be used in the PubMed query.
+    filter : str
+        The filter to apply to the search: a publication year such as
+        "2025", or a PubMed filter such as "dates.2025/01/01-2025/01/31".
+    session : requests.Session or RateLimitedFetcher
+        The object used to fetch the result pages.
+    checkpoint : CrawlCheckpoint, optional
+        The crawl state. Result pages already recorded in it are not
+        downloaded again, and every new page is recorded as soon as it
+        has been read.
+    failed : list, optional
+        Receives the number of each result page which could not be read.
+
+    Yields
+    ------
+    list of str
+        The new article URLs of each result page.
+    """
+    url = base_url+"/"+"?term="+term+"&filter="+search_filter(filter)
+    first_soup = None
+    if checkpoint is not None and checkpoint.page_max is not None:
+        page_max = checkpoint.page_max
+    else:
+        first_soup = init_soup(url, session)
+        if first_soup is None:
+            if failed is not None:
+                failed.append(1)
+            return
+        page_max = int(first_soup.select_one('label.of-total-pages').get_text(strip=True).split(" ")[-1]) if first_soup.select_one('label.of-total-pages') else 1
+        if checkpoint is not None:
+            checkpoint.page_max = page_max
+
+    def read_page(page, session):
+        page_links = checkpoint.page_links(base_url, page) if checkpoint is not None else None
+        if page_links is not None:
+            return page_links, False
+        soup = first_soup if page == 1 and first_soup is not None else init_soup(url+"&page="+str(page), session)
+        if soup is None:
+            return None, False
+        page_links = []
+        for article in soup.select('div.search-results-chunk'):
+            page_links.extend([base_url+a['href'] for a in article.find_all('a', href=True)][:10])
+        return page_links, True
+
+    pages = range(1, page_max+1)
+    if isinstance(session, RateLimitedFetcher):
+        results = session.imap(read_page, pages)
+    else:
+        results = ((page, read_page(page, session)) for page in pages)
+    seen = set()
+    for page, (page_links, is_new) in results:
+        if page_links is None:
+            if failed is not None:
+                failed.append(page)
+            continue
+        if is_new and checkpoint is not None:
+            checkpoint.mark_page(page, page_links)
+        new_links = [link for link in dict.fromkeys(page_links) if link not in seen]
+        seen.update(new_links)
+        yield new_links
+
+
+@error_handling
+def extract_pubmed_url(base_url, term, filter, session, checkpoint=None):
     """
     Extracts PubMed article URLs based on a search term and filter.
 
-    This function constructs a search URL using the provided base URL,
-    search term, and filter, and then scrapes the PubMed search results
-    pages to extract article URLs. It iterates over all pages of the
-    search results if multiple pages are available.
+    This function collects every page yielded by `iter_result_pages`, for
+    callers that need the whole list of URLs at once. The scrapers consume
+    `iter_result_pages` directly to start downloading articles during discovery.
 
     Parameters
     ----------
@@ -71,33 +184,36 @@ def extract_pubmed_url(base_url, term, filter, session):
     filter : str
         The filter to apply to the search, typically indicating a date
         range or other criteria.
+    session : requests.Session or RateLimitedFetcher
+        The object used to fetch the result pages.
+    checkpoint : CrawlCheckpoint, optional
+        The crawl state, see `iter_result_pages`.
 
     Returns
     -------
     list of str
-        A list of URLs of the articles found in the search results.
+        A list of URLs of the articles found in the search results, without
+        duplicates.
     """
-
-    links = []
-    url = base_url+"/"+"?term="+term+"&filter=years."+filter+"-2025"
-    soup = init_soup(url, session)
-    page_max = int(soup.select_one('label.of-total-pages').get_text(strip=True).split(" ")[-1]) if soup.select_one('label.of-total-pages') else 1
-    for i in range(1, page_max+1, 1):
-        list_articles = soup.select('div.search-results-chunk')
-        for article in list_articles:
-            links.extend([base_url+a['href'] for a in article.find_all('a', href=True)][:10]) 
-        time.sleep(1)
-        soup = init_soup(url+"&page="+str(i), session)
-    return links
+    return [link for page_links in iter_result_pages(base_url, term, filter, session, checkpoint) for link in page_links]
 
 
 @error_handling
-def scrap_article_to_json(base_url='https://pubmed.ncbi.nlm.nih.gov', url=None, suffix_article=None):
+def scrap_article_to_json(base_url='https://pubmed.ncbi.nlm.nih.gov', url=None, suffix_article=None, term=""):
     """
-    Scrapes PubMed article details and saves them to a JSON file.
-
-    This function scrapes articles based on a search term and filter, and then
-    saves the scraped data to a JSON file. The scraped data includes the title
+    Scrapes PubMed article details and saves them to JSON Lines files.
+
+    This function crawls the articles published since the last crawl of the
+    term, as planned by a CrawlPlanner, and appends each scraped article as one
+    line of a JSONL file per date window, flushed in batches of
+    settings.SCRAPER_FLUSH_EVERY records. Article pages are downloaded
+    concurrently by a RateLimitedFetcher, so the crawl speed is bounded by
+    settings.SCRAPER_RATE_LIMIT rather than by the latency of each request. The
+    result pages are read concurrently too, and the article URLs of each page are
+    fed to the download stage as soon as the page is read. When
+    settings.SCRAPER_ARCHIVE_PAGES is set, the raw pages are also appended to a
+    PageArchive in settings.ARCHIVE_DIR so that `replay_archive_to_json` can
+    extract them again without the network. The scraped data includes the title
     of the review, date of publication, title of the article, abstract, PMID,
     DOI, conflict of interest statement, mesh terms, URL of the article, and
     authors with their affiliations.
@@ -108,297 +224,309 @@ def scrap_article_to_json(base_url='https://pubmed.ncbi.nlm.nih.gov', url=None,
         The base URL of PubMed. Defaults to 'https://pubmed.ncbi.nlm.nih.gov'.
     url : list of str, optional
         A list of URLs of articles to be scraped. If not provided, performs a
-        search based on the term and filter.
+        search based on the term, from its last crawl date to today.
     suffix_article : str, optional
-        A suffix to be appended to the JSON file name.
+        A suffix to be appended to the JSONL file names.
+    term : str, optional
+        The PubMed search term. Defaults to an empty term.
+
+    Returns
+    -------
+    None
+    """
+    scrap_articles(JsonlWriter, settings.EXPORT_JSON_DIR, ".jsonl", base_url, url, suffix_article, term)
+
+
+def scrap_articles(writer_class, output_dir, extension, base_url, url, suffix_article, term):
+    """
+    Runs the crawl shared by `scrap_article_to_json` and `scrap_article_to_csv`.
+
+    The date windows planned for the term are crawled one after the other, each
+    into its own export file named after the term and the window, e.g.
+    "_20250101-20250131.jsonl", with its own checkpoint. The last crawl date of
+    the term is only recorded once every window has been crawled without any
+    result page or article failing to download, so a failed run is planned
+    again, and resumed from its checkpoints, by the next one.
+    Explicit article URLs are written to a file named after the current year.
+
+    Parameters
+    ----------
+    writer_class : type
+        JsonlWriter or CsvWriter.
+    output_dir : str
+        The export directory.
+    extension : str
+        The extension of the export files.
+    base_url : str
+        The base URL of PubMed.
+    url : list of str or None
+        Article URLs to scrape instead of searching.
+    suffix_article : str or None
+        A suffix to be appended to the file names.
+    term : str
+        The PubMed search term.
 
     Returns
     -------
     None
     """
-    articles_data = []
-    term = ""
-    filter = "2025"
-    suffix = term+"_"+filter
     with requests.Session() as session:
+        fetcher = RateLimitedFetcher(session)
+        if url:
+            year = str(date.today().year)
+            scrap_window(fetcher, writer_class, output_dir, extension, base_url, term, year, year, suffix_article, url)
+            return
+        planner = CrawlPlanner(term)
+        crawl_date = date.today()
+        failures = 0
+        for window in planner.plan(fetcher, crawl_date):
+            failures += scrap_window(fetcher, writer_class, output_dir, extension, base_url, term,
+                                     window.search_filter, window.label, suffix_article)
+        if failures:
+            print(f"{failures} pages could not be downloaded, the crawl of '{term}' will be resumed by the next run", flush=True)
+            return
+        planner.mark_crawled(crawl_date)
+
+
+def scrap_window(fetcher, writer_class, output_dir, extension, base_url, term, filter, label, suffix_article=None, url=None):
+    """
+    Scrapes the articles of one search, or of a list of URLs, into one export file.
+
+    Parameters
+    ----------
+    fetcher : RateLimitedFetcher
+        The fetcher shared by the windows of the crawl.
+    writer_class : type
+        JsonlWriter or CsvWriter.
+    output_dir : str
+        The export directory.
+    extension : str
+        The extension of the export file.
+    base_url : str
+        The base URL of PubMed.
+    term : str
+        The PubMed search term.
+    filter : str
+        The search filter, see `iter_result_pages`.
+    label : str
+        The name of the window in the file names.
+    suffix_article : str, optional
+        A suffix to be appended to the file names.
+    url : list of str, optional
+        Article URLs to scrape instead of searching.
+
+    Returns
+    -------
+    int
+        The number of result pages and articles which could not be downloaded.
+    """
+    suffix = term+"_"+label
+    if suffix_article:
+        suffix += suffix_article
+    output_path = Path(output_dir) / (suffix + extension)
+    parser = ArticlePageParser()
+    checkpoint = CrawlCheckpoint(output_path.name)
+    archive = PageArchive(Path(settings.ARCHIVE_DIR) / (suffix + ".zst")) if settings.SCRAPER_ARCHIVE_PAGES else contextlib.nullcontext()
+    with writer_class(output_path, on_flush=checkpoint.save) as writer, archive:
+        failed = []
         if not url:
-            links = extract_pubmed_url(base_url, term, filter, session)
+            pages = iter_result_pages(base_url, term, filter, fetcher, checkpoint, failed)
         else:
-            links = url
-        if suffix_article:
-            suffix += suffix_article
-        for link in links:
-            soup = init_soup(link, session)
-            if soup is None:
+            pages = [url]
+        links = (link for page_links in pages for link in checkpoint.pending(page_links))
+        for link, content in fetcher.imap(fetch_page, links):
+            if content is None:
+                failed.append(link)
                 continue
-            abstract = soup.select('div.abstract-content p')
-            abstract = [p.get_text(strip=True) for p in abstract] if abstract else None
-            if abstract:
-                if isinstance(abstract, list):
-                    abstract = " ".join(abstract)
-                title_review = soup.select_one('button.journal-actions-trigger')['title'] if soup.select_one('button.journal-actions-trigger') else None
-                date = soup.select_one('span.cit').get_text(strip=True).split(";")[0] if soup.select_one('.cit') else None
-                date = format_date(date)
-                title = soup.select_one('h1.heading-title').get_text(strip=True) if soup.select_one('h1.heading-title') else None
-                pmid = soup.select_one('span.identifier.pubmed strong.current-id').get_text(strip=True) if soup.select_one('span.identifier.pubmed strong.current-id') else None
-                doi = soup.select_one('span.identifier.doi a.id-link').get_text(strip=True) if soup.select_one('span.identifier.doi a.id-link') else None
-                if doi:
-                    doi = "https://doi.org/"+doi
-                disclosure = soup.select_one('div.conflict-of-interest div.statement p').get_text(strip=True) if soup.select_one('div.conflict-of-interest div.statement p') else None
-                buttons = soup.select('button.keyword-actions-trigger')
-                mesh_terms = [button.get_text(strip=True) for button in buttons] if buttons else None
-                mesh_terms = ", ".join(mesh_terms) if mesh_terms else None
-                url = get_absolute_url(pmid)
-                authors_tags = soup.select('.authors-list-item')
-                authors_affiliations = []
-                seen_authors = set() 
-                for author_tag in authors_tags:
-                    author_name = author_tag.select_one('.full-name').get_text(strip=True) if author_tag.select_one('.full-name') else None
-                    if author_name and author_name not in seen_authors:
-                        seen_authors.add(author_name)
-                        affiliation_elements = author_tag.select('.affiliation-link')
-                        if affiliation_elements:
-                            affiliations_names = [affil.get('title', None) for affil in affiliation_elements]
-                            authors_affiliations.append({'author_name': author_name, 'affiliations': affiliations_names})
-                articles_data.append({
-                'title_review': title_review,
-                'date': str(date),  
-                'title': title,
-                'abstract': abstract,
-                'pmid': pmid,
-                'doi': doi,
-                'disclosure': disclosure,
-                'mesh_terms': mesh_terms,
-                'url': url,
-                'authors_affiliations': authors_affiliations
-            })
-                output_path = Path(settings.EXPORT_JSON_DIR + "/" + suffix + ".json")
-                with output_path.open('w', encoding='utf-8') as f:
-                    json.dump(articles_data, f, ensure_ascii=False, indent=4)
+            checkpoint.mark_fetched(link)
+            if settings.SCRAPER_ARCHIVE_PAGES:
+                archive.write(pmid_from_url(link), content)
+            record = parser.parse(content)
+            if record.abstract:
+                writer.write(record.to_dict())
+    return len(failed)
 
 
-def scrap_article_to_csv(base_url='https://pubmed.ncbi.nlm.nih.gov', url=None, suffix_article=None):
+@error_handling
+def replay_archive_to_json(term="", filter="2025", suffix_article=None):
     """
-    Scrapes PubMed article details and saves them to a CSV file.
+    Extracts the articles of a page archive again and rewrites the JSON Lines export.
 
-    This function scrapes articles based on a search term and filter, extracting
-    details such as the title of the review, publication date, article title, 
-    abstract, PMID, DOI, conflict of interest statement, mesh terms, URL, and 
-    authors with their affiliations. The extracted data is saved to a CSV file.
+    This function reads the raw pages archived by `scrap_article_to_json` and runs
+    the ArticlePageParser over them in settings.REPLAY_WORKERS processes, without
+    any request to PubMed. The export is written to a temporary file and then
+    replaces the previous one, so a fixed or extended extractor can be applied to
+    the whole corpus. Pages fetched while archiving was disabled are not in the
+    archive and are therefore dropped from the export.
 
     Parameters
     ----------
-    base_url : str, optional
-        The base URL of PubMed. Defaults to 'https://pubmed.ncbi.nlm.nih.gov'.
-    url : list of str, optional
-        A list of URLs of articles to be scraped. If not provided, performs a
-        search based on the term and filter.
+    term : str, optional
+        The search term of the archived crawl. Defaults to an empty term.
+    filter : str, optional
+        The label of the archived crawl, i.e. its date window such as
+        "20250101-20250131", or the year of a crawl of explicit URLs.
+        Defaults to "2025".
     suffix_article : str, optional
-        A suffix to be appended to the CSV file name.
+        The suffix of the archive and export file names.
 
     Returns
     -------
     None
     """
-
-    articles_data = []
-    term = ""
-    filter = "2025"
     suffix = term+"_"+filter
-    with requests.Session() as session:
-        if not url:
-            links = extract_pubmed_url(base_url, term, filter, session)
-        else:
-            links = url
-        if suffix_article:
-            suffix += suffix_article
-        for link in links:
-            soup = init_soup(link, session)
-            if soup is None:
-                continue
-            title_review = soup.select_one('button.journal-actions-trigger')['title'] if soup.select_one('button.journal-actions-trigger') else None
-            date = soup.select_one('span.cit').get_text(strip=True).split(";")[0] if soup.select_one('.cit') else None
-            date = format_date(date)
-            title = soup.select_one('h1.heading-title').get_text(strip=True) if soup.select_one('h1.heading-title') else None
-            abstract = soup.select('div.abstract-content p')
-            abstract = [p.get_text(strip=True) for p in abstract] if abstract else None
-            if abstract:
-                if isinstance(abstract, list):
-                    abstract = " ".join(abstract)
-                pmid = soup.select_one('span.identifier.pubmed strong.current-id').get_text(strip=True) if soup.select_one('span.identifier.pubmed strong.current-id') else None
-                doi = soup.select_one('span.identifier.doi a.id-link').get_text(strip=True) if soup.select_one('span.identifier.doi a.id-link') else None
-                if doi:
-                    doi = "https://doi.org/"+doi
-                disclosure = soup.select_one('div.conflict-of-interest div.statement p').get_text(strip=True) if soup.select_one('div.conflict-of-interest div.statement p') else None
-                buttons = soup.select('button.keyword-actions-trigger')
-                mesh_terms = [button.get_text(strip=True) for button in buttons] if buttons else None
-                mesh_terms = ", ".join(mesh_terms) if mesh_terms else None
-                url = get_absolute_url(pmid)
-                authors_tags = soup.select('.authors-list-item')
-                authors_affiliations = []
-                seen_authors = set() 
-                for author_tag in authors_tags:
-                    author_name = author_tag.select_one('.full-name').get_text(strip=True) if author_tag.select_one('.full-name') else None
-                    if author_name and author_name not in seen_authors:
-                        seen_authors.add(author_name)
-                        affiliation_elements = author_tag.select('.affiliation-link')
-                        if affiliation_elements:
-                            affiliations_names = [affil.get('title', None) for affil in affiliation_elements]
-                            authors_affiliations.append({'author_name': author_name, 'affiliations': affiliations_names})
-                articles_data.append({
-                'title_review': title_review,
-                'date': str(date),  
-                'title': title,
-                'abstract': abstract,
-                'pmid': pmid,
-                'doi': doi,
-                'disclosure': disclosure,
-                'mesh_terms': mesh_terms,
-                'url': url,
-                'authors_affiliations': authors_affiliations
-            })
-                output_path = Path(settings.EXPORT_CSV_DIR + "/" + suffix + ".csv")
-                with output_path.open('w', newline='', encoding='utf-8') as csvfile:
-                    fieldnames = ['title_review', 'date', 'title', 'abstract', 'pmid', 'doi', 'disclosure', 'mesh_terms', 'url', 'authors_affiliations']
-                    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                    writer.writeheader()
-                    for article in articles_data:
-                        writer.writerow(article)
+    if suffix_article:
+        suffix += suffix_article
+    replay_archive_file(Path(settings.ARCHIVE_DIR) / (suffix + ".zst"))
 
 
-@error_handling
-def article_json_to_database(): 
+def replay_archives_to_json():
     """
-    Read JSON files of articles scraped from PubMed and save them to the database
-    
-    This function reads JSON files that were created by the article_scraper function, 
-    and save the articles to the database. 
+    Replays every page archive of settings.ARCHIVE_DIR into its JSON Lines export.
 
-    The function is decorated with the @error_handling decorator, so it will log
-    and email the error if there is one.
+    Each archive, e.g. "multiple sclerosis_20250101-20250131.zst" for one date
+    window of a crawl, rewrites the export of the same name with
+    `replay_archive_file`.
 
-    The JSON files are located in the EXPORT_JSON_DIR directory, and are named 
-    after the term and filter used to search PubMed (e.g. "multiple_sclerosis_2024.json").
+    Returns
+    -------
+    list of Path
+        The archives replayed, empty if there is none.
+    """
+    archives = sorted(Path(settings.ARCHIVE_DIR).glob("*.zst"))
+    for archive_path in archives:
+        replay_archive_file(archive_path)
+    return archives
 
-    The function creates an Article instance for each article in the JSON file, 
-    and saves it to the database. It also creates Author and Affiliation instances 
-    as needed, and creates Authorship instances to link authors to their affiliations.
 
-    The function does not create duplicate articles if they already exist in the database.
+def replay_archive_file(archive_path):
+    """
+    Extracts the articles of one page archive and replaces the JSON Lines export of the same name.
 
-    The function does not create duplicate authors, affiliations or authorships if they already exist in the database.
+    Parameters
+    ----------
+    archive_path : Path
+        The archive, in settings.ARCHIVE_DIR.
 
-    The function is meant to be called as a management command, and should be called once
-    after the article_scraper function has finished.
+    Raises
+    ------
+    FileNotFoundError
+        If the archive does not exist.
+    """
+    if not archive_path.exists():
+        raise FileNotFoundError(archive_path)
+    output_path = Path(settings.EXPORT_JSON_DIR) / (archive_path.stem + ".jsonl")
+    tmp_path = output_path.with_suffix('.replay')
+    tmp_path.unlink(missing_ok=True)
+    with JsonlWriter(tmp_path) as writer:
+        for record in replay_archive(archive_path):
+            writer.write(record)
+    os.replace(tmp_path, output_path)
 
-    Decorator:
 
-    @error_handling: Captures and manages errors during execution.
-    Models Used:
+@error_handling
+def efetch_article_to_json(term="", filter="2025", pmids=None, suffix_article=None):
+    """
+    Downloads PubMed articles through the E-utilities and saves them to a JSON Lines file.
 
-    Article: Stores metadata for articles.
-    Authors: Stores information about authors.
-    Affiliations: Stores information about affiliations.
-    Authorship: Establishes relationships between articles, authors, and their affiliations.
+    This function is an alternative to `scrap_article_to_json` that does not render
+    one HTML page per article: the PMIDs are listed with esearch, then downloaded with
+    efetch in batches of settings.EFETCH_BATCH_SIZE and parsed with a streaming
+    iterparse. esearch lists at most settings.ESEARCH_MAX_RESULTS PMIDs, so the year
+    is first split into date windows under that cap, counted with `esearch_count`.
+    The records have the same schema as the scraped ones and are appended to the
+    same JSONL file, so they go through the same ingestion step. PMIDs already
+    fetched by a previous run or already stored in `Article` are skipped.
 
-    The function does not return anything.
+    Parameters
+    ----------
+    term : str, optional
+        The PubMed query. Defaults to an empty term.
+    filter : str, optional
+        The publication year to download. Defaults to "2025".
+    pmids : list of str, optional
+        The PMIDs to download. If not provided, performs a search based on the
+        term and filter.
+    suffix_article : str, optional
+        A suffix to be appended to the JSONL file name.
 
+    Returns
+    -------
+    None
+    """
+    suffix = term+"_"+filter
+    if suffix_article:
+        suffix += suffix_article
+    output_path = Path(settings.EXPORT_JSON_DIR + "/" + suffix + ".jsonl")
+    checkpoint = CrawlCheckpoint(output_path.name)
+    with requests.Session() as session, JsonlWriter(output_path, on_flush=checkpoint.save) as writer:
+        fetcher = RateLimitedFetcher(session)
+        if not pmids:
+            year = int(filter)
+            windows = CrawlPlanner(term).split_window(
+                DateWindow(date(year, 1, 1), date(year, 12, 31)),
+                lambda window: esearch_count(term, *window.esearch_dates, fetcher), settings.ESEARCH_MAX_RESULTS)
+            pmids = [pmid for window in windows for pmid in esearch_pmids(term, *window.esearch_dates, fetcher)]
+        for record in fetch_pubmed_articles(checkpoint.pending(pmids), fetcher):
+            checkpoint.mark_fetched(record['pmid'])
+            writer.write(record)
+
+
+def scrap_article_to_csv(base_url='https://pubmed.ncbi.nlm.nih.gov', url=None, suffix_article=None, term=""):
     """
-    existing_articles = {article.pmid: article for article in Article.objects.all()}
-    existing_authors = {author.name: author for author in Authors.objects.all()}
-    existing_affiliations = {affiliation.name: affiliation for affiliation in Affiliations.objects.all()}
-    new_articles = []
-    new_authors = []
-    new_affiliations = []
-    new_autorship = []
-    article_in_json = set()
-    author_in_json = set()
-    affiliation_in_json = set()
-    term_list = ["multiple_sclerosis", "herpes_zoster"]
-    filter = "2024"
-    for term in term_list:
-        output_path = Path(settings.EXPORT_JSON_DIR + "/" + term + "_" + filter + ".json")
-        with output_path.open('r', encoding='utf-8') as f:
-            articles = json.load(f)
-            for article in articles:
-                date = article.get('date', "")
-                if date.lower() in ["none", "", "null"]:
-                    date = None
-                pmid = article.get('pmid', "")
-                authors_affiliations = article.get('authors_affiliations', "")
-                if pmid not in existing_articles and pmid not in article_in_json:
-                    new_articles.append(Article(title=article.get('title', ""), 
-                                abstract=article.get('abstract', ""),
-                                date=date, url=article.get('url', ""),
-                                pmid=article.get('pmid', ""), doi=article.get('doi', ""),
-                                mesh_terms=article.get('mesh_terms', ""),
-                                disclosure=article.get('disclosure', ""),
-                                title_review=article.get('title_review', ""),
-                                term=term + "_" + filter))
-                    article_in_json.add(pmid)
-                for author_affiliation in authors_affiliations:
-                    author_name = author_affiliation.get('author_name', "")
-                    author_name_obj = Authors(name=author_name)
-                    if author_name not in existing_authors and author_name not in author_in_json:
-                        new_authors.append(author_name_obj)
-                        author_in_json.add(author_name)
-                    affiliations = author_affiliation.get('affiliations', "")
-                    for affiliation in affiliations:
-                        affiliation_obj = Affiliations(name=affiliation)
-                        if affiliation not in existing_affiliations and affiliation not in affiliation_in_json:
-                            new_affiliations.append(affiliation_obj)
-                            affiliation_in_json.add(affiliation)
-    with transaction.atomic():
-        if new_articles:
-            Article.objects.bulk_create(new_articles)
-            existing_articles.update({article.pmid: article for article in Article.objects.all()})
-        if new_authors:
-            Authors.objects.bulk_create(new_authors)
-            existing_authors.update({author.name: author for author in Authors.objects.all()})
-        if new_affiliations:
-            Affiliations.objects.bulk_create(new_affiliations) 
-            existing_affiliations.update({affiliation.name: affiliation for affiliation in Affiliations.objects.all()})
-    for term in term_list:
-        output_path = Path(settings.EXPORT_JSON_DIR + "/" + term + "_" + filter + ".json")
-        with output_path.open('r', encoding='utf-8') as f:
-            articles = json.load(f)
-            for article in articles:
-                pmid = article.get('pmid')
-                authors_affiliations = article.get('authors_affiliations', "")
-                article_obj = existing_articles.get(int(pmid))
-                for author_affiliation in authors_affiliations:
-                    author_name = author_affiliation.get('author_name', "")
-                    affiliations = author_affiliation.get('affiliations', "")
-                    author_name_obj = existing_authors.get(author_name)
-                    for affiliation in affiliations:
-                        affiliation_obj = existing_affiliations.get(affiliation)
-                        new_autorship.append(Authorship(article=article_obj, author=author_name_obj, affiliation=affiliation_obj))
-    with transaction.atomic():
-        if new_autorship:
-            Authorship.objects.bulk_create(new_autorship, ignore_conflicts=True)
+    Scrapes PubMed article details and saves them to CSV files.
+
+    This function scrapes articles based on a search term and filter, extracting
+    details such as the title of the review, publication date, article title, 
+    abstract, PMID, DOI, conflict of interest statement, mesh terms, URL, and 
+    authors with their affiliations. Each article is appended to the CSV file as
+    a single row, with its authors and affiliations encoded as a JSON string.
+    Article pages are downloaded concurrently by a RateLimitedFetcher and parsed
+    by the same ArticlePageParser as `scrap_article_to_json`. The crawl is
+    planned by date window, checkpointed, resumed and archived in the same way.
+
+    Parameters
+    ----------
+    base_url : str, optional
+        The base URL of PubMed. Defaults to 'https://pubmed.ncbi.nlm.nih.gov'.
+    url : list of str, optional
+        A list of URLs of articles to be scraped. If not provided, performs a
+        search based on the term, from its last crawl date to today.
+    suffix_article : str, optional
+        A suffix to be appended to the CSV file names.
+    term : str, optional
+        The PubMed search term. Defaults to an empty term.
+
+    Returns
+    -------
+    None
+    """
+    scrap_articles(CsvWriter, settings.EXPORT_CSV_DIR, ".csv", base_url, url, suffix_article, term)
 
 
 @error_handling
-def article_csv_to_database(): 
+def articles_to_database(patterns=None, terms=None, batch_size=None, progress=print, workers=None):
     """
-    Read JSON files of articles scraped from PubMed and save them to the database
-    
-    This function reads CSV files that were created by the article_scraper function, 
-    and save the articles to the database. 
+    Read the exports of articles scraped from PubMed and save them to the database
+
+    This function finds the export files of every term with the input globs, whatever
+    their format (JSON, JSONL, CSV or Parquet), and saves their articles to the database.
+    The globs are relative to settings.INGEST_INPUT_DIR and "{term}" is replaced by the
+    term, e.g. "json/{term}.jsonl" for "multiple_sclerosis_2024"; for each term the first
+    glob matching files is used, so JSONL exports are preferred to legacy JSON arrays.
 
     The function is decorated with the @error_handling decorator, so it will log
     and email the error if there is one.
 
-    The JSON files are located in the EXPORT_CSV_DIR directory, and are named 
-    after the term and filter used to search PubMed (e.g. "multiple_sclerosis_2024.json").
+    The records are streamed by the reader of their format, normalized to the same
+    schema, and saved by batches of batch_size articles with `ingest_records`: each
+    batch upserts its articles, authors, affiliations and authorships in its own
+    transaction, so memory does not grow with the size of the exports and an
+    interrupted import keeps the committed batches.
 
-    The function creates an Article instance for each article in the JSON file, 
-    and saves it to the database. It also creates Author and Affiliation instances 
-    as needed, and creates Authorship instances to link authors to their affiliations.
-
-    The function does not create duplicate articles if they already exist in the database.
-
-    The function does not create duplicate authors, affiliations or authorships if they already exist in the database.
+    The function does not create duplicate articles, authors, affiliations or authorships
+    if they already exist in the database. The ArticlesWithAuthors view is refreshed once
+    every file has been imported.
 
     The function is meant to be called as a management command, and should be called once
     after the article_scraper function has finished.
@@ -413,99 +541,58 @@ def article_csv_to_database():
     Affiliations: Stores information about affiliations.
     Authorship: Establishes relationships between articles, authors, and their affiliations.
 
+    Parameters
+    ----------
+    patterns : list of str, optional
+        The input globs, by order of preference. Defaults to settings.INGEST_PATTERNS.
+    terms : list of str, optional
+        The terms to import. Defaults to settings.INGEST_TERMS.
+    batch_size : int, optional
+        Number of articles per transaction. Defaults to settings.INGEST_BATCH_SIZE.
+    progress : callable, optional
+        Called with a progress and throughput message after each batch.
+        Defaults to print.
+    workers : int, optional
+        Number of processes sharing the files. Defaults to settings.INGEST_WORKERS.
+
     The function does not return anything.
 
     """
-    existing_articles = {article.pmid: article for article in Article.objects.all()}
-    existing_authors = {author.name: author for author in Authors.objects.all()}
-    existing_affiliations = {affiliation.name: affiliation for affiliation in Affiliations.objects.all()}
-    new_articles = []
-    new_authors = []
-    new_affiliations = []
-    new_autorship = []
-    article_in_json = set()
-    author_in_json = set()
-    affiliation_in_json = set()
-    term_list = ["multiple_sclerosis", "herpes_zoster"]
-    filter = "2024"
-    for term in term_list:
-        output_path = Path(settings.EXPORT_CSV_DIR + "/" + term + "_" + filter + ".csv")
-        with output_path.open('r', encoding='utf-8') as f:
-            articles = csv.DictReader(f)
-            for article in articles:
-                title = article.get('title', "")
-                abstract = article.get('abstract', "")
-                date = article.get('date', "")
-                if date == "None":
-                    date = None
-                url = article.get('url', "")
-                pmid = article.get('pmid', "")
-                doi = article.get('doi', "")
-                mesh_terms = article.get('mesh_terms', "")
-                disclosure = article.get('disclosure', "")
-                title_review = article.get('title_review', "")
-                authors_affiliations = article.get('authors_affiliations', "")
-                article_obj = Article(title=title, 
-                                    abstract=abstract, 
-                                    date=date, url=url, 
-                                    pmid=pmid, doi=doi, 
-                                    mesh_terms=mesh_terms, 
-                                    disclosure=disclosure, 
-                                    title_review=title_review, 
-                                    term=term + "_" + filter)
-                if pmid not in existing_articles and pmid not in article_in_json:
-                    new_articles.append(article_obj)
-                    article_in_json.add(pmid)
-                for author_affiliation in authors_affiliations:
-                    author_name = author_affiliation.get('author_name', "")
-                    author_name_obj = Authors(name=author_name)
-                    if author_name not in existing_authors and author_name not in author_in_json:
-                        new_authors.append(author_name_obj)
-                        author_in_json.add(author_name)
-                    affiliations = author_affiliation.get('affiliations', "")
-                    for affiliation in affiliations:
-                        affiliation_obj = Affiliations(name=affiliation)
-                        if affiliation not in existing_affiliations and affiliation not in affiliation_in_json:
-                            new_affiliations.append(affiliation_obj)
-                            affiliation_in_json.add(affiliation)
-    with transaction.atomic():
-        if new_articles:
-            Article.objects.bulk_create(new_articles)
-            existing_articles.update({article.pmid: article for article in Article.objects.all()})
-        if new_authors:
-            Authors.objects.bulk_create(new_authors)
-            existing_authors.update({author.name: author for author in Authors.objects.all()})
-        if new_affiliations:
-            Affiliations.objects.bulk_create(new_affiliations) 
-            existing_affiliations.update({affiliation.name: affiliation for affiliation in Affiliations.objects.all()})
-    for term in term_list:
-        output_path = Path(settings.EXPORT_CSV_DIR + "/" + term + "_" + filter + ".csv")
-        with output_path.open('r', encoding='utf-8') as f:
-            articles = csv.DictReader(f)
-            for article in articles:
-                pmid = article.get('pmid')
-                authors_affiliations = article.get('authors_affiliations', "")
-                article_obj = existing_articles.get(int(pmid))
-                for author_affiliation in authors_affiliations:
-                    author_name = author_affiliation.get('author_name', "")
-                    affiliations = author_affiliation.get('affiliations', "")
-                    author_name_obj = existing_authors.get(author_name)
-                    for affiliation in affiliations:
-                        affiliation_obj = existing_affiliations.get(affiliation)
-                        new_autorship.append(Authorship(article=article_obj, author=author_name_obj, affiliation=affiliation_obj))
-    with transaction.atomic():
-        if new_autorship:
-            Authorship.objects.bulk_create(new_autorship, ignore_conflicts=True)        
+    ingest_inputs(patterns, terms, batch_size, progress, workers=workers)
+    articles_full_to_database()
+
+
+def article_json_to_database(batch_size=None, progress=print):
+    """
+    Saves the JSON and JSONL exports of the configured terms to the database.
+
+    Runs `articles_to_database` with the JSON and JSONL globs of settings.INGEST_PATTERNS.
+    """
+    patterns = [pattern for pattern in settings.INGEST_PATTERNS if Path(pattern).suffix in ['.json', '.jsonl']]
+    articles_to_database(patterns, batch_size=batch_size, progress=progress)
+
+
+def article_csv_to_database(batch_size=None, progress=print):
+    """
+    Saves the CSV exports of the configured terms to the database.
+
+    Runs `articles_to_database` with the CSV globs of settings.INGEST_PATTERNS.
+    """
+    patterns = [pattern for pattern in settings.INGEST_PATTERNS if Path(pattern).suffix == '.csv']
+    articles_to_database(patterns, batch_size=batch_size, progress=progress)
 
 
 def articles_full_to_database():
     """
-    Reads the Article, Author and Affiliation models from the database, and for each article
-    creates an ArticlesWithAuthors instance, which contains all the article metadata as well
-    as the affiliations of the authors. This function is meant to be called once after the
-    article_csv_to_database function has finished.
+    Refreshes the ArticlesWithAuthors materialized view, which contains all the article
+    metadata as well as the affiliations of the authors of every article. This function is
+    called after articles_to_database, and can be run on a schedule when the refreshes
+    triggered by the writes are disabled with settings.ARTICLES_REFRESH_DELAY.
 
-    The function does not create duplicate articles if they already exist in the database.
+    The rows are built by PostgreSQL from the Article, Authors, Affiliations and Authorship
+    tables, aggregating the authorships with jsonb_object_agg, and the view is refreshed
+    concurrently, so the article list can still be read during the refresh. Each row has
+    the id of its article.
 
     The function does not return anything.
 
@@ -515,38 +602,10 @@ def articles_full_to_database():
     Authors: Stores information about authors.
     Affiliations: Stores information about affiliations.
     Authorship: Establishes relationships between articles, authors, and their affiliations.
-    ArticlesWithAuthors: A model that contains all the article metadata as well as the affiliations
-                         of the authors.
-
-    Decorator:
-
-    @error_handling: Captures and manages errors during execution.
+    ArticlesWithAuthors: A materialized view that contains all the article metadata as well
+                         as the affiliations of the authors.
     """
-    existing_articles_wiht_authors = {article.doi: article for article in ArticlesWithAuthors.objects.all()}
-    new_articles_with_authors = []
-    articles_in_dict = set()
-    articles = Article.objects.prefetch_related('authorships__author', 'authorships__affiliation').order_by('id')
-    for article in articles:
-        affiliations_by_author = {}
-        for authorship in article.authorships.all():
-            author_name = authorship.author.name
-            affiliation_name = authorship.affiliation.name    
-            affiliations_by_author.setdefault(author_name, set()).add(affiliation_name)
-        article.affiliations_by_author = {author: list(affs) for author, affs in affiliations_by_author.items()}
-        if article.doi not in existing_articles_wiht_authors and article.doi not in articles_in_dict:
-            new_articles_with_authors.append(ArticlesWithAuthors(title=article.title, 
-                                                                abstract=article.abstract, 
-                                                                date=article.date, url=article.url, 
-                                                                pmid=article.pmid, doi=article.doi, 
-                                                                mesh_terms=article.mesh_terms, 
-                                                                disclosure=article.disclosure, 
-                                                                title_review=article.title_review, 
-                                                                term=article.term, 
-                                                                affiliations_by_author=article.affiliations_by_author))
-            articles_in_dict.add(article.doi)
-    with transaction.atomic():
-        if new_articles_with_authors:
-            ArticlesWithAuthors.objects.bulk_create(new_articles_with_authors)
+    refresh_articles_with_authors()
 
 
 @error_handling
@@ -723,7 +782,8 @@ def rank_doc(query, retrieved_docs, topN):
     This function takes a query string and a list of retrieved medical documents and returns
     the topN most relevant documents based on their relevance to the query. The relevance is
     determined by a cross-encoder model that takes the query and the title + abstract of
-    each document as input and outputs a relevance score.
+    each document as input and outputs a relevance score. The cross-encoder is loaded once
+    per process by load_reranker, with the backend of settings.INFERENCE_BACKEND.
 
     Parameters:
     query (str): The query string to be answered.
@@ -736,7 +796,7 @@ def rank_doc(query, retrieved_docs, topN):
           'title', 'abstract', 'id', and 'score' keys.
     """
     text = [{"id":hit.meta.id, "title":hit.title, "abstract":hit.abstract} for hit in retrieved_docs]
-    reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+    reranker = load_reranker(RERANKER_MODEL)
     scores = reranker.predict([[query, doc["title"] + " " + doc["abstract"]] for doc in text])
     scores = [float(score) for score in scores]
     top_indices = np.argsort(scores)[::-1][:topN]
@@ -5,6 +5,7 @@ from .models import Authors, Affiliations, Article, Authorship
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
 from django.db import transaction
+from polls.ingestion.loader import resolve_names
 
 
 class ArticleForm(forms.ModelForm):
@@ -67,7 +68,8 @@ class ArticleForm(forms.ModelForm):
         data. If an article ID is given, it attempts to update the existing article;
         otherwise, it creates a new one. It also handles the creation of Author and
         Affiliation instances if they do not already exist, and links them to the article
-        through the Authorship model.
+        through the Authorship model. The ids of the author and affiliation names are
+        resolved through the name cache, so only the names missing from it are queried.
 
         :param author_affiliation_data: A list of dictionaries containing author names and their
                                         affiliations, where each dictionary has the keys 'author_name'
@@ -91,42 +93,17 @@ class ArticleForm(forms.ModelForm):
                 current_value = getattr(article_initial, field, None)
                 if current_value != new_value:
                     updated_fields = True
-        existing_authors = {author.name: author for author in Authors.objects.all()}
-        existing_affiliations = {affiliation.name: affiliation for affiliation in Affiliations.objects.all()}
-        new_authors = []
-        new_affiliations = []
-        new_autorship = []
-        author_in_form = set()
-        affiliation_in_form = set()
-        for author_data in author_affiliation_data:
-            author_name = author_data.get('author_name')
-            author_name_obj = Authors(name=author_name)
-            if author_name not in existing_authors and author_name not in author_in_form:
-                new_authors.append(author_name_obj)
-                author_in_form.add(author_name)
-            affiliations = author_data.get('affiliations')
-            for affiliation in affiliations.split('|'):
-                affiliation_obj = Affiliations(name=affiliation)
-                if affiliation not in existing_affiliations and affiliation not in affiliation_in_form:
-                    new_affiliations.append(affiliation_obj)
-                    affiliation_in_form.add(affiliation)
+        authorships = [(author_data.get('author_name'), affiliation)
+                       for author_data in author_affiliation_data
+                       for affiliation in author_data.get('affiliations').split('|')]
         with transaction.atomic():
-            if new_authors:
-                Authors.objects.bulk_create(new_authors)
-                existing_authors.update({author.name: author for author in Authors.objects.all()})
-            if new_affiliations:
-                Affiliations.objects.bulk_create(new_affiliations)
-                existing_affiliations.update({affiliation.name: affiliation for affiliation in Affiliations.objects.all()})
-        for author_data in author_affiliation_data:
-            author_name = author_data.get('author_name')
-            affiliations = author_data.get('affiliations')
-            author_name_obj = existing_authors.get(author_name)
-            for affiliation in affiliations.split('|'):
-                affiliation_obj = existing_affiliations.get(affiliation)
-                new_autorship.append(Authorship(article=article_obj, author=author_name_obj, affiliation=affiliation_obj))
-        with transaction.atomic():
-            if new_autorship:
-                Authorship.objects.bulk_create(new_autorship)
+            author_ids = resolve_names(Authors, (author_name for author_name, _ in authorships))
+            affiliation_ids = resolve_names(Affiliations, (affiliation for _, affiliation in authorships))
+            Authorship.objects.bulk_create([Authorship(article=article_obj,
+                                                       author_id=author_ids[author_name],
+                                                       affiliation_id=affiliation_ids[affiliation])
+                                            for author_name, affiliation in authorships],
+                                           ignore_conflicts=True)
         return created, updated_fields
 
 
@@ -0,0 +1,167 @@
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from elasticsearch.helpers import parallel_bulk
+from elasticsearch_dsl.connections import get_connection
+
+from polls.documents import article_index
+from polls.es_config import INDEX_NAME
+from polls.ingestion.records import batched
+from polls.indexing.embeddings import ShardedEncoder, encode_texts
+from polls.models import Article
+
+
+def indexed_articles():
+    """
+    Returns the articles to index: every article except the near-duplicates of another one.
+    """
+    return Article.objects.filter(duplicate_of__isnull=True).only('id', 'title', 'abstract').order_by('id')
+
+
+def encode_articles(articles, batch_size=None):
+    """
+    Returns the title-abstract vectors of articles, only encoding those missing from the embedding store.
+
+    The articles whose title and abstract did not change since they were last
+    encoded get their stored vector, and the others are encoded by a single
+    `model.encode` call, with `encode_texts`.
+
+    Parameters
+    ----------
+    articles : list of Article
+        The articles to encode.
+    batch_size : int, optional
+        Number of texts per forward pass of the model. Defaults to settings.INDEX_ENCODE_BATCH_SIZE.
+
+    Returns
+    -------
+    numpy.ndarray
+        One row per article.
+    """
+    return encode_texts([article.embedding_text() for article in articles], batch_size)
+
+
+def article_action(article, vector, index):
+    """
+    Returns the bulk action indexing an article with its vector, as a document of ArticleDocument.
+    """
+    return {'_op_type': 'index',
+            '_index': index,
+            '_id': article.id,
+            '_source': {'title': article.title,
+                        'abstract': article.abstract,
+                        'title_abstract_vector': vector.tolist()}}
+
+
+def article_actions(articles, index, chunk_size=None, batch_size=None, workers=None):
+    """
+    Yields the bulk index actions of the articles, encoding them chunk by chunk.
+
+    The articles are read from the database with a server-side cursor by chunks
+    of `chunk_size`, and each chunk is encoded with `encode_articles`, so memory
+    only depends on the chunk size. With several workers, the chunks are encoded
+    by the processes of a ShardedEncoder while the next ones are read, and the
+    actions are still yielded in the order of the articles.
+
+    Parameters
+    ----------
+    articles : QuerySet
+        The articles to index.
+    index : str
+        The Elasticsearch index.
+    chunk_size : int, optional
+        Number of articles read and encoded at once. Defaults to settings.INDEX_CHUNK_SIZE.
+    batch_size : int, optional
+        Passed to `encode_articles`.
+    workers : int, optional
+        Number of encoding processes. Defaults to settings.INDEX_WORKERS.
+
+    Yields
+    ------
+    dict
+        The action of `article_action` for each article.
+    """
+    chunk_size = chunk_size or settings.INDEX_CHUNK_SIZE
+    workers = workers or settings.INDEX_WORKERS
+    chunks = batched(articles.iterator(chunk_size=chunk_size), chunk_size)
+    if workers <= 1:
+        for chunk in chunks:
+            for article, vector in zip(chunk, encode_articles(chunk, batch_size)):
+                yield article_action(article, vector, index)
+        return
+    with ShardedEncoder(workers, batch_size=batch_size) as encoder:
+        for chunk, vectors in encoder.map((chunk, [article.embedding_text() for article in chunk]) for chunk in chunks):
+            for article, vector in zip(chunk, vectors):
+                yield article_action(article, vector, index)
+
+
+@contextmanager
+def refresh_disabled(client, index):
+    """
+    Disables the periodic refresh of an index during a bulk load, restoring it on exit.
+
+    Without refreshes, Elasticsearch does not create a new segment every second
+    during the load; the previous refresh intervals are restored and the index is
+    refreshed once on exit, even if the load failed, so the documents become
+    searchable at once.
+    """
+    previous = {name: index_settings['settings']['index'].get('refresh_interval')
+                for name, index_settings in client.indices.get_settings(index=index).items()}
+    client.indices.put_settings(index=index, settings={'index': {'refresh_interval': "-1"}})
+    try:
+        yield
+    finally:
+        for name, interval in previous.items():
+            client.indices.put_settings(index=name, settings={'index': {'refresh_interval': interval}})
+        client.indices.refresh(index=index)
+
+
+def bulk_index_articles(articles=None, index=INDEX_NAME, chunk_size=None, batch_size=None, threads=None, progress=None, workers=None):
+    """
+    Encodes articles and indexes them in Elasticsearch through the bulk API.
+
+    The actions of `article_actions` are sent by `parallel_bulk`: the main
+    thread reads and encodes the next chunk of articles while a pool of threads
+    sends the bulk requests of the previous ones. The index is created with the
+    mapping of ArticleDocument if it does not exist, and its refresh is disabled
+    during the load with `refresh_disabled`.
+
+    Parameters
+    ----------
+    articles : QuerySet, optional
+        The articles to index. Defaults to `indexed_articles()`.
+    index : str, optional
+        The Elasticsearch index. Defaults to INDEX_NAME.
+    chunk_size, batch_size, workers
+        Passed to `article_actions`.
+    threads : int, optional
+        Number of threads sending the bulk requests. Defaults to settings.INDEX_BULK_THREADS.
+    progress : callable, optional
+        Called with a progress message after every chunk of settings.INDEX_CHUNK_SIZE documents.
+
+    Returns
+    -------
+    int
+        The number of articles indexed.
+
+    Raises
+    ------
+    elasticsearch.helpers.BulkIndexError
+        If documents were rejected by Elasticsearch.
+    """
+    client = get_connection()
+    if not client.indices.exists(index=index):
+        article_index.clone(index).create(using=client)
+    articles = indexed_articles() if articles is None else articles
+    report_every = chunk_size or settings.INDEX_CHUNK_SIZE
+    start = time.perf_counter()
+    indexed = 0
+    with refresh_disabled(client, index):
+        for ok, _ in parallel_bulk(client, article_actions(articles, index, chunk_size, batch_size, workers),
+                                   thread_count=threads or settings.INDEX_BULK_THREADS,
+                                   chunk_size=settings.INDEX_BULK_CHUNK_SIZE):
+            indexed += ok
+            if progress and indexed % report_every == 0:
+                progress(f"{indexed} articles indexed ({indexed / (time.perf_counter() - start):.0f} articles/s)")
+    return indexed
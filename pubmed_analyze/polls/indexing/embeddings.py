@@ -0,0 +1,313 @@
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from polls.indexing.workers import encode_chunk, init_encoder_worker
+from polls.models import EMBEDDING_MODEL, model
+
+# Rows allocated when the vector file of a store is created
+INITIAL_ROWS = 1024
+
+
+class EmbeddingStore:
+    """
+    Persistent embeddings of one model, keyed by the hash of the encoded text.
+
+    The vectors are rows of a float32 matrix memory-mapped from `vectors.f32`, so
+    opening a store reads no vector and only the rows used are paged in. The
+    16-byte blake2b hash of the text of each row is appended to `keys.bin` in row
+    order, and loaded in a dict mapping the hashes to their rows. A row is only
+    referenced once its vector is written, so an interrupted write loses the new
+    vectors and never corrupts the store. When full, the matrix doubles its rows.
+
+    A text edited in the database gets a new hash and is encoded again, and the
+    vectors of the same text are shared between articles. Access is serialized by
+    a lock, so a store can be shared by threads, but only one process should
+    write to a store at a time.
+
+    Parameters
+    ----------
+    directory : str or Path
+        The directory of the stores; each model has its own subdirectory.
+    model_name : str
+        The name of the model whose vectors are stored, e.g. from `store_name`.
+    """
+
+    def __init__(self, directory, model_name):
+        self.model_name = model_name
+        self.directory = Path(directory) / model_name.replace("/", "--")
+        self.keys_path = self.directory / "keys.bin"
+        self.vectors_path = self.directory / "vectors.f32"
+        self.meta_path = self.directory / "meta.json"
+        self.lock = threading.Lock()
+        self.rows = {}
+        self.dims = None
+        self.vectors = None
+        if self.meta_path.exists():
+            self.dims = json.loads(self.meta_path.read_text(encoding='utf-8'))['dims']
+            keys = self.keys_path.read_bytes() if self.keys_path.exists() else b""
+            self.rows = {keys[i:i+16]: row for row, i in enumerate(range(0, len(keys) - len(keys) % 16, 16))}
+            self.open_vectors()
+
+    def __len__(self):
+        return len(self.rows)
+
+    @staticmethod
+    def key(text):
+        """
+        Returns the 16-byte hash identifying a text.
+        """
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+    def open_vectors(self):
+        """
+        Memory-maps the vector file with all its rows.
+        """
+        capacity = self.vectors_path.stat().st_size // (4 * self.dims)
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r+', shape=(capacity, self.dims))
+
+    def reserve(self, rows):
+        """
+        Grows the vector file, doubling its rows, until it holds at least `rows` rows.
+        """
+        capacity = 0 if self.vectors is None else len(self.vectors)
+        if rows <= capacity:
+            return
+        capacity = max(capacity, INITIAL_ROWS)
+        while capacity < rows:
+            capacity *= 2
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.vectors = None
+        with self.vectors_path.open('ab') as f:
+            f.truncate(capacity * 4 * self.dims)
+        self.open_vectors()
+
+    def add(self, texts, vectors):
+        """
+        Stores the vectors of texts missing from the store.
+
+        Parameters
+        ----------
+        texts : list of str
+            The encoded texts.
+        vectors : numpy.ndarray
+            One row per text.
+        """
+        with self.lock:
+            if self.dims is None:
+                self.dims = int(vectors.shape[1])
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self.meta_path.write_text(json.dumps({'model': self.model_name, 'dims': self.dims}), encoding='utf-8')
+            new = {}
+            for text, vector in zip(texts, vectors):
+                key = self.key(text)
+                if key not in self.rows and key not in new:
+                    new[key] = vector
+            if not new:
+                return
+            start = len(self.rows)
+            self.reserve(start + len(new))
+            self.vectors[start:start + len(new)] = np.asarray(list(new.values()), dtype=np.float32)
+            self.vectors.flush()
+            with self.keys_path.open('ab') as f:
+                f.write(b"".join(new))
+            self.rows.update((key, start + offset) for offset, key in enumerate(new))
+
+    def get_many(self, texts):
+        """
+        Returns the stored vectors of texts.
+
+        Returns
+        -------
+        dict
+            The vector of each text found in the store.
+        """
+        with self.lock:
+            rows = {text: self.rows[key] for text in texts if (key := self.key(text)) in self.rows}
+            return {text: np.array(self.vectors[row]) for text, row in rows.items()}
+
+    def lookup(self, texts):
+        """
+        Returns the stored vectors of texts and the distinct texts missing from the store.
+
+        Returns
+        -------
+        tuple
+            The dict of `get_many` and the list of missing texts, in order.
+        """
+        stored = self.get_many(texts)
+        return stored, list(dict.fromkeys(text for text in texts if text not in stored))
+
+    def encode(self, texts, encoder, batch_size=None):
+        """
+        Returns the vectors of texts, only encoding those missing from the store.
+
+        Parameters
+        ----------
+        texts : list of str
+            The texts to encode.
+        encoder : callable
+            Encodes a list of texts into a matrix, e.g. `model.encode`; it is called
+            once, with the distinct missing texts, and without the lock.
+        batch_size : int, optional
+            Passed to the encoder.
+
+        Returns
+        -------
+        numpy.ndarray
+            One row per text.
+        """
+        stored, missing = self.lookup(texts)
+        if missing:
+            vectors = np.asarray(encoder(missing, batch_size=batch_size), dtype=np.float32)
+            self.add(missing, vectors)
+            stored.update(zip(missing, vectors))
+        if not texts:
+            return np.empty((0, self.dims or 0), dtype=np.float32)
+        return np.stack([stored[text] for text in texts])
+
+
+@functools.lru_cache(maxsize=None)
+def embedding_store(directory, model_name):
+    """
+    Returns the EmbeddingStore of a model in a directory, shared by the process.
+    """
+    return EmbeddingStore(directory, model_name)
+
+
+def store_name(model_name):
+    """
+    Returns the name of the store of `model_name` run by settings.INFERENCE_BACKEND.
+
+    The int8-quantized ONNX export does not return the vectors of the PyTorch
+    model, so each backend has its own store.
+    """
+    backend = 'onnx-int8' if settings.INFERENCE_BACKEND == 'onnx' else settings.INFERENCE_BACKEND
+    return f"{model_name}-{backend}"
+
+
+def encode_texts(texts, batch_size=None):
+    """
+    Encodes processed texts with the embedding model, reusing the stored vectors.
+
+    The texts are encoded through the EmbeddingStore of the model and the inference
+    backend in settings.EMBEDDING_CACHE_DIR, unless settings.EMBEDDING_CACHE_ENABLED is False.
+
+    Parameters
+    ----------
+    texts : list of str
+        The texts, e.g. from `Article.embedding_text`.
+    batch_size : int, optional
+        Number of texts per forward pass. Defaults to settings.INDEX_ENCODE_BATCH_SIZE.
+
+    Returns
+    -------
+    numpy.ndarray
+        One row per text.
+    """
+    batch_size = batch_size or settings.INDEX_ENCODE_BATCH_SIZE
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return model.encode(texts, batch_size=batch_size)
+    store = embedding_store(settings.EMBEDDING_CACHE_DIR, store_name(EMBEDDING_MODEL))
+    return store.encode(texts, model.encode, batch_size)
+
+
+class ShardedEncoder:
+    """
+    Encodes chunks of texts in a pool of processes, yielding their vectors in the order of the chunks.
+
+    Each process loads its own copy of the model and runs its backend with `threads`
+    threads, so that the processes share the cores instead of competing for them.
+    The processes are spawned, not forked: they never inherit the database
+    connections or the inference thread pools of the parent. Up to twice as
+    many chunks as processes are encoded ahead of the one being consumed, so the
+    parent reads the next chunks from the database while the processes encode.
+
+    With settings.EMBEDDING_CACHE_ENABLED, the stored vectors are looked up and the
+    new ones stored by the parent process, the only writer of the EmbeddingStore,
+    and only the missing texts are sent to the processes.
+
+    Parameters
+    ----------
+    workers : int
+        Number of encoding processes.
+    threads : int, optional
+        Inference threads per process. Defaults to settings.INDEX_TORCH_THREADS, or to
+        the number of cores divided by `workers` if it is 0.
+    batch_size : int, optional
+        Number of texts per forward pass. Defaults to settings.INDEX_ENCODE_BATCH_SIZE.
+    executor : Executor, optional
+        The pool running `encode_chunk`. Defaults to a ProcessPoolExecutor of `workers`
+        spawned processes.
+    """
+
+    def __init__(self, workers, threads=None, batch_size=None, executor=None):
+        self.workers = workers
+        self.threads = threads or settings.INDEX_TORCH_THREADS or max(1, (os.cpu_count() or 1) // workers)
+        self.batch_size = batch_size or settings.INDEX_ENCODE_BATCH_SIZE
+        self.executor = executor
+        self.store = (embedding_store(settings.EMBEDDING_CACHE_DIR, store_name(EMBEDDING_MODEL))
+                      if settings.EMBEDDING_CACHE_ENABLED else None)
+
+    def __enter__(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                                initializer=init_encoder_worker, initargs=(self.threads,))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.executor.shutdown(cancel_futures=exc_type is not None)
+
+    def submit(self, texts):
+        """
+        Sends the texts of a chunk missing from the store to the processes.
+        """
+        stored, missing = self.store.lookup(texts) if self.store is not None else ({}, list(dict.fromkeys(texts)))
+        future = self.executor.submit(encode_chunk, missing, self.batch_size) if missing else None
+        return texts, stored, missing, future
+
+    def collect(self, texts, stored, missing, future):
+        """
+        Waits for the vectors of a chunk and returns its matrix, storing the new vectors.
+        """
+        if future is not None:
+            vectors = np.asarray(future.result(), dtype=np.float32)
+            if self.store is not None:
+                self.store.add(missing, vectors)
+            stored.update(zip(missing, vectors))
+        return np.stack([stored[text] for text in texts]) if texts else np.empty((0, 0), dtype=np.float32)
+
+    def map(self, chunks):
+        """
+        Encodes chunks of texts, keeping 2 * workers chunks in flight.
+
+        Parameters
+        ----------
+        chunks : iterable of tuple
+            (item, texts) pairs, consumed lazily; the item, e.g. the articles of the
+            texts, is passed through.
+
+        Yields
+        ------
+        tuple
+            (item, vectors) for each chunk, in the order of `chunks`.
+        """
+        pending = deque()
+        for item, texts in chunks:
+            pending.append((item, self.submit(texts)))
+            if len(pending) >= 2 * self.workers:
+                item, chunk = pending.popleft()
+                yield item, self.collect(*chunk)
+        while pending:
+            item, chunk = pending.popleft()
+            yield item, self.collect(*chunk)
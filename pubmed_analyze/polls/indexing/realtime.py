@@ -0,0 +1,172 @@
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from elasticsearch.helpers import BulkIndexError, bulk
+from elasticsearch_dsl.connections import get_connection
+
+from polls.es_config import INDEX_NAME
+from polls.indexing.bulk import article_action, indexed_articles
+from polls.ingestion.records import batched
+from polls.models import Article, model
+
+logger = logging.getLogger(__name__)
+
+
+def sync_articles(operations, index=INDEX_NAME):
+    """
+    Applies the pending index and delete operations of articles to an Elasticsearch index.
+
+    The articles to index are read again from the database, so a document always
+    holds the last committed title and abstract; those which no longer exist or
+    became near-duplicates of another article are deleted from the index instead.
+    The articles are encoded with `model.encode`, bypassing the EmbeddingStore:
+    this runs in every web process, and a store must only have one writer, the
+    indexing commands. The actions are sent by bulk requests of
+    settings.INDEX_CHUNK_SIZE actions; deleting a missing document is not an error.
+
+    Parameters
+    ----------
+    operations : dict
+        'index' or 'delete' for each article id.
+    index : str, optional
+        The Elasticsearch index. Defaults to INDEX_NAME.
+
+    Returns
+    -------
+    int
+        The number of actions sent.
+    """
+    client = get_connection()
+    sent = 0
+    for ids in batched(operations, settings.INDEX_CHUNK_SIZE):
+        articles = list(indexed_articles().filter(id__in=[pk for pk in ids if operations[pk] == 'index']))
+        vectors = model.encode([article.embedding_text() for article in articles],
+                               batch_size=settings.INDEX_ENCODE_BATCH_SIZE) if articles else []
+        actions = [article_action(article, vector, index) for article, vector in zip(articles, vectors)]
+        indexed = {article.id for article in articles}
+        actions += [{'_op_type': 'delete', '_index': index, '_id': pk} for pk in ids if pk not in indexed]
+        bulk(client, actions, ignore_status=(404,))
+        sent += len(actions)
+    return sent
+
+
+class IndexQueue:
+    """
+    Coalesces the article writes into batches of Elasticsearch updates, sent in the background.
+
+    The first operation queued starts a timer; the operations queued before it
+    fires are absorbed, only the last one of each article being kept, and the
+    batch is sent `delay` seconds after the first operation, in the timer thread.
+    If the batch fails, its operations which were not replaced in the meantime
+    are queued again, and the delay doubles with each consecutive failure, so the
+    index catches up once Elasticsearch is back without hammering it meanwhile.
+    An operation failing more than `retries` times is dropped and logged, as are
+    the documents rejected by Elasticsearch, which would fail again; the next
+    reindex brings them back in line.
+
+    Parameters
+    ----------
+    delay : float, optional
+        Seconds between the first operation and the batch. Defaults to
+        settings.INDEX_REALTIME_DELAY.
+    process : callable, optional
+        Sends a batch, given the operation of each article id. Defaults to `sync_articles`.
+    retries : int, optional
+        Failed attempts before an operation is dropped. Defaults to
+        settings.INDEX_REALTIME_RETRIES.
+    """
+
+    def __init__(self, delay=None, process=None, retries=None):
+        self.delay = settings.INDEX_REALTIME_DELAY if delay is None else delay
+        self.process = process or sync_articles
+        self.retries = settings.INDEX_REALTIME_RETRIES if retries is None else retries
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.attempts = {}
+        self.failures = 0
+        self.timer = None
+
+    def put(self, article_id, operation):
+        """
+        Queues the 'index' or 'delete' operation of an article, replacing its pending one.
+        """
+        with self.lock:
+            self.pending[article_id] = operation
+            self.attempts.pop(article_id, None)
+            self.start()
+
+    def start(self):
+        if self.timer is None and self.pending:
+            self.timer = threading.Timer(self.delay * 2 ** self.failures, self.run)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def run(self):
+        with self.lock:
+            operations, self.pending, self.timer = self.pending, {}, None
+        try:
+            self.process(operations)
+        except BulkIndexError as error:
+            rejected = {str(info.get('_id')) for item in error.errors for info in item.values()}
+            logger.error("Elasticsearch rejected %d articles, dropped until the next reindex: %s",
+                         len(rejected), error.errors)
+            self.retry({pk: operation for pk, operation in operations.items() if str(pk) not in rejected},
+                       failed=not rejected)
+        except Exception:
+            logger.exception("Indexing of %d articles failed, retrying", len(operations))
+            self.retry(operations, failed=True)
+        else:
+            with self.lock:
+                self.failures = 0
+                for article_id in operations:
+                    self.attempts.pop(article_id, None)
+        finally:
+            connections.close_all()
+
+    def retry(self, operations, failed):
+        """
+        Queues again the operations of a batch which were not replaced, dropping those failing too often.
+        """
+        with self.lock:
+            self.failures = min(self.failures + 1, self.retries) if failed else 0
+            dropped = []
+            for article_id, operation in operations.items():
+                if article_id in self.pending:
+                    continue
+                attempts = self.attempts.get(article_id, 0) + failed
+                if attempts > self.retries:
+                    self.attempts.pop(article_id, None)
+                    dropped.append(article_id)
+                    continue
+                self.attempts[article_id] = attempts
+                self.pending[article_id] = operation
+            self.start()
+        if dropped:
+            logger.error("Dropped the indexing of articles %s after %d failed attempts", dropped, self.retries + 1)
+
+
+index_queue = IndexQueue()
+
+
+@receiver(post_save, sender=Article)
+def queue_index(sender, instance, **kwargs):
+    """
+    Queues the indexing of a saved article once the write is committed.
+    """
+    if settings.INDEX_REALTIME_DELAY is not None:
+        pk = instance.pk
+        transaction.on_commit(lambda: index_queue.put(pk, 'index'))
+
+
+@receiver(post_delete, sender=Article)
+def queue_delete(sender, instance, **kwargs):
+    """
+    Queues the deletion of a deleted article from the index once the write is committed.
+    """
+    if settings.INDEX_REALTIME_DELAY is not None:
+        pk = instance.pk
+        transaction.on_commit(lambda: index_queue.put(pk, 'delete'))
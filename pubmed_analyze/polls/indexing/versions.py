@@ -0,0 +1,187 @@
+import re
+
+from django.conf import settings
+from django.utils import timezone
+from elasticsearch.helpers import scan
+from elasticsearch_dsl.connections import get_connection
+
+from polls.documents import article_index
+from polls.es_config import INDEX_NAME
+from polls.indexing.bulk import bulk_index_articles, encode_articles, indexed_articles
+from polls.indexing.realtime import sync_articles
+
+VERSION = re.compile(rf"^{re.escape(INDEX_NAME)}-v(\d+)$")
+
+
+def index_versions(client):
+    """
+    Returns the versioned article indices, e.g. "medical-articles-v3", by increasing version.
+
+    Returns
+    -------
+    list of tuple
+        The (version, index name) of each index.
+    """
+    names = client.indices.get(index=f"{INDEX_NAME}-v*")
+    return sorted((int(match.group(1)), name) for name in names if (match := VERSION.match(name)))
+
+
+def live_indices(client):
+    """
+    Returns the names of the indices read through the INDEX_NAME alias.
+    """
+    if not client.indices.exists_alias(name=INDEX_NAME):
+        return set()
+    return set(client.indices.get_alias(name=INDEX_NAME))
+
+
+def recall_smoke_test(client, index, sample=None):
+    """
+    Returns the fraction of sampled articles found among the 10 nearest neighbours of their own vector.
+
+    Parameters
+    ----------
+    client : Elasticsearch
+        The Elasticsearch client.
+    index : str
+        The index to test.
+    sample : int, optional
+        Number of random articles searched. Defaults to settings.INDEX_SMOKE_SAMPLE.
+
+    Returns
+    -------
+    float
+        The recall, 1.0 when there is no article.
+    """
+    articles = list(indexed_articles().order_by('?')[:sample or settings.INDEX_SMOKE_SAMPLE])
+    found = 0
+    for article, vector in zip(articles, encode_articles(articles)):
+        response = client.search(index=index, size=10, source=False,
+                                  knn={'field': 'title_abstract_vector', 'query_vector': vector.tolist(),
+                                       'k': 10, 'num_candidates': 100})
+        found += str(article.id) in {hit['_id'] for hit in response['hits']['hits']}
+    return found / len(articles) if articles else 1.0
+
+
+def validate_index(client, index, indexed):
+    """
+    Checks that a new index holds every article sent and finds the articles by their vector.
+
+    Raises
+    ------
+    ValueError
+        If the document count differs from the number of articles indexed, or the
+        recall of `recall_smoke_test` is below settings.INDEX_MIN_RECALL.
+    """
+    client.indices.refresh(index=index)
+    count = client.count(index=index)['count']
+    if count != indexed:
+        raise ValueError(f"{index} holds {count} documents instead of {indexed}")
+    recall = recall_smoke_test(client, index)
+    if recall < settings.INDEX_MIN_RECALL:
+        raise ValueError(f"{index} has a recall of {recall:.2f} below {settings.INDEX_MIN_RECALL}")
+
+
+def swap_alias(client, index):
+    """
+    Points the INDEX_NAME alias to an index, in one atomic update of the aliases.
+
+    The alias is removed from the indices it pointed to in the same update, so
+    searches always read exactly one version. A concrete index named INDEX_NAME,
+    built before the versioned indices, is deleted in the same update too, since
+    an alias cannot have the name of an index.
+    """
+    actions = [{'remove': {'index': name, 'alias': INDEX_NAME}} for name in live_indices(client)]
+    if client.indices.exists(index=INDEX_NAME) and not client.indices.exists_alias(name=INDEX_NAME):
+        actions.append({'remove_index': {'index': INDEX_NAME}})
+    actions.append({'add': {'index': index, 'alias': INDEX_NAME}})
+    client.indices.update_aliases(actions=actions)
+
+
+def collect_old_versions(client, keep=None):
+    """
+    Deletes the versioned indices beyond the `keep` most recent ones, except those read through the alias.
+
+    Parameters
+    ----------
+    client : Elasticsearch
+        The Elasticsearch client.
+    keep : int, optional
+        Number of versions kept, for rollbacks. Defaults to settings.INDEX_KEEP_VERSIONS.
+
+    Returns
+    -------
+    list of str
+        The deleted indices.
+    """
+    keep = keep or settings.INDEX_KEEP_VERSIONS
+    live = live_indices(client)
+    deleted = [name for _, name in index_versions(client)[:-keep] if name not in live]
+    for name in deleted:
+        client.indices.delete(index=name)
+    return deleted
+
+
+def stale_documents(client, index):
+    """
+    Returns the ids of the documents of an index whose article was deleted or became a near-duplicate.
+
+    The ids of the index are scrolled without their source and compared with
+    those of `indexed_articles`.
+
+    Returns
+    -------
+    set of int
+        The article ids to delete from the index.
+    """
+    indexed = {int(hit['_id']) for hit in scan(client, index=index, query={'query': {'match_all': {}}, '_source': False})}
+    return indexed - set(indexed_articles().values_list('id', flat=True))
+
+
+def reindex_articles(progress=None, workers=None):
+    """
+    Rebuilds the article index under a new version and switches the searches to it.
+
+    The articles are indexed with `bulk_index_articles` in a new index,
+    "medical-articles-v<N+1>" with the current mapping of ArticleDocument, while
+    the searches keep reading the live version through the INDEX_NAME alias. The
+    new index is validated by `validate_index`, then the alias is swapped to it by
+    `swap_alias`. The articles saved or deleted during the build were written to the
+    previous version by the real-time indexing, so after the swap the articles saved
+    since the start are indexed again in the new version, and the documents of
+    `stale_documents` are deleted from it. Finally the old versions are deleted by
+    `collect_old_versions`. A new index failing its validation is deleted and the
+    alias is left unchanged.
+
+    Parameters
+    ----------
+    progress : callable, optional
+        Called with progress messages.
+    workers : int, optional
+        Number of encoding processes of `bulk_index_articles`.
+
+    Returns
+    -------
+    str
+        The name of the new index.
+    """
+    progress = progress or (lambda message: None)
+    client = get_connection()
+    versions = index_versions(client)
+    index = f"{INDEX_NAME}-v{versions[-1][0] + 1 if versions else 1}"
+    started = timezone.now()
+    article_index.clone(index).create(using=client)
+    try:
+        indexed = bulk_index_articles(index=index, progress=progress, workers=workers)
+        validate_index(client, index, indexed)
+    except Exception:
+        client.indices.delete(index=index, ignore_unavailable=True)
+        raise
+    swap_alias(client, index)
+    progress(f"{INDEX_NAME} now reads {index} ({indexed} articles)")
+    updated = indexed_articles().filter(updated_at__gte=started).values_list('id', flat=True)
+    operations = {**dict.fromkeys(updated, 'index'), **dict.fromkeys(stale_documents(client, index), 'delete')}
+    sync_articles(operations, index=index)
+    for name in collect_old_versions(client):
+        progress(f"Deleted {name}")
+    return index
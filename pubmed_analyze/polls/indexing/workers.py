@@ -0,0 +1,29 @@
+# Functions run by the encoding processes of ShardedEncoder. They are imported by the
+# processes before Django is set up, so this module must not import the models.
+
+
+def init_encoder_worker(threads):
+    """
+    Sets up Django in a new encoding process and limits the inference backend to `threads` threads.
+    """
+    import os
+
+    import django
+
+    os.environ['INFERENCE_THREADS'] = str(threads)
+    django.setup()
+    from django.conf import settings
+
+    if settings.INFERENCE_BACKEND == 'torch':
+        import torch
+
+        torch.set_num_threads(threads)
+
+
+def encode_chunk(texts, batch_size):
+    """
+    Encodes texts with the embedding model of the process.
+    """
+    from polls.models import model
+
+    return model.encode(texts, batch_size=batch_size)
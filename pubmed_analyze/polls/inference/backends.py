@@ -0,0 +1,289 @@
+import functools
+import json
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+BACKENDS = ('torch', 'onnx')
+
+
+def require_onnxruntime():
+    """
+    Raises ImproperlyConfigured if the optional onnxruntime package is missing.
+    """
+    if ort is None:
+        raise ImproperlyConfigured("The onnx inference backend requires the onnxruntime and onnx packages: "
+                                   "pip install onnxruntime onnx")
+
+
+def onnx_directory(model_name, directory=None):
+    """
+    Returns the directory of the exported model `model_name`, in settings.ONNX_MODEL_DIR by default.
+    """
+    return Path(directory or settings.ONNX_MODEL_DIR) / model_name.replace("/", "--")
+
+
+def export_transformer(module, tokenizer, path, sample, output, output_axes):
+    """
+    Exports a transformers model to ONNX, with dynamic batch and sequence axes.
+
+    Parameters
+    ----------
+    module : transformers.PreTrainedModel
+        The model, whose first output is exported.
+    tokenizer : transformers.PreTrainedTokenizer
+        The tokenizer of the model, used to build the sample inputs.
+    path : Path
+        The ONNX file written.
+    sample : tuple
+        The arguments of the tokenizer for the sample inputs, e.g. texts or (queries, documents).
+    output : str
+        The name of the output.
+    output_axes : dict
+        The dynamic axes of the output.
+    """
+    import torch
+
+    inputs = tokenizer(*sample, padding=True, truncation=True, return_tensors='pt')
+    names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in inputs]
+
+    class FirstOutput(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.module = module
+
+        def forward(self, *tensors):
+            return self.module(**dict(zip(names, tensors)), return_dict=False)[0]
+
+    module.eval()
+    with torch.no_grad():
+        torch.onnx.export(FirstOutput(), tuple(inputs[name] for name in names), str(path),
+                          input_names=names, output_names=[output], opset_version=17,
+                          dynamic_axes={**{name: {0: 'batch', 1: 'sequence'} for name in names}, output: output_axes})
+
+
+def quantize(path):
+    """
+    Replaces an ONNX model by its dynamic int8 quantization.
+
+    The weights of the MatMul and Gemm nodes are stored as int8 and the
+    activations are quantized on the fly, so no calibration data is needed.
+    """
+    require_onnxruntime()
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    full = path.with_name("model-fp32.onnx")
+    path.replace(full)
+    quantize_dynamic(str(full), str(path), weight_type=QuantType.QInt8)
+    full.unlink()
+
+
+def export_encoder(encoder, directory):
+    """
+    Exports a SentenceTransformer to a quantized ONNX model, with its tokenizer and pooling.
+
+    Parameters
+    ----------
+    encoder : SentenceTransformer
+        A transformer followed by a mean or CLS pooling, and optionally a normalization.
+    directory : Path
+        The directory written, read by OnnxEncoder.
+    """
+    transformer, pooling = encoder[0], encoder[1]
+    mode = pooling.get_pooling_mode_str()
+    if mode not in ('mean', 'cls'):
+        raise ValueError(f"The {mode} pooling is not supported by the onnx backend")
+    export_transformer(transformer.auto_model, transformer.tokenizer, directory / "model.onnx",
+                       (["A sample sentence.", "Another sample"],), 'last_hidden_state', {0: 'batch', 1: 'sequence'})
+    quantize(directory / "model.onnx")
+    transformer.tokenizer.save_pretrained(directory)
+    meta = {'pooling': mode,
+            'normalize': any(type(module).__name__ == 'Normalize' for module in encoder),
+            'max_length': encoder.max_seq_length,
+            'dims': encoder.get_sentence_embedding_dimension()}
+    (directory / "meta.json").write_text(json.dumps(meta), encoding='utf-8')
+
+
+def export_reranker(reranker, directory):
+    """
+    Exports a CrossEncoder to a quantized ONNX model, with its tokenizer and activation.
+
+    Parameters
+    ----------
+    reranker : CrossEncoder
+        The cross-encoder.
+    directory : Path
+        The directory written, read by OnnxCrossEncoder.
+    """
+    export_transformer(reranker.model, reranker.tokenizer, directory / "model.onnx",
+                       (["a query", "another query"], ["A document.", "Another document"]), 'logits', {0: 'batch'})
+    quantize(directory / "model.onnx")
+    reranker.tokenizer.save_pretrained(directory)
+    meta = {'activation': 'sigmoid' if type(reranker.default_activation_function).__name__ == 'Sigmoid' else 'identity',
+            'max_length': reranker.max_length or reranker.tokenizer.model_max_length}
+    (directory / "meta.json").write_text(json.dumps(meta), encoding='utf-8')
+
+
+def pool(hidden, mask, mode, normalize=False):
+    """
+    Returns the sentence embeddings of token embeddings, as the Pooling and Normalize modules of SentenceTransformer.
+
+    Parameters
+    ----------
+    hidden : numpy.ndarray
+        The token embeddings, of shape (batch, sequence, dims).
+    mask : numpy.ndarray
+        The attention mask, of shape (batch, sequence).
+    mode : str
+        'mean' averages the embeddings of the tokens, 'cls' keeps the first one.
+    normalize : bool, optional
+        Whether the embeddings are scaled to unit length.
+
+    Returns
+    -------
+    numpy.ndarray
+        The embeddings, of shape (batch, dims).
+    """
+    if mode == 'cls':
+        vectors = hidden[:, 0]
+    else:
+        mask = mask[..., None].astype(hidden.dtype)
+        vectors = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    if normalize:
+        vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    return vectors.astype(np.float32)
+
+
+class OnnxModel:
+    """
+    A quantized model exported by `export_encoder` or `export_reranker`, run by ONNX Runtime on CPU.
+
+    Parameters
+    ----------
+    directory : str or Path
+        The exported model, with its tokenizer and meta.json.
+    threads : int, optional
+        Intra-op threads of the session. Defaults to settings.INFERENCE_THREADS, 0
+        letting ONNX Runtime use every core.
+    """
+
+    def __init__(self, directory, threads=None):
+        require_onnxruntime()
+        from transformers import AutoTokenizer
+
+        self.directory = Path(directory)
+        if not (self.directory / "meta.json").exists():
+            raise ImproperlyConfigured(f"No ONNX model in {self.directory}: run "
+                                       "`INFERENCE_BACKEND=torch python manage.py commands export_onnx`")
+        self.meta = json.loads((self.directory / "meta.json").read_text(encoding='utf-8'))
+        self.tokenizer = AutoTokenizer.from_pretrained(self.directory)
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = settings.INFERENCE_THREADS if threads is None else threads
+        self.session = ort.InferenceSession(str(self.directory / "model.onnx"), options,
+                                            providers=['CPUExecutionProvider'])
+        self.inputs = [node.name for node in self.session.get_inputs()]
+
+    def run(self, *texts):
+        """
+        Tokenizes texts, or pairs of texts, and returns the output of the model with the attention mask.
+        """
+        features = self.tokenizer(*texts, padding=True, truncation=True, max_length=self.meta['max_length'],
+                                  return_tensors='np')
+        output = self.session.run(None, {name: features[name].astype(np.int64) for name in self.inputs})[0]
+        return output, features['attention_mask']
+
+
+class OnnxEncoder(OnnxModel):
+    """
+    The ONNX Runtime counterpart of SentenceTransformer, exported by `export_encoder`.
+    """
+
+    def encode(self, sentences, batch_size=32, **kwargs):
+        """
+        Encodes a text or a list of texts, like `SentenceTransformer.encode`.
+
+        The texts are encoded by batches of similar lengths, to limit the padding,
+        and the embeddings are returned in the order of the texts. The other
+        arguments of `SentenceTransformer.encode` are accepted and ignored.
+
+        Returns
+        -------
+        numpy.ndarray
+            The embedding of the text, or one row per text.
+        """
+        texts = [sentences] if isinstance(sentences, str) else list(sentences)
+        order = np.argsort([-len(text) for text in texts], kind='stable')
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            hidden, mask = self.run([texts[i] for i in order[start:start + batch_size]])
+            batches.append(pool(hidden, mask, self.meta['pooling'], self.meta['normalize']))
+        vectors = np.empty((len(texts), self.meta['dims']), dtype=np.float32)
+        if batches:
+            vectors[order] = np.concatenate(batches)
+        return vectors[0] if isinstance(sentences, str) else vectors
+
+
+class OnnxCrossEncoder(OnnxModel):
+    """
+    The ONNX Runtime counterpart of CrossEncoder, exported by `export_reranker`.
+    """
+
+    def predict(self, sentences, batch_size=32, **kwargs):
+        """
+        Scores pairs of texts, like `CrossEncoder.predict`, with the activation of the exported model.
+
+        Returns
+        -------
+        numpy.ndarray
+            One score per pair, or one row of scores per pair for several labels.
+        """
+        scores = []
+        for start in range(0, len(sentences), batch_size):
+            batch = sentences[start:start + batch_size]
+            logits, _ = self.run([pair[0] for pair in batch], [pair[1] for pair in batch])
+            scores.append(logits.astype(np.float32))
+        scores = np.concatenate(scores) if scores else np.empty((0, 1), dtype=np.float32)
+        if self.meta['activation'] == 'sigmoid':
+            scores = 1 / (1 + np.exp(-scores))
+        return scores[:, 0] if scores.shape[1] == 1 else scores
+
+
+def check_backend():
+    if settings.INFERENCE_BACKEND not in BACKENDS:
+        raise ImproperlyConfigured(f"INFERENCE_BACKEND must be one of {', '.join(BACKENDS)}, "
+                                   f"not {settings.INFERENCE_BACKEND!r}")
+
+
+def load_encoder(model_name):
+    """
+    Returns the sentence encoder `model_name` run by settings.INFERENCE_BACKEND.
+
+    With the 'onnx' backend, the model exported by `commands export_onnx` is
+    loaded, and neither the PyTorch model nor its weights are.
+    """
+    check_backend()
+    if settings.INFERENCE_BACKEND == 'onnx':
+        return OnnxEncoder(onnx_directory(model_name))
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(model_name)
+
+
+@functools.lru_cache(maxsize=None)
+def load_reranker(model_name):
+    """
+    Returns the cross-encoder `model_name` run by settings.INFERENCE_BACKEND, loaded once per process.
+    """
+    check_backend()
+    if settings.INFERENCE_BACKEND == 'onnx':
+        return OnnxCrossEncoder(onnx_directory(model_name))
+    from sentence_transformers import CrossEncoder
+
+    return CrossEncoder(model_name)
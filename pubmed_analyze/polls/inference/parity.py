@@ -0,0 +1,211 @@
+import json
+import shutil
+import statistics
+import time
+
+import numpy as np
+from django.conf import settings
+
+from polls.indexing.bulk import indexed_articles
+from polls.inference.backends import (OnnxCrossEncoder, OnnxEncoder, export_encoder, export_reranker,
+                                      onnx_directory, require_onnxruntime)
+from polls.models import EMBEDDING_MODEL, RERANKER_MODEL
+
+
+def normalized(vectors):
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def nearest_neighbours(vectors, k):
+    """
+    Returns the indices of the `k` most similar rows to each row by cosine, excluding the row itself.
+    """
+    similarities = normalized(vectors) @ normalized(vectors).T
+    np.fill_diagonal(similarities, -np.inf)
+    return np.argsort(-similarities, axis=1, kind='stable')[:, :k]
+
+
+def rank_correlation(a, b):
+    """
+    Returns the Spearman correlation of two lists of scores.
+    """
+    ranks_a, ranks_b = np.argsort(np.argsort(a)), np.argsort(np.argsort(b))
+    if len(a) < 2 or ranks_a.std() == 0 or ranks_b.std() == 0:
+        return 1.0
+    return float(np.corrcoef(ranks_a, ranks_b)[0, 1])
+
+
+def encoder_parity(reference, candidate, texts, k=10):
+    """
+    Compares the embeddings of texts by two encoders.
+
+    Parameters
+    ----------
+    reference, candidate
+        Encoders with the `encode` method of SentenceTransformer, e.g. the PyTorch
+        model and its quantized ONNX export.
+    texts : list of str
+        The texts encoded.
+    k : int, optional
+        Number of nearest neighbours compared.
+
+    Returns
+    -------
+    dict
+        The minimum and mean cosine similarity between the two embeddings of each
+        text, and the mean fraction of the `k` nearest neighbours of each text
+        among the texts found by both encoders.
+    """
+    expected, actual = reference.encode(texts), candidate.encode(texts)
+    cosines = (normalized(expected) * normalized(actual)).sum(axis=1)
+    k = min(k, len(texts) - 1)
+    overlap = 1.0
+    if k > 0:
+        pairs = zip(nearest_neighbours(expected, k), nearest_neighbours(actual, k))
+        overlap = float(np.mean([len(set(a) & set(b)) / k for a, b in pairs]))
+    return {'cosine_min': float(cosines.min()), 'cosine_mean': float(cosines.mean()), 'neighbour_overlap': overlap}
+
+
+def reranker_parity(reference, candidate, queries, documents, top=3):
+    """
+    Compares the rankings of documents for queries by two cross-encoders.
+
+    Each query is scored against every document, as in `rank_doc`.
+
+    Returns
+    -------
+    dict
+        The mean fraction of the `top` documents of each query ranked first by both
+        cross-encoders, the mean Spearman correlation of their scores, and the
+        maximum absolute difference of the scores.
+    """
+    overlaps, correlations, errors = [], [], []
+    top = min(top, len(documents))
+    for query in queries:
+        pairs = [[query, document] for document in documents]
+        expected = np.asarray(reference.predict(pairs), dtype=np.float32)
+        actual = np.asarray(candidate.predict(pairs), dtype=np.float32)
+        overlaps.append(len(set(np.argsort(-expected)[:top]) & set(np.argsort(-actual)[:top])) / top)
+        correlations.append(rank_correlation(expected, actual))
+        errors.append(float(np.abs(expected - actual).max()))
+    return {'top_overlap': float(np.mean(overlaps)), 'rank_correlation': float(np.mean(correlations)),
+            'score_error': max(errors)}
+
+
+def median_latency(function, inputs):
+    """
+    Returns the median duration in seconds of `function` called on each input.
+    """
+    durations = []
+    for value in inputs:
+        start = time.perf_counter()
+        function(value)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def parity_report(encoders, rerankers, sample=None):
+    """
+    Compares the PyTorch models with their ONNX exports on a sample of the corpus.
+
+    The texts of randomly sampled articles are encoded by both encoders, the titles
+    of the first ten are used as queries reranking the twenty first articles, and
+    the median latencies of one query encoding and of one reranking are measured.
+
+    Parameters
+    ----------
+    encoders : tuple
+        The PyTorch encoder and its ONNX export.
+    rerankers : tuple
+        The PyTorch cross-encoder and its ONNX export.
+    sample : int, optional
+        Number of articles. Defaults to settings.ONNX_PARITY_SAMPLE.
+
+    Returns
+    -------
+    dict
+        The results of `encoder_parity` and `reranker_parity`, with the latencies
+        in seconds of both backends.
+    """
+    articles = list(indexed_articles().order_by('?')[:sample or settings.ONNX_PARITY_SAMPLE])
+    if not articles:
+        raise ValueError("The parity check needs articles in the database")
+    texts = [article.embedding_text() for article in articles]
+    queries = [article.title for article in articles[:10]]
+    documents = [f"{article.title} {article.abstract}" for article in articles[:20]]
+    report = {'articles': len(articles), **encoder_parity(*encoders, texts),
+              **reranker_parity(*rerankers, queries, documents)}
+    for backend, encoder, reranker in zip(('torch', 'onnx'), encoders, rerankers):
+        report[f'{backend}_encode_latency'] = median_latency(encoder.encode, queries)
+        report[f'{backend}_rerank_latency'] = median_latency(
+            lambda query: reranker.predict([[query, document] for document in documents]), queries)
+    return report
+
+
+def validate_parity(report):
+    """
+    Checks that the ONNX exports are close enough to the PyTorch models.
+
+    Raises
+    ------
+    ValueError
+        If the mean cosine of the embeddings is below settings.ONNX_MIN_COSINE, or
+        the neighbour or top document overlap below settings.ONNX_MIN_OVERLAP.
+    """
+    if report['cosine_mean'] < settings.ONNX_MIN_COSINE:
+        raise ValueError(f"The mean cosine of the embeddings {report['cosine_mean']:.4f} "
+                         f"is below {settings.ONNX_MIN_COSINE}")
+    for name in ('neighbour_overlap', 'top_overlap'):
+        if report[name] < settings.ONNX_MIN_OVERLAP:
+            raise ValueError(f"The {name} {report[name]:.2f} is below {settings.ONNX_MIN_OVERLAP}")
+
+
+def export_onnx_models(progress=None, sample=None):
+    """
+    Exports the encoder and the reranker to quantized ONNX models, checking their parity with PyTorch.
+
+    The models EMBEDDING_MODEL and RERANKER_MODEL are exported with `export_encoder`
+    and `export_reranker` into "<name>.partial" directories, compared with the
+    PyTorch models by `parity_report` and `validate_parity`, then moved to their
+    directories in settings.ONNX_MODEL_DIR with the report in parity.json. Exports
+    failing the check are deleted and the previous ones are kept.
+
+    Parameters
+    ----------
+    progress : callable, optional
+        Called with progress messages.
+    sample : int, optional
+        Passed to `parity_report`.
+
+    Returns
+    -------
+    dict
+        The report of `parity_report`.
+    """
+    require_onnxruntime()
+    from sentence_transformers import CrossEncoder, SentenceTransformer
+
+    progress = progress or (lambda message: None)
+    directories = {name: onnx_directory(name) for name in (EMBEDDING_MODEL, RERANKER_MODEL)}
+    partials = {name: directory.with_name(directory.name + ".partial") for name, directory in directories.items()}
+    for partial in partials.values():
+        shutil.rmtree(partial, ignore_errors=True)
+        partial.mkdir(parents=True)
+    try:
+        encoder, reranker = SentenceTransformer(EMBEDDING_MODEL), CrossEncoder(RERANKER_MODEL)
+        export_encoder(encoder, partials[EMBEDDING_MODEL])
+        export_reranker(reranker, partials[RERANKER_MODEL])
+        progress("Models exported and quantized, checking their parity")
+        report = parity_report((encoder, OnnxEncoder(partials[EMBEDDING_MODEL])),
+                               (reranker, OnnxCrossEncoder(partials[RERANKER_MODEL])), sample)
+        progress(json.dumps(report))
+        validate_parity(report)
+    except Exception:
+        for partial in partials.values():
+            shutil.rmtree(partial, ignore_errors=True)
+        raise
+    for name, directory in directories.items():
+        (partials[name] / "parity.json").write_text(json.dumps(report), encoding='utf-8')
+        shutil.rmtree(directory, ignore_errors=True)
+        partials[name].replace(directory)
+    return report
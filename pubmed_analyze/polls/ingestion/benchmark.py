@@ -0,0 +1,206 @@
+import resource
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.db import connection
+from django.test import override_settings
+
+from polls.ingestion.interning import name_cache
+from polls.ingestion.loader import ingest_inputs
+from polls.models import ArticlesWithAuthors
+
+STAGES = ['ingestion', 'articles_full_to_database', 'index_articles']
+
+
+def peak_rss():
+    """
+    Returns the peak resident set size of the process and of its finished child processes, in bytes.
+    """
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return scale * max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                       resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+class QueryCounter:
+    """
+    Database execute wrapper counting the queries sent through a connection.
+
+    The COPY streams of the 'copy' ingestion method and the queries of worker
+    processes do not go through the wrapped connection and are not counted.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure_stage(stage, run):
+    """
+    Runs a benchmark stage and measures its throughput, queries and memory.
+
+    Parameters
+    ----------
+    stage : str
+        The name of the stage.
+    run : callable
+        Runs the stage and returns the number of rows it processed.
+
+    Returns
+    -------
+    dict
+        The stage, its rows, seconds, rows per second, number of queries and the
+        peak RSS of the process in MB once the stage is done. The peak RSS is the
+        high-water mark of the whole run, so the stages which raise it stand out.
+    """
+    counter = QueryCounter()
+    start = time.perf_counter()
+    with connection.execute_wrapper(counter):
+        rows = run()
+    seconds = time.perf_counter() - start
+    return {'stage': stage,
+            'rows': rows,
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(rows / seconds, 1) if seconds else 0.0,
+            'queries': counter.count,
+            'peak_rss_mb': round(peak_rss() / 2**20, 1)}
+
+
+@contextmanager
+def benchmark_database():
+    """
+    Switches the default connection to a new database for the time of a benchmark.
+
+    The database is created with the migrations, as the test databases, under the
+    name "benchmark_" followed by the name of the configured database, and dropped
+    on exit, so the benchmarks never write to the real tables. The name cache is
+    cleared on entry and exit, since its ids belong to the other database.
+    """
+    old_name, test_settings = connection.settings_dict['NAME'], connection.settings_dict['TEST']
+    connection.settings_dict['TEST'] = {**test_settings, 'NAME': f"benchmark_{old_name}"}
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    name_cache.clear()
+    try:
+        yield
+    finally:
+        name_cache.clear()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        connection.settings_dict['TEST'] = test_settings
+
+
+@contextmanager
+def scratch_index(name):
+    """
+    Creates an Elasticsearch index with the settings and mappings of the article index, deleted on exit.
+    """
+    from polls.documents import article_index
+
+    index = article_index.clone(name)
+    index.create()
+    try:
+        yield name
+    finally:
+        index.delete(ignore=404)
+
+
+@contextmanager
+def scratch_embedding_store():
+    """
+    Points settings.EMBEDDING_CACHE_DIR to a temporary directory, deleted on exit.
+
+    The vectors of a benchmark corpus are encoded from an empty store and never
+    added to the store of the real articles.
+    """
+    from polls.indexing.embeddings import embedding_store
+
+    with tempfile.TemporaryDirectory() as directory, override_settings(EMBEDDING_CACHE_DIR=directory):
+        try:
+            yield directory
+        finally:
+            # Closes the memory map of the scratch store before its directory is deleted
+            embedding_store.cache_clear()
+
+
+def ingest_corpus(path, term, method=None, workers=None):
+    """
+    Ingests a corpus file with `ingest_inputs` and returns the number of articles created.
+    """
+    # An absolute pattern is kept as is by os.path.join in `input_paths`
+    return ingest_inputs(patterns=[str(Path(path).resolve())], terms=[term], method=method, workers=workers)
+
+
+def refresh_view():
+    """
+    Runs `articles_full_to_database` and returns the number of rows of the ArticlesWithAuthors view.
+    """
+    from polls.business_logic import articles_full_to_database
+
+    articles_full_to_database()
+    return ArticlesWithAuthors.objects.count()
+
+
+def index_corpus(index):
+    """
+    Runs `bulk_index_articles`, as `commands index_articles`, on an index and returns the number of articles indexed.
+    """
+    from polls.indexing.bulk import bulk_index_articles
+
+    return bulk_index_articles(index=index)
+
+
+def benchmark_pipeline(path, term="synthetic", stages=None, method=None, workers=None):
+    """
+    Measures the ingestion and indexing stages on a corpus, e.g. from `write_synthetic_corpus`.
+
+    The stages run in order on the current database, each measured by
+    `measure_stage`:
+
+    - 'ingestion' loads the corpus with `ingest_inputs`, including the
+      near-duplicate detection, and counts the articles created;
+    - 'articles_full_to_database' refreshes the ArticlesWithAuthors view, which
+      requires PostgreSQL, and counts its rows;
+    - 'index_articles' encodes and indexes the articles in a scratch copy of the
+      Elasticsearch index, with a scratch embedding store, both deleted
+      afterwards, and counts the articles indexed.
+
+    Parameters
+    ----------
+    path : str or Path
+        The corpus file.
+    term : str, optional
+        The term stored on the articles.
+    stages : list of str, optional
+        The stages to run. Defaults to every stage of STAGES.
+    method, workers
+        Passed to `ingest_inputs`.
+
+    Returns
+    -------
+    list of dict
+        The measures of each stage.
+
+    Raises
+    ------
+    ValueError
+        If a stage is unknown.
+    """
+    stages = stages or STAGES
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown benchmark stages: {', '.join(sorted(unknown))}")
+    results = []
+    for stage in stages:
+        if stage == 'ingestion':
+            results.append(measure_stage(stage, lambda: ingest_corpus(path, term, method, workers)))
+        elif stage == 'articles_full_to_database':
+            results.append(measure_stage(stage, refresh_view))
+        else:
+            with scratch_index(f"{term}-benchmark") as index, scratch_embedding_store():
+                results.append(measure_stage(stage, lambda: index_corpus(index)))
+    return results
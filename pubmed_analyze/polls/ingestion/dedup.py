@@ -0,0 +1,193 @@
+import functools
+import hashlib
+import re
+import zlib
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from polls.models import Article, ArticleSignature, MinHashBand
+
+# Prime above 2**32, the range of the shingle hashes
+PRIME = np.uint64(4294967311)
+WORD = re.compile(r"\w+")
+
+
+def shingles(text, size=None):
+    """
+    Returns the CRC32 hashes of the word shingles of a text, lower-cased.
+
+    Parameters
+    ----------
+    text : str
+        The abstract.
+    size : int, optional
+        Number of words per shingle. Defaults to settings.MINHASH_SHINGLE_SIZE.
+
+    Returns
+    -------
+    set of int
+        The hashes, empty for a text shorter than a shingle.
+    """
+    size = size or settings.MINHASH_SHINGLE_SIZE
+    words = WORD.findall((text or "").lower())
+    return {zlib.crc32(" ".join(words[i:i+size]).encode('utf-8')) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """
+    MinHash signatures and LSH buckets of abstracts.
+
+    The signature of a text holds, for each of `num_perm` random hash functions
+    (a * x + b) mod p, the minimum over the shingles of the text; the fraction of
+    equal values in two signatures estimates the Jaccard similarity of their
+    shingles. The signature is cut in `bands` bands, each hashed to a bucket:
+    two texts with a Jaccard similarity s share at least one bucket with a
+    probability 1 - (1 - s^r)^b, r being the number of rows per band, so the
+    near-duplicates of a text are found by looking up its buckets only.
+
+    Parameters
+    ----------
+    num_perm : int, optional
+        Length of the signatures. Defaults to settings.MINHASH_PERMUTATIONS.
+    bands : int, optional
+        Number of LSH bands, dividing num_perm. Defaults to settings.MINHASH_BANDS.
+    seed : int, optional
+        Seed of the hash functions. Signatures are only comparable with the same seed.
+    """
+
+    def __init__(self, num_perm=None, bands=None, seed=1):
+        self.num_perm = num_perm or settings.MINHASH_PERMUTATIONS
+        self.bands = bands or settings.MINHASH_BANDS
+        if self.num_perm % self.bands:
+            raise ValueError(f"{self.bands} bands do not divide {self.num_perm} permutations")
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 2**31, size=self.num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 2**31, size=self.num_perm, dtype=np.uint64)
+
+    def signature(self, text):
+        """
+        Returns the MinHash signature of a text as uint32 values, or None if it has no shingle.
+        """
+        values = shingles(text)
+        if not values:
+            return None
+        x = np.fromiter(values, dtype=np.uint64, count=len(values))
+        return ((np.outer(x, self.a) + self.b) % PRIME).min(axis=0).astype(np.uint32)
+
+    def buckets(self, signature):
+        """
+        Returns the LSH buckets of a signature, one signed 64-bit hash per band.
+        """
+        rows = self.num_perm // self.bands
+        return [int.from_bytes(hashlib.blake2b(band.to_bytes(2, 'big') + signature[band*rows:(band+1)*rows].tobytes(),
+                                               digest_size=8).digest(), 'big', signed=True)
+                for band in range(self.bands)]
+
+
+@functools.lru_cache(maxsize=1)
+def minhasher():
+    """
+    Returns the MinHasher configured by the settings, shared by the process.
+    """
+    return MinHasher()
+
+
+def similarity(signature, other):
+    """
+    Returns the Jaccard similarity estimated from two signatures.
+    """
+    return float(np.mean(signature == other))
+
+
+def flag_near_duplicates(signatures):
+    """
+    Stores the signatures of new articles and flags those which are near-duplicates.
+
+    The buckets of the new articles are looked up in the MinHashBand index with
+    one query, and each candidate sharing a bucket is kept if the similarity of
+    the signatures reaches settings.MINHASH_THRESHOLD. A near-duplicate gets the
+    `duplicate_of` of the oldest matching article, or that article itself, so
+    every group points to its first article. The new articles are processed by
+    increasing id and also match each other. Articles which already have a
+    signature are skipped: when two ingestion processes insert the same PMID, the
+    second one also receives the id of the article, whose signature was stored
+    by the first.
+
+    Parameters
+    ----------
+    signatures : dict
+        The signature of each new article id, or None for an article without abstract.
+
+    Returns
+    -------
+    int
+        The number of articles flagged as near-duplicates.
+    """
+    hasher = minhasher()
+    stored = set(ArticleSignature.objects.filter(article_id__in=list(signatures)).values_list('article_id', flat=True))
+    buckets = {article_id: hasher.buckets(signature) for article_id, signature in signatures.items()
+               if signature is not None and article_id not in stored}
+    if not buckets:
+        return 0
+    members = {}
+    for bucket, article_id in MinHashBand.objects.filter(bucket__in={bucket for keys in buckets.values() for bucket in keys}).values_list('bucket', 'article_id'):
+        members.setdefault(bucket, set()).add(article_id)
+    candidates = {article_id for ids in members.values() for article_id in ids}
+    known = {article_id: np.frombuffer(bytes(minhash), dtype=np.uint32)
+             for article_id, minhash in ArticleSignature.objects.filter(article_id__in=candidates).values_list('article_id', 'minhash')}
+    originals = dict(Article.objects.filter(id__in=candidates).values_list('id', 'duplicate_of_id'))
+    duplicates = []
+    for article_id in sorted(buckets):
+        signature = signatures[article_id]
+        matches = [candidate for candidate in {member for bucket in buckets[article_id] for member in members.get(bucket, ())}
+                   if candidate != article_id and candidate in known
+                   and similarity(signature, known[candidate]) >= settings.MINHASH_THRESHOLD]
+        original = None
+        if matches:
+            first = min(matches)
+            original = originals.get(first) or first
+            duplicates.append(Article(id=article_id, duplicate_of_id=original))
+        known[article_id] = signature
+        originals[article_id] = original
+        for bucket in buckets[article_id]:
+            members.setdefault(bucket, set()).add(article_id)
+    ArticleSignature.objects.bulk_create([ArticleSignature(article_id=article_id, minhash=signatures[article_id].tobytes())
+                                          for article_id in buckets], ignore_conflicts=True)
+    MinHashBand.objects.bulk_create([MinHashBand(article_id=article_id, bucket=bucket)
+                                     for article_id, keys in buckets.items() for bucket in keys])
+    if duplicates:
+        Article.objects.bulk_update(duplicates, ['duplicate_of'])
+    return len(duplicates)
+
+
+def flag_existing_duplicates(batch_size=None):
+    """
+    Computes the signatures of the articles ingested before the near-duplicate detection.
+
+    The articles without signature are processed by increasing id and by
+    batches of `batch_size`, each in its own transaction, with
+    `flag_near_duplicates`.
+
+    Parameters
+    ----------
+    batch_size : int, optional
+        Number of articles per batch. Defaults to settings.INGEST_BATCH_SIZE.
+
+    Returns
+    -------
+    int
+        The number of articles flagged as near-duplicates.
+    """
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    hasher = minhasher()
+    flagged = 0
+    last_id = 0
+    while batch := list(Article.objects.filter(id__gt=last_id, signature__isnull=True)
+                        .order_by('id').values_list('id', 'abstract')[:batch_size]):
+        signatures = {article_id: hasher.signature(abstract) for article_id, abstract in batch}
+        with transaction.atomic():
+            flagged += flag_near_duplicates(signatures)
+        last_id = batch[-1][0]
+    return flagged
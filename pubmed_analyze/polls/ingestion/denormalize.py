@@ -0,0 +1,84 @@
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from polls.ingestion.pgcopy import table
+from polls.models import Article, ArticlesWithAuthors, Authorship
+
+logger = logging.getLogger(__name__)
+
+
+def refresh_articles_with_authors():
+    """
+    Refreshes the ArticlesWithAuthors materialized view. PostgreSQL only.
+
+    The view is refreshed CONCURRENTLY, using its unique index on the article id,
+    so the article list keeps reading the previous rows while the new ones are
+    computed, and only the rows which changed are written.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {table(ArticlesWithAuthors)}")
+
+
+class RefreshDebouncer:
+    """
+    Coalesces the refreshes of the ArticlesWithAuthors view requested by a burst of writes.
+
+    The first request starts a timer; the requests made before it fires are
+    absorbed, and the view is refreshed once, `delay` seconds after the first
+    request, in the timer thread. A request made during a refresh starts a new
+    timer, so the last write is always followed by a refresh.
+
+    Parameters
+    ----------
+    delay : float, optional
+        Seconds between the first request and the refresh. Defaults to
+        settings.ARTICLES_REFRESH_DELAY.
+    refresh : callable, optional
+        The refresh to run. Defaults to `refresh_articles_with_authors`.
+    """
+
+    def __init__(self, delay=None, refresh=None):
+        self.delay = settings.ARTICLES_REFRESH_DELAY if delay is None else delay
+        self.refresh = refresh or refresh_articles_with_authors
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def schedule(self):
+        """
+        Requests a refresh, unless one is already pending.
+        """
+        with self.lock:
+            if self.timer is None:
+                self.timer = threading.Timer(self.delay, self.run)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def run(self):
+        with self.lock:
+            self.timer = None
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception("Refresh of the articles with authors failed")
+        finally:
+            connections.close_all()
+
+
+refresh_debouncer = RefreshDebouncer()
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+@receiver(post_save, sender=Authorship)
+@receiver(post_delete, sender=Authorship)
+def schedule_refresh(sender, **kwargs):
+    """
+    Schedules a refresh of the ArticlesWithAuthors view once the write is committed.
+    """
+    if settings.ARTICLES_REFRESH_DELAY is not None:
+        transaction.on_commit(refresh_debouncer.schedule)
@@ -0,0 +1,119 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from polls.ingestion.records import normalize_name
+from polls.models import Affiliations, Authors
+
+# Measured size of one entry (hash key, id and reverse mapping) with tracemalloc
+ENTRY_BYTES = 400
+
+
+class NameCache:
+    """
+    Process-level LRU cache mapping author and affiliation names to their ids.
+
+    The names are normalized with `normalize_name` and stored as 16-byte blake2b
+    hashes, so an entry has the same size whatever the length of the name and
+    the cache is bounded by `max_bytes`: once full, the least recently used
+    entries are evicted. Entries are only added once the transaction which read
+    or created the rows is committed, and the entry of a row is dropped when the
+    row is renamed or deleted, so the cache never holds an id missing from the
+    database. Access is serialized by a lock, so it can be shared by threads.
+
+    Parameters
+    ----------
+    max_bytes : int, optional
+        The memory budget of the cache. Defaults to settings.NAME_CACHE_MAX_BYTES.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_entries = max(1, (max_bytes or settings.NAME_CACHE_MAX_BYTES) // ENTRY_BYTES)
+        self.entries = OrderedDict()
+        self.keys_by_id = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def key(self, model, name):
+        """
+        Returns the cache key of a name: the model label and the hash of the normalized name.
+        """
+        return model._meta.label, hashlib.blake2b(normalize_name(name).encode('utf-8'), digest_size=16).digest()
+
+    def get_many(self, model, names):
+        """
+        Returns the cached ids of the given names and marks them as recently used.
+
+        Returns
+        -------
+        dict
+            The id of each name found in the cache.
+        """
+        ids = {}
+        with self.lock:
+            for name in names:
+                key = self.key(model, name)
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    ids[name] = self.entries[key]
+        return ids
+
+    def set_many(self, model, ids):
+        """
+        Adds the ids of the given names, evicting the least recently used entries beyond the cap.
+
+        Parameters
+        ----------
+        model : type
+            Authors or Affiliations.
+        ids : dict
+            The id of each name.
+        """
+        with self.lock:
+            for name, pk in ids.items():
+                key = self.key(model, name)
+                previous = self.entries.pop(key, None)
+                if previous is not None:
+                    self.keys_by_id.pop((key[0], previous), None)
+                self.entries[key] = pk
+                self.keys_by_id[(key[0], pk)] = key
+            while len(self.entries) > self.max_entries:
+                (label, _), pk = self.entries.popitem(last=False)
+                self.keys_by_id.pop((label, pk), None)
+
+    def discard(self, model, pk):
+        """
+        Drops the entry of a row, if it is cached.
+        """
+        with self.lock:
+            key = self.keys_by_id.pop((model._meta.label, pk), None)
+            if key is not None:
+                del self.entries[key]
+
+    def clear(self):
+        """
+        Empties the cache.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.keys_by_id.clear()
+
+
+name_cache = NameCache()
+
+
+@receiver(post_save, sender=Authors)
+@receiver(post_save, sender=Affiliations)
+@receiver(post_delete, sender=Authors)
+@receiver(post_delete, sender=Affiliations)
+def invalidate_name(sender, instance, **kwargs):
+    """
+    Drops the cached id of an author or affiliation which was renamed or deleted.
+    """
+    name_cache.discard(sender, instance.pk)
@@ -0,0 +1,289 @@
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+from polls.ingestion.dedup import flag_near_duplicates, minhasher
+from polls.ingestion.interning import name_cache
+from polls.ingestion.pgcopy import copy_ingest_batch, lock_key_resolution
+from polls.ingestion.readers import read_jsonl_range, read_records, shard_ranges
+from polls.ingestion.records import batched, normalize_name, parse_date
+from polls.models import Affiliations, Article, Authors, Authorship
+
+
+def upsert_names(model, names):
+    """
+    Returns the ids of the `model` rows with the given names, creating the missing rows.
+
+    The rows are written by a single INSERT ... ON CONFLICT on the unique md5 of
+    the name, which returns the id of every row, created or not. The cost only
+    depends on the number of names, not on the size of the table.
+
+    Parameters
+    ----------
+    model : type
+        Authors or Affiliations.
+    names : iterable of str
+        The names to look up.
+
+    Returns
+    -------
+    dict
+        The id of each name.
+    """
+    rows = model.objects.bulk_create([model(name=name) for name in set(names)],
+                                     update_conflicts=True, unique_fields=['name_hash'], update_fields=['name'])
+    return {row.name: row.id for row in rows}
+
+
+def resolve_names(model, names):
+    """
+    Returns the ids of the given author or affiliation names, creating the missing rows.
+
+    The ids are looked up in the process-level `name_cache` first, and only the
+    names missing from it are upserted, in a single query, on their normalized
+    form. The ids read are cached once the current transaction is committed.
+
+    Parameters
+    ----------
+    model : type
+        Authors or Affiliations.
+    names : iterable of str
+        The names to resolve.
+
+    Returns
+    -------
+    dict
+        The id of each name, as given.
+    """
+    names = set(names)
+    ids = name_cache.get_many(model, names)
+    missing = {name: normalize_name(name) for name in names if name not in ids}
+    if missing:
+        upserted = upsert_names(model, missing.values())
+        transaction.on_commit(lambda: name_cache.set_many(model, upserted))
+        ids.update((name, upserted[normalized]) for name, normalized in missing.items())
+    return ids
+
+
+def ingest_batch(records, term, lock=False):
+    """
+    Saves a batch of article records and their authorships in one transaction.
+
+    The articles of the batch are upserted on their pmid with one `bulk_create`,
+    which returns their ids, the ids of the author and affiliation names are
+    resolved by `resolve_names`, which only queries the names missing from the
+    name cache, then the authorships are created with `ignore_conflicts`, so a
+    batch can be ingested again, or concurrently, without creating duplicates.
+    The new articles which are near-duplicates of known ones are flagged with
+    `flag_near_duplicates`. The model instances and the MinHash signatures of
+    the abstracts are built before the transaction is opened.
+
+    Parameters
+    ----------
+    records : list of dict
+        Article records in the scraper schema.
+    term : str
+        The search term stored on the new articles.
+    lock : bool, optional
+        Whether to take the ingestion lock before writing, when batches are
+        written by parallel workers.
+
+    Returns
+    -------
+    int
+        The number of articles created.
+    """
+    articles = {int(record['pmid']): Article(title=record.get('title', ""),
+                                             abstract=record.get('abstract', ""),
+                                             date=parse_date(record.get('date')), url=record.get('url', ""),
+                                             pmid=int(record['pmid']), doi=record.get('doi', ""),
+                                             mesh_terms=record.get('mesh_terms', ""),
+                                             disclosure=record.get('disclosure', ""),
+                                             title_review=record.get('title_review', ""),
+                                             term=term)
+                for record in records if record.get('pmid')}
+    authorships = [(int(record['pmid']), author_affiliation.get('author_name', ""), affiliation)
+                   for record in records if record.get('pmid')
+                   for author_affiliation in record.get('authors_affiliations') or []
+                   for affiliation in author_affiliation.get('affiliations') or []]
+    signatures = ({pmid: minhasher().signature(article.abstract) for pmid, article in articles.items()}
+                  if settings.MINHASH_ENABLED else None)
+    with transaction.atomic():
+        if lock:
+            with connection.cursor() as cursor:
+                lock_key_resolution(cursor)
+        article_ids = dict(Article.objects.filter(pmid__in=list(articles)).values_list('pmid', 'id'))
+        new_articles = [article for pmid, article in articles.items() if pmid not in article_ids]
+        if new_articles:
+            Article.objects.bulk_create(new_articles, update_conflicts=True, unique_fields=['pmid'], update_fields=['pmid'])
+            article_ids.update((article.pmid, article.id) for article in new_articles)
+            if signatures:
+                flag_near_duplicates({article.id: signatures[article.pmid] for article in new_articles})
+        author_ids = resolve_names(Authors, (author_name for _, author_name, _ in authorships))
+        affiliation_ids = resolve_names(Affiliations, (affiliation for _, _, affiliation in authorships))
+        Authorship.objects.bulk_create([Authorship(article_id=article_ids[pmid],
+                                                   author_id=author_ids[author_name],
+                                                   affiliation_id=affiliation_ids[affiliation])
+                                        for pmid, author_name, affiliation in authorships],
+                                       ignore_conflicts=True)
+    return len(new_articles)
+
+
+def ingest_records(records, term, batch_size=None, progress=None, method=None, lock=False):
+    """
+    Streams article records into the database by bounded batches.
+
+    The records are consumed lazily, so memory only depends on the batch size,
+    and every batch is committed in its own transaction: an interrupted
+    ingestion keeps the batches already committed and can simply be run again.
+    With the 'copy' method, batches are loaded by `copy_ingest_batch` through
+    COPY and staging tables instead of the ORM, which requires PostgreSQL.
+
+    Parameters
+    ----------
+    records : iterable of dict
+        Article records in the scraper schema, e.g. from `iter_export`.
+    term : str
+        The search term stored on the new articles.
+    batch_size : int, optional
+        Number of records per transaction. Defaults to settings.INGEST_BATCH_SIZE,
+        or settings.COPY_BATCH_SIZE with the 'copy' method.
+    progress : callable, optional
+        Called with a progress message after each batch.
+    method : str, optional
+        'orm' or 'copy'. Defaults to settings.INGEST_METHOD.
+    lock : bool, optional
+        Whether each batch takes the ingestion lock before writing, when several
+        processes ingest at the same time.
+
+    Returns
+    -------
+    int
+        The number of articles created.
+    """
+    method = method or settings.INGEST_METHOD
+    if method == 'copy':
+        ingest, batch_size = copy_ingest_batch, batch_size or settings.COPY_BATCH_SIZE
+    else:
+        ingest, batch_size = ingest_batch, batch_size or settings.INGEST_BATCH_SIZE
+    start = time.perf_counter()
+    read = created = 0
+    for batch in batched(records, batch_size):
+        created += ingest(batch, term, lock)
+        read += len(batch)
+        if progress:
+            elapsed = time.perf_counter() - start
+            progress(f"{term}: {read} records read, {created} articles created ({read / elapsed:.0f} records/s)")
+    return created
+
+
+def input_paths(patterns, term):
+    """
+    Returns the input files of a term.
+
+    Each pattern is a glob relative to settings.INGEST_INPUT_DIR in which "{term}"
+    is replaced by the term. The files of the first pattern matching anything are
+    returned, so listing "json/{term}.jsonl" before "json/{term}.json" prefers the
+    JSONL export of a term over its legacy JSON export.
+
+    Parameters
+    ----------
+    patterns : list of str
+        The globs, by order of preference.
+    term : str
+        The term of the files.
+
+    Returns
+    -------
+    list of str
+        The matching files, sorted, or an empty list.
+    """
+    for pattern in patterns:
+        paths = sorted(glob.glob(os.path.join(settings.INGEST_INPUT_DIR, pattern.format(term=term))))
+        if paths:
+            return paths
+    return []
+
+
+def ingest_shard(path, term, start, end, batch_size=None, method=None):
+    """
+    Ingests a file, or a byte range of a JSONL file, in a worker process of `ingest_inputs`.
+
+    Returns
+    -------
+    tuple
+        The number of records read and of articles created.
+    """
+    records = read_records(path) if start is None else read_jsonl_range(path, start, end)
+    read = 0
+
+    def counted(records):
+        nonlocal read
+        for record in records:
+            read += 1
+            yield record
+
+    created = ingest_records(counted(records), term, batch_size, method=method, lock=True)
+    return read, created
+
+
+def ingest_inputs(patterns=None, terms=None, batch_size=None, progress=None, method=None, workers=None):
+    """
+    Ingests the export files of every term, whatever their format.
+
+    The files of each term are found with `input_paths`, read by the reader of
+    their format with `read_records` and saved by `ingest_records`, so JSON, JSONL,
+    CSV and Parquet exports all go through the same batched writer.
+
+    With several workers, the files, and the JSONL files by ranges of
+    settings.INGEST_SHARD_BYTES, are spread over a pool of processes, each with
+    its own database connection. Reading, normalizing and building the batches
+    run in parallel; only their writes are serialized by the ingestion lock.
+
+    Parameters
+    ----------
+    patterns : list of str, optional
+        The input globs. Defaults to settings.INGEST_PATTERNS.
+    terms : list of str, optional
+        The terms to ingest, stored on their articles. Defaults to settings.INGEST_TERMS.
+    batch_size, progress, method
+        Passed to `ingest_records`. With several workers, `progress` is called once
+        per file or range ingested.
+    workers : int, optional
+        Number of worker processes. Defaults to settings.INGEST_WORKERS.
+
+    Returns
+    -------
+    int
+        The number of articles created.
+    """
+    workers = workers or settings.INGEST_WORKERS
+    created = 0
+    shards = []
+    for term in terms or settings.INGEST_TERMS:
+        paths = input_paths(settings.INGEST_PATTERNS if patterns is None else patterns, term)
+        if not paths and progress:
+            progress(f"{term}: no input file")
+        if workers <= 1:
+            for path in paths:
+                created += ingest_records(read_records(path), term, batch_size, progress, method)
+        else:
+            shards.extend((path, term, start, end) for path in paths for start, end in shard_ranges(path))
+    if shards:
+        # The workers must open their own connections instead of sharing the forked ones
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(ingest_shard, *shard, batch_size, method): shard for shard in shards}
+            for future in as_completed(futures):
+                path, term, start, end = futures[future]
+                read, shard_created = future.result()
+                created += shard_created
+                if progress:
+                    part = "" if start is None else f" [{start}:{end}]"
+                    progress(f"{term}: {Path(path).name}{part}: {read} records read, {shard_created} articles created")
+    return created
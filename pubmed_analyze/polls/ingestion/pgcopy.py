@@ -0,0 +1,148 @@
+import io
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from polls.ingestion.dedup import flag_near_duplicates, minhasher
+from polls.ingestion.records import parse_date
+from polls.models import Affiliations, Article, Authors, Authorship
+
+
+ARTICLE_COLUMNS = ['pmid', 'title_review', 'date', 'title', 'abstract', 'doi', 'disclosure', 'mesh_terms', 'url', 'term']
+
+# Key of the PostgreSQL advisory lock serializing the writes of parallel ingestion workers
+INGEST_LOCK_ID = 7_012_024
+
+
+def copy_value(value):
+    """
+    Formats a value for the text format of COPY, where NULL is written \\N.
+    """
+    if value is None:
+        return "\\N"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+class RowStream(io.TextIOBase):
+    """
+    Read-only text stream producing COPY rows from an iterable of tuples.
+
+    `copy_expert` reads the stream by blocks, so the rows are formatted while
+    they are sent to the server instead of being built in memory first.
+    """
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = ""
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.buffer += "\t".join(copy_value(value) for value in row) + "\n"
+        if size < 0:
+            data, self.buffer = self.buffer, ""
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def column(model, field):
+    """
+    Returns the quoted database column of a model field, e.g. "pubmed id".
+    """
+    return connection.ops.quote_name(model._meta.get_field(field).column)
+
+
+def table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def lock_key_resolution(cursor):
+    """
+    Waits for the ingestion lock, held until the end of the current transaction.
+
+    Parallel ingestion workers take it before writing the articles, names and
+    authorships of a batch, so their upserts on the natural keys are serialized
+    instead of deadlocking, while the preparation of the batches runs in
+    parallel. Only taken on PostgreSQL, where it is a transaction-level advisory lock.
+    """
+    if connection.vendor == 'postgresql':
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [INGEST_LOCK_ID])
+
+
+def copy_ingest_batch(records, term, lock=False):
+    """
+    Saves a batch of article records with COPY and set-based SQL. PostgreSQL only.
+
+    The articles and the (pmid, author, affiliation) triples of the batch are
+    streamed with `COPY ... FROM STDIN` into temporary staging tables, dropped
+    once merged. Missing authors, affiliations and articles are then inserted with one
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING each on their unique natural
+    keys, and the authorships are built by joining the staging
+    triples with the `polls_*` tables, so the ids are resolved by the database
+    and no model instance is created in Python. The new articles which are
+    near-duplicates of known ones are flagged with `flag_near_duplicates`.
+
+    Parameters
+    ----------
+    records : list of dict
+        Article records in the scraper schema.
+    term : str
+        The search term stored on the new articles.
+    lock : bool, optional
+        Whether to take the ingestion lock before merging the staging tables,
+        when batches are written by parallel workers.
+
+    Returns
+    -------
+    int
+        The number of articles created.
+    """
+    articles = {int(record['pmid']): record for record in records if record.get('pmid')}
+    article_rows = ((pmid, record.get('title_review'), parse_date(record.get('date')), record.get('title'),
+                     record.get('abstract'), record.get('doi'), record.get('disclosure'),
+                     record.get('mesh_terms'), record.get('url'), term)
+                    for pmid, record in articles.items())
+    authorship_rows = ((pmid, author_affiliation.get('author_name', ""), affiliation)
+                       for pmid, record in articles.items()
+                       for author_affiliation in record.get('authors_affiliations') or []
+                       for affiliation in author_affiliation.get('affiliations') or [])
+    signatures = ({pmid: minhasher().signature(record.get('abstract')) for pmid, record in articles.items()}
+                  if settings.MINHASH_ENABLED else None)
+    article_columns = ", ".join(column(Article, field) for field in ARTICLE_COLUMNS)
+    author_name, affiliation_name, pmid = column(Authors, 'name'), column(Affiliations, 'name'), column(Article, 'pmid')
+    author_hash, affiliation_hash = column(Authors, 'name_hash'), column(Affiliations, 'name_hash')
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"""CREATE TEMPORARY TABLE stage_article AS SELECT {article_columns} FROM {table(Article)} WITH NO DATA;
+                           CREATE TEMPORARY TABLE stage_authorship (pmid integer, author text, affiliation text)""")
+        cursor.copy_expert(f"COPY stage_article ({article_columns}) FROM STDIN", RowStream(article_rows))
+        cursor.copy_expert("COPY stage_authorship (pmid, author, affiliation) FROM STDIN", RowStream(authorship_rows))
+        if lock:
+            lock_key_resolution(cursor)
+        cursor.execute(f"""
+            INSERT INTO {table(Authors)} ({author_name})
+            SELECT DISTINCT author FROM stage_authorship ON CONFLICT ({author_hash}) DO NOTHING;
+            INSERT INTO {table(Affiliations)} ({affiliation_name})
+            SELECT DISTINCT affiliation FROM stage_authorship ON CONFLICT ({affiliation_hash}) DO NOTHING""")
+        cursor.execute(f"""
+            INSERT INTO {table(Article)} ({article_columns})
+            SELECT {article_columns} FROM stage_article ON CONFLICT ({pmid}) DO NOTHING
+            RETURNING id, {pmid}""")
+        new_articles = cursor.fetchall()
+        created = len(new_articles)
+        if signatures:
+            flag_near_duplicates({article_id: signatures[article_pmid] for article_id, article_pmid in new_articles})
+        cursor.execute(f"""
+            INSERT INTO {table(Authorship)} (article_id, author_id, affiliation_id)
+            SELECT DISTINCT ar.id, au.id, af.id FROM stage_authorship s
+            JOIN {table(Article)} ar ON ar.{pmid} = s.pmid
+            JOIN {table(Authors)} au ON au.{author_hash} = md5(s.author)
+            JOIN {table(Affiliations)} af ON af.{affiliation_hash} = md5(s.affiliation)
+            ON CONFLICT DO NOTHING;
+            DROP TABLE stage_article, stage_authorship""")
+    return created
@@ -0,0 +1,199 @@
+import ast
+import csv
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from polls.ingestion.records import normalize_name, parse_date
+from polls.scraping.export import iter_json_array, iter_jsonl
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+
+def require_pyarrow():
+    """
+    Raises ImproperlyConfigured if the optional pyarrow package is missing.
+    """
+    if pq is None:
+        raise ImproperlyConfigured("Reading Parquet files requires the pyarrow package: pip install pyarrow")
+
+
+def parse_authors_affiliations(value):
+    """
+    Returns the authorships of a record as a list of {'author_name', 'affiliations'} dicts.
+
+    CSV exports store the list as a JSON string, and the CSV files written before
+    `CsvWriter` hold its Python representation; both are decoded here. A single
+    affiliation given as a string is wrapped in a list, and the names are normalized
+    with `normalize_name`.
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            value = ast.literal_eval(value)
+    authors_affiliations = []
+    for author_affiliation in value:
+        affiliations = author_affiliation.get('affiliations') or []
+        if isinstance(affiliations, str):
+            affiliations = [affiliations]
+        authors_affiliations.append({'author_name': normalize_name(author_affiliation.get('author_name')),
+                                     'affiliations': [normalize_name(affiliation) for affiliation in affiliations]})
+    return authors_affiliations
+
+
+def normalize_record(record):
+    """
+    Returns a record with the types expected by the loaders, whatever its source format.
+
+    The pmid becomes an int (or None), the date placeholders None, the missing text
+    fields empty strings and `authors_affiliations` a list of dicts.
+    """
+    pmid = record.get('pmid')
+    return {'title_review': record.get('title_review') or "",
+            'date': parse_date(record.get('date')),
+            'title': record.get('title') or "",
+            'abstract': record.get('abstract') or "",
+            'pmid': int(pmid) if pmid not in (None, "", "None") else None,
+            'doi': record.get('doi') or "",
+            'disclosure': record.get('disclosure') or "",
+            'mesh_terms': record.get('mesh_terms') or "",
+            'url': record.get('url') or "",
+            'authors_affiliations': parse_authors_affiliations(record.get('authors_affiliations'))}
+
+
+def read_json(path):
+    """
+    Yields the raw records of a JSON array export.
+    """
+    yield from iter_json_array(path)
+
+
+def read_jsonl(path):
+    """
+    Yields the raw records of a JSONL export.
+    """
+    yield from iter_jsonl(path)
+
+
+def read_csv(path):
+    """
+    Yields the raw rows of a CSV export.
+    """
+    with Path(path).open('r', newline='', encoding='utf-8') as f:
+        yield from csv.DictReader(f)
+
+
+def read_parquet(path):
+    """
+    Yields the raw rows of a Parquet file, decoded by batches of settings.INGEST_BATCH_SIZE rows.
+    """
+    require_pyarrow()
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=settings.INGEST_BATCH_SIZE):
+        yield from batch.to_pylist()
+
+
+READERS = {
+    '.json': read_json,
+    '.jsonl': read_jsonl,
+    '.csv': read_csv,
+    '.parquet': read_parquet,
+}
+
+
+def read_records(path):
+    """
+    Streams the normalized article records of an export file.
+
+    The reader is chosen from the file suffix, and every record goes through
+    `normalize_record`, so the loaders receive the same schema from every format.
+
+    Parameters
+    ----------
+    path : str or Path
+        A .json, .jsonl, .csv or .parquet file.
+
+    Yields
+    ------
+    dict
+        The normalized records.
+
+    Raises
+    ------
+    ValueError
+        If there is no reader for the suffix of the file.
+    """
+    path = Path(path)
+    reader = READERS.get(path.suffix)
+    if reader is None:
+        raise ValueError(f"No reader for {path.suffix} files: {path}")
+    for record in reader(path):
+        yield normalize_record(record)
+
+
+def read_jsonl_range(path, start, end):
+    """
+    Streams the normalized records of the lines of a JSONL file starting in [start, end).
+
+    The ranges of `shard_ranges` therefore split a file between workers without
+    losing or repeating a line, whatever the byte offsets. A trailing line without
+    a newline is skipped, as in `iter_jsonl`.
+
+    Parameters
+    ----------
+    path : str or Path
+        The JSONL file.
+    start, end : int
+        The byte range of the shard.
+
+    Yields
+    ------
+    dict
+        The normalized records.
+    """
+    with Path(path).open('rb') as f:
+        if start > 0:
+            # The line holding the byte before the range belongs to the previous shard
+            f.seek(start - 1)
+            f.readline()
+        while f.tell() < end:
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                break
+            line = line.strip()
+            if line:
+                yield normalize_record(json.loads(line))
+
+
+def shard_ranges(path, shard_bytes=None):
+    """
+    Splits a file into the byte ranges read by parallel ingestion workers.
+
+    Only JSONL files can be split, since any byte offset can be moved to the next
+    line; other formats are read whole by a single worker.
+
+    Parameters
+    ----------
+    path : str or Path
+        The input file.
+    shard_bytes : int, optional
+        The size of the ranges. Defaults to settings.INGEST_SHARD_BYTES.
+
+    Returns
+    -------
+    list of tuple
+        The (start, end) ranges, or [(None, None)] for a file read whole.
+    """
+    path = Path(path)
+    if path.suffix != '.jsonl':
+        return [(None, None)]
+    shard_bytes = shard_bytes or settings.INGEST_SHARD_BYTES
+    size = path.stat().st_size
+    return [(start, min(start + shard_bytes, size)) for start in range(0, size, shard_bytes)] or [(0, 0)]
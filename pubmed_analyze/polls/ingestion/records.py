@@ -0,0 +1,27 @@
+import unicodedata
+from itertools import islice
+
+
+def batched(iterable, size):
+    """
+    Yields lists of at most `size` items taken from `iterable`.
+    """
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def parse_date(value):
+    """
+    Returns the date of a record, or None for the placeholders written by the scrapers.
+    """
+    if value is None or str(value).lower() in ["none", "", "null"]:
+        return None
+    return value
+
+
+def normalize_name(name):
+    """
+    Returns an author or affiliation name in Unicode NFC form with its whitespace collapsed.
+    """
+    return " ".join(unicodedata.normalize("NFC", name or "").split())
@@ -0,0 +1,195 @@
+import os
+from collections import deque
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from polls.scraping.export import JsonlWriter
+
+FIRST_NAMES = ["James", "Mary", "Wei", "Fatima", "Lukas", "Sofia", "Hiroshi", "Aisha", "Mateo", "Olga",
+               "Pierre", "Chloé", "Rahul", "Ana", "Kwame", "Ingrid", "Yusuf", "Mei", "Carlos", "Elena",
+               "David", "Amira", "Jonas", "Laura", "Kenji", "Zainab", "Marco", "Julia", "Arjun", "Nadia",
+               "Thomas", "Leila", "Björn", "Camille", "Omar", "Sara", "Paolo", "Hana", "Ivan", "Grace"]
+LAST_NAMES = ["Smith", "Wang", "García", "Müller", "Kim", "Nguyen", "Rossi", "Dubois", "Kowalski", "Silva",
+              "Tanaka", "Okafor", "Johansson", "Ivanova", "Cohen", "Patel", "Martin", "Schmidt", "Hernández", "Chen",
+              "Lefebvre", "Andersen", "Novak", "Costa", "Yamamoto", "Haddad", "Fischer", "Moreau", "Singh", "Brown",
+              "Popescu", "Nakamura", "Jensen", "Ferreira", "Lambert", "Horvat", "Ali", "Weber", "Santos", "Li"]
+DEPARTMENTS = ["Neurology", "Internal Medicine", "Immunology", "Epidemiology", "Radiology", "Dermatology",
+               "Infectious Diseases", "Pharmacology", "Biostatistics", "Pediatrics", "Public Health", "Virology"]
+CITIES = ["Paris", "Boston", "Tokyo", "Berlin", "Toronto", "Milan", "Sydney", "Seoul", "Madrid", "Stockholm",
+          "Lyon", "Chicago", "Zurich", "Amsterdam", "São Paulo", "Cape Town", "Montreal", "Vienna", "Oslo", "Dublin"]
+JOURNALS = ["Lancet (London, England)", "Neurology", "Multiple sclerosis (Houndmills, Basingstoke, England)",
+            "The New England journal of medicine", "Vaccine", "JAMA neurology", "BMJ (Clinical research ed.)",
+            "Journal of neurology", "Clinical infectious diseases", "PloS one", "Frontiers in immunology",
+            "Annals of neurology", "The Journal of infectious diseases", "Scientific reports"]
+MESH_TERMS = ["Humans", "Female", "Male", "Adult", "Middle Aged", "Aged", "Young Adult", "Risk Factors",
+              "Multiple Sclerosis* / drug therapy", "Multiple Sclerosis* / diagnosis", "Herpes Zoster* / prevention & control",
+              "Herpes Zoster Vaccine", "Magnetic Resonance Imaging", "Cohort Studies", "Retrospective Studies",
+              "Treatment Outcome", "Quality of Life", "Incidence", "Immunosuppressive Agents", "Review"]
+WORDS = ["patients", "disease", "treatment", "study", "multiple", "sclerosis", "risk", "clinical", "results",
+         "herpes", "zoster", "vaccine", "cohort", "years", "associated", "outcomes", "analysis", "therapy",
+         "immune", "lesions", "relapse", "progression", "incidence", "infection", "data", "trial", "effect",
+         "group", "compared", "increased", "reduced", "significant", "age", "women", "men", "baseline",
+         "follow-up", "MRI", "brain", "spinal", "cord", "inflammatory", "demyelinating", "antibodies",
+         "efficacy", "safety", "adverse", "events", "hospital", "population", "factors", "diagnosis"]
+
+
+def zipf_weights(size, exponent):
+    """
+    Returns the cumulative Zipf probabilities of `size` ranks, the first being the most frequent.
+    """
+    weights = np.arange(1, size + 1, dtype=np.float64) ** -exponent
+    return np.cumsum(weights) / weights.sum()
+
+
+def author_name(rank):
+    """
+    Returns the distinct author name of a rank, combining first names, initials and last names.
+    """
+    rank, first = divmod(rank, len(FIRST_NAMES))
+    rank, last = divmod(rank, len(LAST_NAMES))
+    initials = ""
+    while rank:
+        rank, letter = divmod(rank - 1, 26)
+        initials = chr(ord('A') + letter) + ". " + initials
+    return f"{FIRST_NAMES[first]} {initials}{LAST_NAMES[last]}"
+
+
+def affiliation_name(rank):
+    """
+    Returns the distinct affiliation name of a rank: a department of an institution of a city.
+    """
+    site, department = divmod(rank, len(DEPARTMENTS))
+    number, city = divmod(site, len(CITIES))
+    institution = f"{CITIES[city]} University Hospital" if number == 0 else f"{CITIES[city]} Medical Center {number}"
+    return f"Department of {DEPARTMENTS[department]}, {institution}, {CITIES[city]}"
+
+
+class SyntheticCorpus:
+    """
+    Generator of PubMed-like article records, for benchmarks at a chosen scale.
+
+    The records have the schema of the scraper exports. Authors and affiliations
+    are drawn from pools of distinct names with Zipf-distributed ranks, so a few
+    names appear in many articles and most in a few, as in PubMed, and the words
+    of the titles and abstracts are drawn the same way from a pseudo-vocabulary.
+    A fraction of the articles copy the abstract of a previous one with a word
+    changed, to exercise the near-duplicate detection. The corpus only depends on
+    its parameters and its seed.
+
+    Parameters
+    ----------
+    size : int
+        Number of articles.
+    seed : int, optional
+        Seed of the random generator.
+    authors : int, optional
+        Size of the author pool. Defaults to `size`.
+    affiliations : int, optional
+        Size of the affiliation pool. Defaults to `size` // 10.
+    exponent : float, optional
+        Exponent of the Zipf distributions of the names. Defaults to 0.6, with
+        which the most frequent author signs about 5% of the articles and the
+        median author 4. The words follow a Zipf law of exponent 1.1.
+    duplicate_rate : float, optional
+        Fraction of near-duplicate abstracts. Defaults to 0.01.
+    """
+
+    def __init__(self, size, seed=0, authors=None, affiliations=None, exponent=0.6, duplicate_rate=0.01):
+        self.size = size
+        self.seed = seed
+        self.duplicate_rate = duplicate_rate
+        self.authors = zipf_weights(authors or max(size, 1), exponent)
+        self.affiliations = zipf_weights(affiliations or max(size // 10, 1), exponent)
+        rng = np.random.default_rng(seed)
+        stems = [a + b for a in ["neuro", "immuno", "myel", "lymph", "cyto", "derm", "vir", "gli", "ax", "encephal"]
+                 for b in ["al", "itis", "osis", "ic", "in", "ase", "ogen", "oma", "ocyte", "opathy"]]
+        vocabulary = WORDS + stems + ["".join(rng.choice(list("aeioubcdfgklmnprstvz"), size=rng.integers(4, 11)))
+                                      for _ in range(5000)]
+        self.vocabulary = np.array(vocabulary, dtype=object)
+        self.words = zipf_weights(len(vocabulary), 1.1)
+        self.journals = zipf_weights(len(JOURNALS), 1.1)
+
+    def __len__(self):
+        return self.size
+
+    def draw(self, rng, cumulative, count):
+        """
+        Returns `count` Zipf ranks drawn with the cumulative probabilities of `zipf_weights`.
+        """
+        return np.minimum(np.searchsorted(cumulative, rng.random(count)), len(cumulative) - 1)
+
+    def text(self, rng, low, high):
+        """
+        Returns a random text of between `low` and `high` words.
+        """
+        return " ".join(self.vocabulary[self.draw(rng, self.words, int(rng.integers(low, high + 1)))])
+
+    def records(self):
+        """
+        Yields the article records of the corpus.
+
+        Yields
+        ------
+        dict
+            A record in the scraper export schema.
+        """
+        rng = np.random.default_rng(self.seed)
+        recent = deque(maxlen=100)
+        start = date(2000, 1, 1)
+        for index in range(self.size):
+            pmid = str(10_000_000 + index)
+            if recent and rng.random() < self.duplicate_rate:
+                words = recent[int(rng.integers(len(recent)))].split()
+                words[int(rng.integers(len(words)))] = self.vocabulary[self.draw(rng, self.words, 1)[0]]
+                abstract = " ".join(words)
+            else:
+                abstract = self.text(rng, 120, 300)
+            recent.append(abstract)
+            authors_affiliations = []
+            for rank in dict.fromkeys(self.draw(rng, self.authors, 1 + int(rng.poisson(5))).tolist()):
+                ranks = self.draw(rng, self.affiliations, 1 + int(rng.random() < 0.3)).tolist()
+                authors_affiliations.append({'author_name': author_name(rank),
+                                             'affiliations': [affiliation_name(rank) for rank in dict.fromkeys(ranks)]})
+            yield {'title_review': JOURNALS[self.draw(rng, self.journals, 1)[0]],
+                   'date': (start + timedelta(days=int(rng.integers(0, 9000)))).isoformat(),
+                   'title': self.text(rng, 6, 18).capitalize(),
+                   'abstract': abstract,
+                   'pmid': pmid,
+                   'doi': f"https://doi.org/10.5555/synthetic.{pmid}",
+                   'disclosure': "The authors declare no conflict of interest.",
+                   'mesh_terms': ", ".join(rng.choice(MESH_TERMS, size=int(rng.integers(3, 10)), replace=False)),
+                   'url': f"https://pubmed.ncbi.nlm.nih.gov/{pmid}",
+                   'authors_affiliations': authors_affiliations}
+
+
+def write_synthetic_corpus(path, size, seed=0):
+    """
+    Writes a synthetic corpus of `size` articles to a JSONL file, replacing it if it exists.
+
+    The records are written to a temporary file renamed once complete, so an
+    interrupted generation never leaves a partial corpus behind.
+
+    Parameters
+    ----------
+    path : str or Path
+        The JSONL file.
+    size : int
+        Number of articles.
+    seed : int, optional
+        Seed of the corpus.
+
+    Returns
+    -------
+    Path
+        The JSONL file.
+    """
+    path = Path(path)
+    partial = path.with_name(path.name + ".partial")
+    partial.unlink(missing_ok=True)
+    with JsonlWriter(partial, batch_size=1000) as writer:
+        for record in SyntheticCorpus(size, seed).records():
+            writer.write(record)
+    os.replace(partial, path)
+    return path
@@ -1,18 +1,35 @@
 # python manage.py search_index --create 
-# python manage.py commands index_articles  
+# python manage.py commands index_articles [--workers N]
+# python manage.py commands reindex [--workers N]
 # python manage.py commands scrap_article
-# python manage.py commands article_to_database
+# python manage.py commands efetch_article
+# python manage.py commands replay_archive
+# python manage.py commands article_to_database [--workers N]
 # python manage.py commands plot_scores
+# python manage.py commands benchmark_parser
 # python manage.py commands article_full_to_database
+# python manage.py commands flag_duplicates
+# python manage.py commands generate_corpus --size 100000
+# python manage.py commands benchmark_ingestion --size 100000 --stages ingestion,articles_full_to_database
+# INFERENCE_BACKEND=torch python manage.py commands export_onnx
 
 
 from django.core.management.base import BaseCommand
-from polls.models import Article
-from polls.documents import ArticleDocument
+from polls.indexing.bulk import bulk_index_articles
+from polls.indexing.versions import reindex_articles
 from polls.documents import index
 from polls.es_config import INDEX_NAME
-from polls.business_logic import scrap_article_to_json, article_json_to_database, articles_full_to_database
+from polls.business_logic import scrap_article_to_json, efetch_article_to_json, replay_archives_to_json, articles_to_database, articles_full_to_database
 from polls.rag_evaluation.evaluation_rag_model import plot_scores
+from polls.scraping.parser import benchmark_parser
+from polls.ingestion.dedup import flag_existing_duplicates
+from polls.ingestion.benchmark import STAGES, benchmark_database, benchmark_pipeline
+from polls.ingestion.synthetic import write_synthetic_corpus
+from polls.inference.parity import export_onnx_models
+from polls.scraping.export import JsonlWriter
+from datetime import datetime
+from pathlib import Path
+from django.conf import settings
 
 
 class Command(BaseCommand):
@@ -26,11 +43,27 @@ class Command(BaseCommand):
             parser (argparse.ArgumentParser): The argument parser to which 
             command-line arguments are added.
 
-        The added argument is:
+        The added arguments are:
             operation (str): Specifies the operation to be performed by the command.
+            --workers (int): Number of processes of article_to_database, or of the encoding
+                             processes of index_articles and reindex. Defaults to
+                             settings.INGEST_WORKERS or settings.INDEX_WORKERS.
+            --index (str): Elasticsearch index of index_articles. Defaults to INDEX_NAME.
+            --size (int): Number of articles of the synthetic corpus of generate_corpus
+                          and benchmark_ingestion. Defaults to 10000.
+            --stages (str): Comma-separated stages of benchmark_ingestion. Defaults to
+                            every stage.
         """
 
         parser.add_argument('operation', type=str, help="Specify the operation")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="article_to_database, index_articles, reindex: number of processes")
+        parser.add_argument('--index', type=str, default=INDEX_NAME,
+                            help="index_articles: name of the Elasticsearch index")
+        parser.add_argument('--size', type=int, default=10000,
+                            help="generate_corpus, benchmark_ingestion: number of synthetic articles")
+        parser.add_argument('--stages', type=str, default=",".join(STAGES),
+                            help="benchmark_ingestion: comma-separated stages to measure")
 
 
     def handle(self, *args, **kwargs):
@@ -46,16 +79,36 @@ class Command(BaseCommand):
 
         """
         self.operation = kwargs['operation']
+        self.workers = kwargs['workers']
+        self.index = kwargs['index']
+        self.size = kwargs['size']
+        self.stages = kwargs['stages'].split(',')
         if self.operation == 'index_articles':
             self.index_articles()
+        elif self.operation == 'reindex':
+            self.reindex()
         elif self.operation == 'scrap_article':
             self.scrap_article()
+        elif self.operation == 'efetch_article':
+            self.efetch_article()
+        elif self.operation == 'replay_archive':
+            self.replay_archive()
         elif self.operation == 'article_to_database':
             self.article_to_database()
         elif self.operation == 'plot_scores':
             self.plot_scores()
+        elif self.operation == 'benchmark_parser':
+            self.benchmark_parser()
         elif self.operation == 'article_full_to_database':
             self.articles_full_database()
+        elif self.operation == 'flag_duplicates':
+            self.flag_duplicates()
+        elif self.operation == 'generate_corpus':
+            self.generate_corpus()
+        elif self.operation == 'benchmark_ingestion':
+            self.benchmark_ingestion()
+        elif self.operation == 'export_onnx':
+            self.export_onnx()
         else:
             self.stdout.write(self.style.ERROR('Invalid operation'))
 
@@ -64,27 +117,35 @@ class Command(BaseCommand):
         """
         Indexes all articles in the database to the Elasticsearch index.
 
-        This method fetches all articles from the database and creates an
-        Elasticsearch document for each one. The document contains the article's
-        title, abstract, and a DenseVectorField containing the article's
-        title-abstract vector. The document is then saved to the Elasticsearch
-        index.
+        This method calls `bulk_index_articles`, which reads all articles from the
+        database, except those flagged as near-duplicates of another article, with a
+        server-side cursor, encodes their title-abstract vectors by batches and sends
+        the documents, with the article's title, abstract and vector, to the
+        Elasticsearch index, INDEX_NAME or --index, through the bulk API from several
+        threads. The refresh of the index is disabled during the load. With --workers N,
+        the articles are encoded by N processes sharing the cores.
 
-        The method prints a success message to the console once all articles have
-        been indexed.
+        The method prints the progress and a success message to the console once all
+        articles have been indexed.
 
         """
-        articles = Article.objects.all()
-        for article in articles:
-            title_abstract_vector = article.get_vector()  
-            doc = ArticleDocument(
-                meta={'id': article.id},  
-                title=article.title,
-                abstract=article.abstract,
-                title_abstract_vector=title_abstract_vector  
-            )
-            doc.save() 
-        self.stdout.write(self.style.SUCCESS('Successfully indexed articles'))
+        indexed = bulk_index_articles(index=self.index, progress=self.stdout.write, workers=self.workers)
+        self.stdout.write(self.style.SUCCESS(f'Successfully indexed {indexed} articles'))
+
+
+    def reindex(self):
+        """
+        Rebuilds the Elasticsearch index without interrupting the searches.
+
+        This method calls `reindex_articles`, which indexes all articles in a new version
+        of the index, e.g. medical-articles-v2, checks its document count and the recall of
+        a sample of articles, then atomically points the medical-articles alias read by the
+        searches to it and deletes the old versions. The method prints the progress and a
+        success message to the console once the new version is live.
+
+        """
+        index = reindex_articles(progress=self.stdout.write, workers=self.workers)
+        self.stdout.write(self.style.SUCCESS(f'Successfully reindexed articles in {index}'))
 
 
     def scrap_article(self):
@@ -99,17 +160,54 @@ class Command(BaseCommand):
         scrap_article_to_json()
         self.stdout.write(self.style.SUCCESS('Successfully scraped articles'))
 
+
+
+    def efetch_article(self):
+        """
+        Downloads articles from the PubMed E-utilities and saves them to a JSONL file.
+
+        This method calls `efetch_article_to_json`, which fetches the articles by
+        batches of PMIDs instead of scraping one HTML page per article. The method
+        prints a success message to the console once all articles have been fetched.
+
+        """
+        efetch_article_to_json()
+        self.stdout.write(self.style.SUCCESS('Successfully fetched articles'))
+
+
+    def replay_archive(self):
+        """
+        Extracts the archived article pages again and rewrites the JSONL export.
+
+        This method calls `replay_archives_to_json`, which parses the raw pages of every
+        archive of settings.ARCHIVE_DIR in worker processes, without downloading them
+        again, and rewrites the export of each one. The method prints the archives
+        replayed and a success message to the console, or an error if there was no
+        archive to replay.
+
+        """
+        archives = replay_archives_to_json()
+        if not archives:
+            self.stdout.write(self.style.ERROR(f'No archive to replay in {settings.ARCHIVE_DIR}'))
+            return
+        for archive_path in archives:
+            self.stdout.write(f'Replayed {archive_path.name}')
+        self.stdout.write(self.style.SUCCESS(f'Successfully replayed {len(archives)} archives'))
+
     
     def article_to_database(self):
         """
-        Imports articles from JSON file to the database.
+        Imports articles from the export files to the database.
 
-        This method calls `article_json_to_database` to import articles from a JSON file
-        and saves the imported data to the database. The method prints a success
-        message to the console once all articles have been imported.
+        This method calls `articles_to_database` to import the JSON, JSONL, CSV or Parquet
+        exports of settings.INGEST_TERMS found with settings.INGEST_PATTERNS, and saves
+        the imported data to the database by batches, printing the progress
+        and throughput after each batch. With --workers N, the files are shared by N
+        processes. The method prints a success message to the console once all
+        articles have been imported.
 
         """
-        article_json_to_database()
+        articles_to_database(progress=self.stdout.write, workers=self.workers)
         self.stdout.write(self.style.SUCCESS('Successfully imported articles'))
 
 
@@ -125,14 +223,107 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS('Successfully plotted scores'))
 
 
+    def benchmark_parser(self):
+        """
+        Measures the number of article pages parsed per second.
+
+        This method parses the HTML pages saved in data/html with the
+        ArticlePageParser and with the former BeautifulSoup extraction, and prints
+        the throughput of each one.
+        """
+        paths = sorted(Path(settings.BASE_DIR, 'data/html').glob('*.html'))
+        for name, pages_per_second in benchmark_parser(paths).items():
+            self.stdout.write(f'{name}: {pages_per_second:.1f} pages/s')
+        self.stdout.write(self.style.SUCCESS('Successfully benchmarked parser'))
+
+
     def articles_full_database(self): 
         """
-        Imports articles from JSON file to the database.
+        Refreshes the view of the articles with their authors and affiliations.
 
-        This method calls `article_json_to_database` to import articles from a JSON file
-        and saves the imported data to the database. The method prints a success
-        message to the console once all articles have been imported.
+        This method calls `articles_full_to_database`, which refreshes the ArticlesWithAuthors
+        materialized view concurrently; it can be run on a schedule. The method prints a
+        success message to the console once done.
 
         """
         articles_full_to_database()
-        self.stdout.write(self.style.SUCCESS('Successfully imported articles'))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS('Successfully imported articles'))
+
+
+    def flag_duplicates(self):
+        """
+        Flags the near-duplicate articles ingested before their detection.
+
+        This method calls `flag_existing_duplicates` to compute the MinHash signatures of
+        the articles which do not have one yet and flag the near-duplicates among them.
+        The method prints the number of articles flagged.
+
+        """
+        flagged = flag_existing_duplicates()
+        self.stdout.write(self.style.SUCCESS(f'Successfully flagged {flagged} near-duplicate articles'))
+
+
+    def generate_corpus(self):
+        """
+        Writes a synthetic corpus of --size articles to settings.BENCHMARK_DIR.
+
+        This method calls `write_synthetic_corpus`, which generates PubMed-like records
+        with Zipf-distributed authors and affiliations in synthetic_<size>.jsonl. The
+        method prints a success message to the console once the corpus is written.
+
+        """
+        path = write_synthetic_corpus(self.corpus_path(), self.size)
+        self.stdout.write(self.style.SUCCESS(f'Successfully generated {path}'))
+
+
+    def benchmark_ingestion(self):
+        """
+        Measures the ingestion and indexing stages on the synthetic corpus of --size articles.
+
+        This method generates the corpus if it does not exist yet, then runs the --stages of
+        `benchmark_pipeline` in a scratch database, created for the benchmark and dropped
+        afterwards, with settings.INGEST_METHOD and --workers. The rows per second, queries
+        and peak RSS of each stage are printed and appended to benchmark.jsonl in
+        settings.BENCHMARK_DIR, so that successive runs can be compared.
+
+        """
+        path = self.corpus_path()
+        if not path.exists():
+            write_synthetic_corpus(path, self.size)
+        with benchmark_database():
+            results = benchmark_pipeline(path, f"synthetic_{self.size}", self.stages, workers=self.workers)
+        run = {'date': datetime.now().isoformat(timespec='seconds'), 'size': self.size,
+               'method': settings.INGEST_METHOD, 'workers': self.workers or settings.INGEST_WORKERS}
+        with JsonlWriter(Path(settings.BENCHMARK_DIR, 'benchmark.jsonl')) as writer:
+            for result in results:
+                writer.write({**run, **result})
+                self.stdout.write(f"{result['stage']}: {result['rows']} rows in {result['seconds']:.1f} s "
+                                  f"({result['rows_per_second']:.0f} rows/s), {result['queries']} queries, "
+                                  f"peak RSS {result['peak_rss_mb']:.0f} MB")
+        self.stdout.write(self.style.SUCCESS('Successfully benchmarked ingestion'))
+
+
+    def export_onnx(self):
+        """
+        Exports the embedding model and the reranker to quantized ONNX Runtime models.
+
+        This method calls `export_onnx_models`, which exports both PyTorch models to ONNX,
+        quantizes their weights to int8 and compares them with the PyTorch models on a
+        sample of articles: cosine of the embeddings, nearest neighbours, reranked top
+        documents and latencies. The exports are kept in settings.ONNX_MODEL_DIR, and used
+        with INFERENCE_BACKEND=onnx, only if they agree with the PyTorch models.
+
+        """
+        report = export_onnx_models(progress=self.stdout.write)
+        for backend in ('torch', 'onnx'):
+            self.stdout.write(f"{backend}: {report[f'{backend}_encode_latency'] * 1000:.1f} ms per query, "
+                              f"{report[f'{backend}_rerank_latency'] * 1000:.1f} ms per reranking")
+        self.stdout.write(self.style.SUCCESS(f"Successfully exported the ONNX models "
+                                             f"(mean cosine {report['cosine_mean']:.4f})"))
+
+
+    def corpus_path(self):
+        """
+        Returns the file of the synthetic corpus of --size articles.
+        """
+        return Path(settings.BENCHMARK_DIR, f'synthetic_{self.size}.jsonl')
\ No newline at end of file
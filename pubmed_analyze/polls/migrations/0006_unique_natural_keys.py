@@ -0,0 +1,70 @@
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Merges the rows sharing a natural key before the unique constraints are added.
+
+    For articles (pmid), authors and affiliations (name), the row with the
+    smallest id is kept, the authorships of the other rows are moved to it, and
+    the authorships this makes identical are deleted first so that the
+    (article, author, affiliation) unique constraint holds. The names are kept
+    unique on their md5, since a btree index on long affiliations exceeds the
+    maximum size of an index row.
+    """
+    quote_name = schema_editor.connection.ops.quote_name
+    Authorship = apps.get_model('polls', 'Authorship')
+    authorship_table = quote_name(Authorship._meta.db_table)
+    for model_name, field_name, fk_column in [('Article', 'pmid', 'article_id'),
+                                              ('Authors', 'name', 'author_id'),
+                                              ('Affiliations', 'name', 'affiliation_id')]:
+        model = apps.get_model('polls', model_name)
+        table = quote_name(model._meta.db_table)
+        key = quote_name(model._meta.get_field(field_name).column)
+        partition = ", ".join("k.keep_id" if column == fk_column else "a." + column
+                              for column in ['article_id', 'author_id', 'affiliation_id'])
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f"""CREATE TEMPORARY TABLE merge_keep AS
+                               SELECT id, MIN(id) OVER (PARTITION BY {key}) AS keep_id
+                               FROM {table} WHERE {key} IS NOT NULL""")
+            cursor.execute(f"""DELETE FROM {authorship_table} WHERE id IN (
+                                   SELECT id FROM (
+                                       SELECT a.id, ROW_NUMBER() OVER (PARTITION BY {partition} ORDER BY a.id) AS position
+                                       FROM {authorship_table} a JOIN merge_keep k ON k.id = a.{fk_column}
+                                   ) ranked WHERE position > 1)""")
+            cursor.execute(f"""UPDATE {authorship_table}
+                               SET {fk_column} = (SELECT keep_id FROM merge_keep WHERE merge_keep.id = {authorship_table}.{fk_column})
+                               WHERE {fk_column} IN (SELECT id FROM merge_keep WHERE id <> keep_id)""")
+            cursor.execute(f"DELETE FROM {table} WHERE id IN (SELECT id FROM merge_keep WHERE id <> keep_id)")
+            cursor.execute("DROP TABLE merge_keep")
+    if schema_editor.connection.vendor == 'postgresql':
+        # Check the deferred foreign keys now: a table with pending trigger events cannot be altered
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0005_articleswithauthors'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='article',
+            name='pmid',
+            field=models.IntegerField(db_column='pubmed id', null=True, unique=True, verbose_name='pubmed id'),
+        ),
+        migrations.AddField(
+            model_name='authors',
+            name='name_hash',
+            field=models.GeneratedField(db_column='md5 of name', db_persist=True, expression=django.db.models.functions.text.MD5('name'), output_field=models.CharField(max_length=32), unique=True, verbose_name='md5 of name'),
+        ),
+        migrations.AddField(
+            model_name='affiliations',
+            name='name_hash',
+            field=models.GeneratedField(db_column='md5 of name', db_persist=True, expression=django.db.models.functions.text.MD5('name'), output_field=models.CharField(max_length=32), unique=True, verbose_name='md5 of name'),
+        ),
+    ]
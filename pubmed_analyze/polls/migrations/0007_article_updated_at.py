@@ -0,0 +1,22 @@
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0006_unique_natural_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_column='updated at', db_default=django.db.models.functions.datetime.Now(), db_index=True, verbose_name='updated at'),
+        ),
+        migrations.AddField(
+            model_name='articleswithauthors',
+            name='updated_at',
+            field=models.DateTimeField(db_column='updated at', null=True, verbose_name='updated at'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+from django.db import migrations
+
+ARTICLES_WITH_AUTHORS_VIEW = """
+    CREATE MATERIALIZED VIEW "polls_articleswithauthors" AS
+    WITH affiliations AS (
+        SELECT s.article_id, au."name of author" AS author,
+               jsonb_agg(DISTINCT af."name of affiliation" ORDER BY af."name of affiliation") AS names
+        FROM "polls_authorship" s
+        JOIN "polls_authors" au ON au.id = s.author_id
+        JOIN "polls_affiliations" af ON af.id = s.affiliation_id
+        WHERE au."name of author" IS NOT NULL
+        GROUP BY s.article_id, au."name of author"
+    ), authors AS (
+        SELECT article_id, jsonb_object_agg(author, names) AS authors
+        FROM affiliations GROUP BY article_id
+    )
+    SELECT a.id, a."title of review", a."date of publication", a."title of article", a."abstract",
+           a."pubmed id", a."doi", a."conflict of interest", a."mesh terms", a."url", a."term",
+           COALESCE(authors.authors, '{}'::jsonb) AS "authors", a."updated at"
+    FROM "polls_article" a LEFT JOIN authors ON authors.article_id = a.id;
+    CREATE UNIQUE INDEX "polls_articleswithauthors_id" ON "polls_articleswithauthors" (id);
+"""
+
+ARTICLES_WITH_AUTHORS_TABLE = """
+    CREATE TABLE "polls_articleswithauthors" ("id" bigint NOT NULL PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+        "title of review" varchar(2000) NULL, "date of publication" date NULL, "title of article" varchar(2000) NULL,
+        "abstract" text NULL, "pubmed id" integer NULL, "doi" varchar(200) NULL, "conflict of interest" text NULL,
+        "mesh terms" text NULL, "url" varchar(200) NULL, "term" varchar(200) NULL, "authors" jsonb NULL,
+        "updated at" timestamp with time zone NULL);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0007_article_updated_at'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterModelOptions(
+                    name='articleswithauthors',
+                    options={'managed': False},
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    sql='DROP TABLE "polls_articleswithauthors";' + ARTICLES_WITH_AUTHORS_VIEW,
+                    reverse_sql='DROP MATERIALIZED VIEW "polls_articleswithauthors";' + ARTICLES_WITH_AUTHORS_TABLE,
+                ),
+            ],
+        ),
+    ]
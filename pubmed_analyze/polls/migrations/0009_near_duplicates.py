@@ -0,0 +1,32 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0008_articleswithauthors_materialized_view'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, db_column='duplicate of', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='polls.article', verbose_name='duplicate of'),
+        ),
+        migrations.CreateModel(
+            name='ArticleSignature',
+            fields=[
+                ('article', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='polls.article')),
+                ('minhash', models.BinaryField(db_column='minhash of abstract', verbose_name='minhash of abstract')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MinHashBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField(db_index=True)),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='minhash_bands', to='polls.article')),
+            ],
+        ),
+    ]
@@ -11,13 +11,19 @@
 
 
 from django.db import models
+from django.db.models.functions import MD5, Now
 from .utils import text_processing
-from sentence_transformers import SentenceTransformer
+from .inference.backends import load_encoder
 
-model = SentenceTransformer('microsoft/BiomedNLP-BiomedBERT-base-uncased-abstract')
+EMBEDDING_MODEL = 'microsoft/BiomedNLP-BiomedBERT-base-uncased-abstract'
+RERANKER_MODEL = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+model = load_encoder(EMBEDDING_MODEL)
 
 class Affiliations(models.Model):
     name = models.TextField(null=True, verbose_name='name of affiliation', db_column='name of affiliation')
+    # Unique key of the name: a btree index on the unbounded name itself fails on long affiliations
+    name_hash = models.GeneratedField(expression=MD5('name'), output_field=models.CharField(max_length=32), db_persist=True,
+                                      unique=True, verbose_name='md5 of name', db_column='md5 of name')
 
     def __str__(self):
         return self.name
@@ -25,6 +31,8 @@ class Affiliations(models.Model):
 
 class Authors(models.Model):
     name = models.CharField(null=True, max_length=2000, verbose_name='name of author', db_column='name of author')
+    name_hash = models.GeneratedField(expression=MD5('name'), output_field=models.CharField(max_length=32), db_persist=True,
+                                      unique=True, verbose_name='md5 of name', db_column='md5 of name')
 
     def __str__(self):
         return self.name
@@ -35,18 +43,26 @@ class Article(models.Model):
     date = models.DateField(null=True, verbose_name='date of publication', db_column='date of publication')
     title = models.CharField(null=True, max_length=2000, verbose_name='title of article', db_column='title of article')
     abstract = models.TextField(null=True, verbose_name='abstract', db_column='abstract')
-    pmid = models.IntegerField(null=True, verbose_name='pubmed id', db_column='pubmed id')
+    pmid = models.IntegerField(null=True, unique=True, verbose_name='pubmed id', db_column='pubmed id')
     doi = models.CharField(null=True, max_length=200, verbose_name='doi', db_column='doi')
     disclosure = models.TextField(null=True, verbose_name='conflict of interest', db_column='conflict of interest')
     mesh_terms = models.TextField(null=True, verbose_name='mesh terms', db_column='mesh terms')
     url = models.CharField(max_length=200, null=True, verbose_name='url', db_column='url')
     term = models.CharField(null=True, max_length=200, verbose_name='term', db_column='term')
+    updated_at = models.DateTimeField(auto_now=True, db_default=Now(), db_index=True, verbose_name='updated at', db_column='updated at')
+    duplicate_of = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, related_name='duplicates', verbose_name='duplicate of', db_column='duplicate of')
     authors = models.ManyToManyField(Authors, through='Authorship', related_name='articles')
 
-    def get_vector(self):
+    def embedding_text(self):
+        """
+        Returns the processed title and abstract encoded into the vector of the article.
+        """
         title = text_processing(self.title) 
         abstract = text_processing(self.abstract)  
-        return model.encode(title + " " + abstract).tolist()
+        return title + " " + abstract
+
+    def get_vector(self):
+        return model.encode(self.embedding_text()).tolist()
   
     def __str__(self):
         return self.title
@@ -64,6 +80,16 @@ class Authorship(models.Model):
         return f"{self.author.name} - {self.affiliation.name} (Article: {self.article.title})"
 
 
+class ArticleSignature(models.Model):
+    article = models.OneToOneField(Article, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+    minhash = models.BinaryField(verbose_name='minhash of abstract', db_column='minhash of abstract')
+
+
+class MinHashBand(models.Model):
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='minhash_bands')
+    bucket = models.BigIntegerField(db_index=True)
+
+
 class ArticlesWithAuthors(models.Model):
     title_review = models.CharField(null=True, max_length=2000, verbose_name='title of review', db_column='title of review')
     date = models.DateField(null=True, verbose_name='date of publication', db_column='date of publication')
@@ -76,6 +102,12 @@ class ArticlesWithAuthors(models.Model):
     url = models.CharField(max_length=200, null=True, verbose_name='url', db_column='url')
     term = models.CharField(null=True, max_length=200, verbose_name='term', db_column='term')
     affiliations_by_author = models.JSONField(null=True, verbose_name='authors', db_column='authors')
+    updated_at = models.DateTimeField(null=True, verbose_name='updated at', db_column='updated at')
+
+    class Meta:
+        # PostgreSQL materialized view over Article and Authorship, created by migration 0008
+        # and refreshed by polls.ingestion.denormalize.refresh_articles_with_authors
+        managed = False
 
 
 class Taxonomy(models.Model):
@@ -0,0 +1,184 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from polls.scraping.parser import ArticlePageParser
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def require_zstandard():
+    """
+    Raises ImproperlyConfigured if the optional zstandard package is missing.
+    """
+    if zstandard is None:
+        raise ImproperlyConfigured("The page archive requires the zstandard package: pip install zstandard")
+
+
+def index_path(path):
+    """
+    Returns the offset index of an archive, stored next to it with the .idx suffix.
+    """
+    return Path(path).with_suffix('.idx')
+
+
+class PageArchive:
+    """
+    Append-only archive of the raw pages fetched by the scraper.
+
+    Every page is compressed as an independent zstd frame and appended to the
+    archive file, and a line "pmid<TAB>offset<TAB>length" is appended to the
+    index stored next to it. A page can therefore be read back with one seek and
+    one frame decompression, and the archive can be split between processes
+    without decompressing it from the start. Both files are flushed after each
+    page, and the index line is written after the frame, so the index never
+    points past the end of the archive.
+
+    Parameters
+    ----------
+    path : str or Path
+        The archive file, e.g. data/archive/multiple_sclerosis_2024.zst.
+    level : int, optional
+        The zstd compression level. Defaults to settings.ARCHIVE_ZSTD_LEVEL.
+    """
+
+    def __init__(self, path, level=None):
+        require_zstandard()
+        self.path = Path(path)
+        self.compressor = zstandard.ZstdCompressor(level=level or settings.ARCHIVE_ZSTD_LEVEL)
+        self.file = None
+        self.index = None
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = self.path.open('ab')
+        self.index = index_path(self.path).open('a', encoding='utf-8')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.file.close()
+        self.index.close()
+
+    def write(self, pmid, content):
+        """
+        Appends a page to the archive and records its offset in the index.
+
+        Parameters
+        ----------
+        pmid : str
+            The PMID of the article.
+        content : bytes
+            The raw HTML of the page.
+        """
+        frame = self.compressor.compress(content)
+        offset = self.file.seek(0, 2)
+        self.file.write(frame)
+        self.file.flush()
+        self.index.write(f"{pmid}\t{offset}\t{len(frame)}\n")
+        self.index.flush()
+
+
+def read_index(path):
+    """
+    Reads the offset index of an archive.
+
+    A trailing line without a newline is an entry still being written and is
+    skipped. When a PMID was archived several times, its last page is kept.
+
+    Parameters
+    ----------
+    path : str or Path
+        The archive file.
+
+    Returns
+    -------
+    dict
+        (offset, length) of the frame of each PMID, in archive order.
+    """
+    entries = {}
+    with index_path(path).open('r', encoding='utf-8') as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            pmid, offset, length = line.split("\t")
+            entries.pop(pmid, None)
+            entries[pmid] = (int(offset), int(length))
+    return entries
+
+
+def read_pages(path, entries):
+    """
+    Yields the decompressed pages of the given index entries.
+
+    Parameters
+    ----------
+    path : str or Path
+        The archive file.
+    entries : list of tuple
+        (pmid, offset, length) of the pages to read.
+
+    Yields
+    ------
+    tuple
+        (pmid, content) pairs.
+    """
+    require_zstandard()
+    decompressor = zstandard.ZstdDecompressor()
+    with Path(path).open('rb') as f:
+        for pmid, offset, length in entries:
+            f.seek(offset)
+            yield pmid, decompressor.decompress(f.read(length))
+
+
+def parse_archive_chunk(path, entries):
+    """
+    Parses a slice of the archive in a worker process.
+
+    Returns
+    -------
+    list of dict
+        The records of the pages having an abstract.
+    """
+    parser = ArticlePageParser()
+    records = []
+    for _, content in read_pages(path, entries):
+        record = parser.parse(content)
+        if record.abstract:
+            records.append(record.to_dict())
+    return records
+
+
+def replay_archive(path, workers=None, chunk_size=None):
+    """
+    Runs the extractor over every page of an archive in parallel processes.
+
+    The index is split into chunks of `chunk_size` pages; each worker process
+    opens the archive, seeks to its frames and parses them, so only the records
+    travel back to the caller. Records are yielded in archive order.
+
+    Parameters
+    ----------
+    path : str or Path
+        The archive file.
+    workers : int, optional
+        Number of worker processes. Defaults to settings.REPLAY_WORKERS.
+    chunk_size : int, optional
+        Number of pages per task. Defaults to settings.REPLAY_CHUNK_SIZE.
+
+    Yields
+    ------
+    dict
+        The records of the pages having an abstract.
+    """
+    require_zstandard()
+    chunk_size = chunk_size or settings.REPLAY_CHUNK_SIZE
+    entries = [(pmid, offset, length) for pmid, (offset, length) in read_index(path).items()]
+    chunks = [entries[start:start+chunk_size] for start in range(0, len(entries), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers or settings.REPLAY_WORKERS) as executor:
+        for records in executor.map(parse_archive_chunk, [path] * len(chunks), chunks):
+            yield from records
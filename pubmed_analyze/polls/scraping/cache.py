@@ -0,0 +1,163 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache of HTTP responses.
+
+    Bodies are stored once per SHA-256 of their content under `bodies/`, and a
+    SQLite index maps each URL to its body, its validators (ETag and
+    Last-Modified) and its fetch and access times. A response younger than `ttl`
+    is served from disk without any request; an older one is revalidated with a
+    conditional GET and only downloaded again if the server reports a change.
+    When the bodies exceed `max_bytes`, the least recently used entries are
+    evicted.
+
+    Parameters
+    ----------
+    directory : str or Path, optional
+        Root directory of the cache. Defaults to settings.SCRAPER_CACHE_DIR.
+    ttl : float, optional
+        Number of seconds a response is fresh. Defaults to
+        settings.SCRAPER_CACHE_TTL.
+    max_bytes : int, optional
+        Maximum total size of the cached bodies. Defaults to
+        settings.SCRAPER_CACHE_MAX_BYTES.
+    """
+
+    def __init__(self, directory=None, ttl=None, max_bytes=None):
+        self.directory = Path(directory or settings.SCRAPER_CACHE_DIR)
+        self.ttl = settings.SCRAPER_CACHE_TTL if ttl is None else ttl
+        self.max_bytes = max_bytes or settings.SCRAPER_CACHE_MAX_BYTES
+        (self.directory / "bodies").mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.directory / "index.sqlite3", check_same_thread=False)
+        self.db.execute("""CREATE TABLE IF NOT EXISTS entries (
+            url TEXT PRIMARY KEY, body_hash TEXT NOT NULL, size INTEGER NOT NULL,
+            etag TEXT, last_modified TEXT, fetched_at REAL NOT NULL, accessed_at REAL NOT NULL)""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+        self.db.commit()
+
+    def get(self, url, fetch):
+        """
+        Returns the response for `url`, from the cache when possible.
+
+        Parameters
+        ----------
+        url : str
+            The URL to fetch.
+        fetch : callable
+            Performs the network request: called as `fetch(url, headers=...)`
+            with the conditional headers, and returns a `requests.Response`.
+
+        Returns
+        -------
+        requests.Response
+            The response. `from_cache` is True when the body was read from disk.
+        """
+        entry = self.lookup(url)
+        if entry and time.time() - entry['fetched_at'] < self.ttl:
+            response = self.cached_response(url, entry)
+            if response is not None:
+                return response
+            entry = None
+        headers = {}
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        response = fetch(url, headers=headers)
+        if response.status_code == 304 and entry:
+            with self.lock:
+                self.db.execute("UPDATE entries SET fetched_at = ?, accessed_at = ? WHERE url = ?", (time.time(), time.time(), url))
+                self.db.commit()
+            cached = self.cached_response(url, entry)
+            if cached is not None:
+                return cached
+            response = fetch(url, headers={})
+        if response.status_code == 200:
+            self.store(url, response)
+        response.from_cache = False
+        return response
+
+    def lookup(self, url):
+        """
+        Returns the index entry of `url` as a dict, or None if it is not cached.
+        """
+        with self.lock:
+            row = self.db.execute("SELECT body_hash, etag, last_modified, fetched_at FROM entries WHERE url = ?", (url,)).fetchone()
+        if row is None or not self.body_path(row[0]).exists():
+            return None
+        return {'body_hash': row[0], 'etag': row[1], 'last_modified': row[2], 'fetched_at': row[3]}
+
+    def store(self, url, response):
+        """
+        Writes the body of a response and its validators, then enforces the size bound.
+        """
+        body = response.content
+        body_hash = hashlib.sha256(body).hexdigest()
+        body_path = self.body_path(body_hash)
+        if not body_path.exists():
+            # A temporary file per call: threads may store the same body for different URLs
+            with tempfile.NamedTemporaryFile(dir=body_path.parent, suffix='.tmp', delete=False) as f:
+                f.write(body)
+            os.replace(f.name, body_path)
+        now = time.time()
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (url, body_hash, len(body), response.headers.get('ETag'),
+                             response.headers.get('Last-Modified'), now, now))
+            self.db.commit()
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the bodies fit in `max_bytes`.
+        """
+        with self.lock:
+            total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for url, body_hash, size in self.db.execute("SELECT url, body_hash, size FROM entries ORDER BY accessed_at").fetchall():
+                self.db.execute("DELETE FROM entries WHERE url = ?", (url,))
+                if not self.db.execute("SELECT 1 FROM entries WHERE body_hash = ?", (body_hash,)).fetchone():
+                    self.body_path(body_hash).unlink(missing_ok=True)
+                total -= size
+                if total <= self.max_bytes:
+                    break
+            self.db.commit()
+
+    def cached_response(self, url, entry):
+        """
+        Builds a `requests.Response` from a cache entry and marks it as recently used.
+
+        Returns None when the body was evicted since the entry was looked up, so
+        the caller handles it as a cache miss.
+        """
+        try:
+            content = self.body_path(entry['body_hash']).read_bytes()
+        except FileNotFoundError:
+            return None
+        with self.lock:
+            self.db.execute("UPDATE entries SET accessed_at = ? WHERE url = ?", (time.time(), url))
+            self.db.commit()
+        response = Response()
+        response.status_code = 200
+        response.url = url
+        response._content = content
+        response.headers = CaseInsensitiveDict({'ETag': entry['etag'], 'Last-Modified': entry['last_modified']})
+        response.from_cache = True
+        return response
+
+    def body_path(self, body_hash):
+        return self.directory / "bodies" / body_hash
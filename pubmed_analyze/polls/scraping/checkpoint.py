@@ -0,0 +1,131 @@
+import json
+import os
+import re
+from pathlib import Path
+
+from django.conf import settings
+
+from polls.models import Article
+
+
+def pmid_from_url(url):
+    """
+    Returns the PMID of a PubMed article URL such as "https://pubmed.ncbi.nlm.nih.gov/37949093/".
+
+    A bare PMID is returned unchanged, so PMID lists can be checkpointed too.
+    """
+    match = re.search(r'(\d+)/?$', url)
+    return match.group(1) if match else None
+
+
+class CrawlCheckpoint:
+    """
+    Persistent state of a crawl, used to resume it and to skip known articles.
+
+    The state is stored as JSON in settings.CRAWL_STATE_DIR, one file per export,
+    and records the number of result pages, the PMIDs found on each visited result
+    page and every PMID already fetched. The file is replaced atomically, so an
+    interrupted crawl always leaves a readable checkpoint behind. The fetched PMIDs
+    written are those of the last flush of the export, so the result pages found
+    while articles are still buffered never mark them as fetched.
+
+    Parameters
+    ----------
+    name : str
+        The file name of the export the crawl writes to, e.g.
+        "multiple_sclerosis_2024.jsonl".
+    """
+
+    def __init__(self, name):
+        self.path = Path(settings.CRAWL_STATE_DIR) / (name + ".json")
+        state = {}
+        if self.path.exists():
+            with self.path.open('r', encoding='utf-8') as f:
+                state = json.load(f)
+        self.page_max = state.get('page_max')
+        self.pages = {int(page): pmids for page, pmids in state.get('pages', {}).items()}
+        self.fetched = set(state.get('fetched', []))
+        self.flushed = set(self.fetched)
+
+    def mark_page(self, page, links):
+        """
+        Records the article links found on a result page and writes the state.
+
+        Parameters
+        ----------
+        page : int
+            The number of the result page.
+        links : list of str
+            The article URLs found on the page.
+        """
+        self.pages[page] = [pmid_from_url(link) for link in links]
+        self.write()
+
+    def page_links(self, base_url, page):
+        """
+        Returns the article URLs recorded for a result page, or None if it was not visited.
+        """
+        if page not in self.pages:
+            return None
+        return [base_url + "/" + pmid + "/" for pmid in self.pages[page]]
+
+    def mark_fetched(self, url):
+        """
+        Records that an article page has been downloaded.
+
+        The state is written by `save`, which the export writer calls after each
+        flush so that a PMID is never marked as fetched before its record is on disk.
+        """
+        self.fetched.add(pmid_from_url(url))
+
+    def pending(self, links):
+        """
+        Filters out the articles already fetched or already stored in the database.
+
+        Parameters
+        ----------
+        links : list of str
+            The article URLs to crawl.
+
+        Returns
+        -------
+        list of str
+            The URLs whose PMID is neither in the checkpoint nor in `Article`.
+        """
+        pmids = [pmid_from_url(link) for link in links]
+        known = self.fetched | self.in_database([pmid for pmid in pmids if pmid and pmid not in self.fetched])
+        return [link for link, pmid in zip(links, pmids) if pmid not in known]
+
+    @staticmethod
+    def in_database(pmids, chunk_size=5000):
+        """
+        Returns the subset of `pmids` already present in the `Article` table.
+        """
+        pmids = list(pmids)
+        stored = set()
+        for start in range(0, len(pmids), chunk_size):
+            chunk = [int(pmid) for pmid in pmids[start:start+chunk_size]]
+            stored.update(str(pmid) for pmid in Article.objects.filter(pmid__in=chunk).values_list('pmid', flat=True))
+        return stored
+
+    def save(self):
+        """
+        Records the articles fetched so far as flushed and writes the state.
+
+        The export writer calls it after each flush, once the records of these
+        articles are on disk.
+        """
+        self.flushed = set(self.fetched)
+        self.write()
+
+    def write(self):
+        """
+        Writes the state to disk atomically, with the fetched PMIDs of the last `save`.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with tmp_path.open('w', encoding='utf-8') as f:
+            json.dump({'page_max': self.page_max,
+                       'pages': {str(page): pmids for page, pmids in self.pages.items()},
+                       'fetched': sorted(self.flushed)}, f)
+        os.replace(tmp_path, self.path)
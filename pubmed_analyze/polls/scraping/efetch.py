@@ -0,0 +1,251 @@
+import logging
+import xml.etree.ElementTree as ET
+
+from django.conf import settings
+
+from polls.utils import format_date, get_absolute_url
+
+
+EUTILS_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+# Publication type shown on every record and hidden by the PubMed web page
+HIDDEN_PUBLICATION_TYPES = {"Journal Article"}
+
+logger = logging.getLogger(__name__)
+
+
+def eutils_params(**params):
+    """
+    Adds the common E-utilities parameters to a query.
+
+    Parameters
+    ----------
+    **params : dict
+        The query parameters of the request.
+
+    Returns
+    -------
+    dict
+        The parameters completed with the database and the NCBI API key if one
+        is configured.
+    """
+    params = {'db': 'pubmed', **params}
+    if settings.NCBI_API_KEY:
+        params['api_key'] = settings.NCBI_API_KEY
+    return params
+
+
+def esearch_pmids(term, mindate, maxdate, session):
+    """
+    Lists the PMIDs matching a term within a publication date window.
+
+    esearch lists at most settings.ESEARCH_MAX_RESULTS PMIDs: a window with more
+    results is truncated, with a warning, and should be split by the caller.
+
+    Parameters
+    ----------
+    term : str
+        The PubMed query. An empty term lists every article of the window.
+    mindate : str
+        Start of the publication date window (YYYY, YYYY/MM or YYYY/MM/DD).
+    maxdate : str
+        End of the publication date window, same format as `mindate`.
+    session : requests.Session or RateLimitedFetcher
+        The object used to perform the request.
+
+    Returns
+    -------
+    list of str
+        The PMIDs, at most settings.ESEARCH_MAX_RESULTS of them.
+    """
+    params = eutils_params(term=term or "all[sb]", mindate=mindate, maxdate=maxdate, datetype='pdat',
+                           retmax=settings.ESEARCH_MAX_RESULTS, retmode='json')
+    response = session.get(EUTILS_URL + "/esearch.fcgi", params=params)
+    response.raise_for_status()
+    result = response.json()['esearchresult']
+    if int(result['count']) > len(result['idlist']):
+        logger.warning("esearch found %s articles for %r from %s to %s, only the first %d are listed",
+                       result['count'], term, mindate, maxdate, len(result['idlist']))
+    return result['idlist']
+
+
+def esearch_count(term, mindate, maxdate, session):
+    """
+    Counts the articles matching a term within a publication date window.
+
+    Parameters
+    ----------
+    term : str
+        The PubMed query. An empty term counts every article of the window.
+    mindate : str
+        Start of the publication date window (YYYY, YYYY/MM or YYYY/MM/DD).
+    maxdate : str
+        End of the publication date window, same format as `mindate`.
+    session : requests.Session or RateLimitedFetcher
+        The object used to perform the request.
+
+    Returns
+    -------
+    int
+        The number of matching articles.
+    """
+    params = eutils_params(term=term or "all[sb]", mindate=mindate, maxdate=maxdate, datetype='pdat',
+                           retmax=0, retmode='json')
+    response = session.get(EUTILS_URL + "/esearch.fcgi", params=params)
+    response.raise_for_status()
+    return int(response.json()['esearchresult']['count'])
+
+
+def fetch_pubmed_articles(pmids, session, batch_size=None):
+    """
+    Downloads PubMed records through efetch, a batch of PMIDs per request.
+
+    Each response is parsed while it is being downloaded, so neither a batch
+    nor the whole corpus is held in memory.
+
+    Parameters
+    ----------
+    pmids : iterable of str
+        The PMIDs to download.
+    session : requests.Session or RateLimitedFetcher
+        The object used to perform the requests.
+    batch_size : int, optional
+        Number of PMIDs per request. Defaults to settings.EFETCH_BATCH_SIZE.
+
+    Yields
+    ------
+    dict
+        One record per article with an abstract, in the scraper schema.
+    """
+    batch_size = batch_size or settings.EFETCH_BATCH_SIZE
+    pmids = list(pmids)
+    for start in range(0, len(pmids), batch_size):
+        params = eutils_params(id=",".join(pmids[start:start+batch_size]), retmode='xml')
+        response = session.get(EUTILS_URL + "/efetch.fcgi", params=params, stream=True)
+        response.raise_for_status()
+        response.raw.decode_content = True
+        yield from parse_pubmed_xml(response.raw)
+
+
+def parse_pubmed_xml(source):
+    """
+    Parses a PubmedArticleSet document with a streaming iterparse.
+
+    Every `PubmedArticle` element is converted as soon as it is complete and
+    then cleared, so memory stays constant whatever the size of the document.
+    Articles without an abstract are skipped, as in `scrap_article_to_json`.
+
+    Parameters
+    ----------
+    source : str, Path or file-like object
+        The efetch XML document.
+
+    Yields
+    ------
+    dict
+        The article records, with the same keys as `scrap_article_to_json`.
+    """
+    for _, element in ET.iterparse(source, events=('end',)):
+        if element.tag != 'PubmedArticle':
+            continue
+        record = pubmed_article_to_record(element)
+        element.clear()
+        if record:
+            yield record
+
+
+def element_text(element):
+    """
+    Returns the whole text of an element, including inline markup such as <i>.
+    """
+    if element is None:
+        return None
+    text = "".join(element.itertext()).strip()
+    return text or None
+
+
+def pubmed_date(journal_issue):
+    """
+    Builds a publication date from the PubDate of a JournalIssue element.
+    """
+    pub_date = journal_issue.find('PubDate') if journal_issue is not None else None
+    if pub_date is None:
+        return None
+    medline_date = pub_date.findtext('MedlineDate')
+    if medline_date:
+        return format_date(medline_date.split("-")[0])
+    parts = [pub_date.findtext(tag) for tag in ('Year', 'Month', 'Day')]
+    return format_date(" ".join(part for part in parts if part)) if parts[0] else None
+
+
+def mesh_terms_of(citation, article):
+    """
+    Builds the keywords string shown by PubMed: publication types then MeSH headings.
+
+    A heading with qualifiers is listed once per qualifier as
+    "Descriptor / qualifier", and a star marks major topics.
+    """
+    terms = [element_text(pub_type) for pub_type in article.iterfind('PublicationTypeList/PublicationType')
+             if element_text(pub_type) not in HIDDEN_PUBLICATION_TYPES]
+    for heading in citation.iterfind('MeshHeadingList/MeshHeading'):
+        descriptor = heading.find('DescriptorName')
+        name = element_text(descriptor)
+        qualifiers = heading.findall('QualifierName')
+        if not qualifiers:
+            terms.append(name + ("*" if descriptor.get('MajorTopicYN') == 'Y' else ""))
+        for qualifier in qualifiers:
+            major = descriptor.get('MajorTopicYN') == 'Y' or qualifier.get('MajorTopicYN') == 'Y'
+            terms.append(name + ("*" if major else "") + " / " + element_text(qualifier))
+    return ", ".join(term for term in terms if term) or None
+
+
+def authors_affiliations_of(article):
+    """
+    Lists the authors having at least one affiliation, without duplicates.
+    """
+    authors_affiliations = []
+    seen_authors = set()
+    for author in article.iterfind('AuthorList/Author'):
+        author_name = author.findtext('CollectiveName') or " ".join(
+            part for part in (author.findtext('ForeName'), author.findtext('LastName')) if part)
+        affiliations_names = [element_text(affiliation) for affiliation in author.iterfind('AffiliationInfo/Affiliation')]
+        if author_name and author_name not in seen_authors:
+            seen_authors.add(author_name)
+            if affiliations_names:
+                authors_affiliations.append({'author_name': author_name, 'affiliations': affiliations_names})
+    return authors_affiliations
+
+
+def pubmed_article_to_record(element):
+    """
+    Converts a PubmedArticle element to a record of the scraper schema.
+
+    Parameters
+    ----------
+    element : xml.etree.ElementTree.Element
+        A complete PubmedArticle element.
+
+    Returns
+    -------
+    dict or None
+        The record, or None if the article has no abstract.
+    """
+    citation = element.find('MedlineCitation')
+    article = citation.find('Article')
+    abstract = [element_text(text) for text in article.iterfind('Abstract/AbstractText')]
+    abstract = " ".join(text for text in abstract if text)
+    if not abstract:
+        return None
+    pmid = citation.findtext('PMID')
+    doi = article.findtext("ELocationID[@EIdType='doi']") or element.findtext("PubmedData/ArticleIdList/ArticleId[@IdType='doi']")
+    return {
+        'title_review': element_text(article.find('Journal/Title')),
+        'date': str(pubmed_date(article.find('Journal/JournalIssue'))),
+        'title': element_text(article.find('ArticleTitle')),
+        'abstract': abstract,
+        'pmid': pmid,
+        'doi': "https://doi.org/" + doi if doi else None,
+        'disclosure': element_text(citation.find('CoiStatement')),
+        'mesh_terms': mesh_terms_of(citation, article),
+        'url': get_absolute_url(pmid),
+        'authors_affiliations': authors_affiliations_of(article),
+    }
@@ -0,0 +1,229 @@
+import csv
+import json
+from pathlib import Path
+
+from django.conf import settings
+
+
+ARTICLE_FIELDS = ['title_review', 'date', 'title', 'abstract', 'pmid', 'doi', 'disclosure', 'mesh_terms', 'url', 'authors_affiliations']
+
+
+class JsonlWriter:
+    """
+    Append-only JSON Lines writer for scraped articles.
+
+    Each record is serialized on its own line and appended to the file, so
+    writing one more article never rewrites the previous ones. Records are
+    buffered and flushed every `batch_size` records; a flush always ends on a
+    complete line, which lets `iter_jsonl` read the file while the crawl is
+    still running.
+
+    Parameters
+    ----------
+    path : str or Path
+        The JSONL file to append to. It is created if it does not exist.
+    batch_size : int, optional
+        Number of records buffered before a flush. Defaults to
+        settings.SCRAPER_FLUSH_EVERY.
+    on_flush : callable, optional
+        Called after each flush, once the records are written, e.g. to save
+        a crawl checkpoint.
+    """
+
+    def __init__(self, path, batch_size=None, on_flush=None):
+        self.path = Path(path)
+        self.batch_size = batch_size or settings.SCRAPER_FLUSH_EVERY
+        self.on_flush = on_flush
+        self.buffer = []
+        self.file = None
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = self.path.open('a', encoding='utf-8')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+        self.file.close()
+
+    def write(self, record):
+        """
+        Buffers a record and flushes the buffer when it is full.
+
+        Parameters
+        ----------
+        record : dict
+            The article record to append.
+        """
+        self.buffer.append(json.dumps(record, ensure_ascii=False))
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Appends the buffered records to the file and flushes it to the OS.
+        """
+        if self.buffer:
+            self.file.write("\n".join(self.buffer) + "\n")
+            self.buffer = []
+        self.file.flush()
+        if self.on_flush:
+            self.on_flush()
+
+
+class CsvWriter(JsonlWriter):
+    """
+    Append-only CSV writer for scraped articles.
+
+    The header is written once, when the file is empty, and each article is
+    written as a single row. `authors_affiliations` is stored as a JSON string
+    so it can be decoded back into a list when the file is ingested.
+
+    Parameters
+    ----------
+    path : str or Path
+        The CSV file to append to. It is created if it does not exist.
+    batch_size : int, optional
+        Number of records buffered before a flush. Defaults to
+        settings.SCRAPER_FLUSH_EVERY.
+    on_flush : callable, optional
+        Called after each flush, once the records are written.
+    """
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        is_new = not self.path.exists() or self.path.stat().st_size == 0
+        self.file = self.path.open('a', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.file, fieldnames=ARTICLE_FIELDS)
+        if is_new:
+            self.writer.writeheader()
+        return self
+
+    def write(self, record):
+        row = {**record, 'authors_affiliations': json.dumps(record.get('authors_affiliations', []), ensure_ascii=False)}
+        self.buffer.append(row)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.writer.writerows(self.buffer)
+            self.buffer = []
+        self.file.flush()
+        if self.on_flush:
+            self.on_flush()
+
+
+def iter_jsonl(path):
+    """
+    Yields the records of a JSONL file one by one.
+
+    A trailing line without a newline is a record still being written by a
+    running crawl and is skipped, so the file can safely be read during the
+    crawl.
+
+    Parameters
+    ----------
+    path : str or Path
+        The JSONL file to read.
+
+    Yields
+    ------
+    dict
+        The decoded records.
+    """
+    with Path(path).open('r', encoding='utf-8') as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def iter_json_array(path, chunk_size=1 << 16):
+    """
+    Yields the items of a JSON array file one by one, without loading the file.
+
+    The file is read by chunks and each item is decoded with `raw_decode` as soon
+    as it is complete, so memory depends on the size of the largest item rather
+    than on the size of the file.
+
+    Parameters
+    ----------
+    path : str or Path
+        The JSON file, holding a single array.
+    chunk_size : int, optional
+        Number of characters read at once. Defaults to 65536.
+
+    Yields
+    ------
+    object
+        The decoded items of the array.
+    """
+    decoder = json.JSONDecoder()
+    with Path(path).open('r', encoding='utf-8') as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{path} does not hold a JSON array")
+        buffer = buffer[1:]
+        while True:
+            buffer = buffer.lstrip().lstrip(",").lstrip()
+            if buffer.startswith("]"):
+                return
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    raise
+                buffer += chunk
+                continue
+            yield item
+            buffer = buffer[end:]
+
+
+def iter_export(path):
+    """
+    Yields the article records of a scraper export, whatever its layout.
+
+    JSONL exports are streamed line by line, and legacy exports written as a
+    single JSON array are streamed item by item with `iter_json_array`.
+
+    Parameters
+    ----------
+    path : str or Path
+        The export file to read.
+
+    Yields
+    ------
+    dict
+        The article records.
+    """
+    path = Path(path)
+    if path.suffix == '.jsonl':
+        yield from iter_jsonl(path)
+    else:
+        yield from iter_json_array(path)
+
+
+def export_path(directory, name):
+    """
+    Returns the export file for `name`, preferring the JSONL layout.
+
+    Parameters
+    ----------
+    directory : str
+        The export directory, e.g. settings.EXPORT_JSON_DIR.
+    name : str
+        The file name without extension, e.g. "multiple_sclerosis_2024".
+
+    Returns
+    -------
+    Path
+        The `.jsonl` file if it exists, the legacy `.json` file otherwise.
+    """
+    jsonl_path = Path(directory) / (name + ".jsonl")
+    if jsonl_path.exists():
+        return jsonl_path
+    return Path(directory) / (name + ".json")
@@ -0,0 +1,157 @@
+import json
+import os
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+
+from polls.scraping.efetch import esearch_count
+
+
+def search_filter(filter):
+    """
+    Returns the PubMed `filter` parameter of a crawl filter.
+
+    A bare year such as "2025" becomes "years.2025-2025"; a filter already in
+    PubMed syntax, e.g. "dates.2025/01/01-2025/01/31", is returned unchanged.
+    """
+    return filter if "." in filter else "years."+filter+"-"+filter
+
+
+@dataclass(frozen=True)
+class DateWindow:
+    """
+    Range of publication dates crawled in one search, both bounds included.
+    """
+    start: date
+    end: date
+
+    @property
+    def label(self):
+        """
+        Returns the name used for the export, checkpoint and archive files of the window.
+        """
+        return f"{self.start:%Y%m%d}-{self.end:%Y%m%d}"
+
+    @property
+    def esearch_dates(self):
+        """
+        Returns the `mindate` and `maxdate` parameters of esearch restricting a search to the window.
+        """
+        return f"{self.start:%Y/%m/%d}", f"{self.end:%Y/%m/%d}"
+
+    @property
+    def search_filter(self):
+        """
+        Returns the PubMed `filter` parameter restricting a search to the window.
+        """
+        return f"dates.{self.start:%Y/%m/%d}-{self.end:%Y/%m/%d}"
+
+    def split(self):
+        """
+        Splits the window in two halves.
+        """
+        middle = self.start + (self.end - self.start) // 2
+        return DateWindow(self.start, middle), DateWindow(middle + timedelta(days=1), self.end)
+
+
+class CrawlPlanner:
+    """
+    Plans incremental crawls of a search term by publication date.
+
+    The date of the last successful crawl of each term is stored in
+    settings.CRAWL_STATE_DIR/last_crawled.json. A new crawl only covers the
+    publication dates from that day (included, to catch the articles indexed
+    later that day) to the current day. Since PubMed never shows more than
+    settings.CRAWL_MAX_RESULTS results for a search, a window with more results
+    is halved until each part fits; a single day above the cap cannot be split
+    and is crawled as is.
+
+    Parameters
+    ----------
+    term : str
+        The PubMed search term.
+    """
+
+    def __init__(self, term):
+        self.term = term
+        self.path = Path(settings.CRAWL_STATE_DIR) / "last_crawled.json"
+
+    def load(self):
+        """
+        Returns the last crawl date of every term, as ISO strings keyed by term.
+        """
+        if not self.path.exists():
+            return {}
+        with self.path.open('r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def last_crawled(self):
+        """
+        Returns the date of the last successful crawl of the term, or None.
+        """
+        last_crawled = self.load().get(self.term)
+        return date.fromisoformat(last_crawled) if last_crawled else None
+
+    def plan(self, session, today=None):
+        """
+        Returns the date windows to crawl, in chronological order.
+
+        Parameters
+        ----------
+        session : requests.Session or RateLimitedFetcher
+            The object used to count the results of the windows with esearch.
+        today : date, optional
+            The end of the crawl. Defaults to the current date.
+
+        Returns
+        -------
+        list of DateWindow
+            Windows each holding at most settings.CRAWL_MAX_RESULTS articles.
+        """
+        start = self.last_crawled() or date.fromisoformat(settings.CRAWL_START_DATE)
+        window = DateWindow(start, today or date.today())
+        return self.split_window(window, lambda window: esearch_count(self.term, *window.esearch_dates, session))
+
+    def split_window(self, window, count, limit=None):
+        """
+        Halves a window until each part is under the result cap.
+
+        Parameters
+        ----------
+        window : DateWindow
+            The window to split.
+        count : callable
+            Returns the number of results of a window.
+        limit : int, optional
+            The result cap. Defaults to settings.CRAWL_MAX_RESULTS.
+
+        Returns
+        -------
+        list of DateWindow
+            The parts of the window, in chronological order.
+        """
+        limit = limit or settings.CRAWL_MAX_RESULTS
+        windows = []
+        pending = [window]
+        while pending:
+            window = pending.pop()
+            if window.start < window.end and count(window) > limit:
+                first_half, second_half = window.split()
+                pending.extend([second_half, first_half])
+            else:
+                windows.append(window)
+        return windows
+
+    def mark_crawled(self, day):
+        """
+        Records a successful crawl of the term up to `day` and saves the state atomically.
+        """
+        state = self.load()
+        state[self.term] = day.isoformat()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with tmp_path.open('w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
@@ -1,75 +1,97 @@
 # python manage.py test
 # python manage.py test polls.tests.ArticleCRUDTest.test_article_list_view 
 
+from collections import Counter
 from datetime import date
+import hashlib
+import io
 import json
 from pathlib import Path
+import time
 from django.conf import settings
-from django.test import RequestFactory, TestCase
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connection
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 import numpy as np
-from polls.models import Article, Affiliations, Authors, Authorship
-from unittest.mock import MagicMock, patch
+from polls.models import EMBEDDING_MODEL, Article, ArticleSignature, Affiliations, ArticlesWithAuthors, Authors, Authorship
+from unittest import skipUnless
+from unittest.mock import ANY, MagicMock, patch
 from polls.views import rag_articles
-from polls.business_logic import article_json_to_database, articles_full_to_database, scrap_article_to_json
+from polls.business_logic import article_json_to_database, articles_full_to_database, efetch_article_to_json, scrap_article_to_json
+from requests.models import Response
+from elasticsearch.helpers import BulkIndexError
+from polls.scraping.archive import PageArchive, read_index, replay_archive
+from polls.scraping.cache import ResponseCache
+from polls.scraping.fetcher import RateLimitedFetcher, TokenBucket
+from polls.scraping.export import CsvWriter, JsonlWriter, iter_export, iter_json_array, iter_jsonl
+from polls.ingestion.benchmark import benchmark_pipeline
+from polls.ingestion.dedup import MinHasher, flag_existing_duplicates, flag_near_duplicates, similarity
+from polls.ingestion.denormalize import RefreshDebouncer, refresh_articles_with_authors
+from polls.ingestion.interning import ENTRY_BYTES, NameCache, name_cache
+from polls.ingestion.loader import ingest_inputs, ingest_records, resolve_names, upsert_names
+from polls.ingestion.readers import pq, read_jsonl_range, read_records, shard_ranges
+from polls.ingestion.synthetic import SyntheticCorpus, write_synthetic_corpus
+from polls.indexing.bulk import bulk_index_articles
+from polls.indexing.embeddings import EmbeddingStore, ShardedEncoder, encode_texts
+from polls.indexing.realtime import IndexQueue, index_queue, sync_articles
+from polls.indexing.versions import reindex_articles
+from polls.inference.backends import load_encoder, pool
+from polls.inference.parity import encoder_parity, reranker_parity, validate_parity
+from polls.scraping.efetch import esearch_pmids, fetch_pubmed_articles, parse_pubmed_xml
+from polls.scraping.parser import ArticlePageParser
+from polls.scraping.checkpoint import CrawlCheckpoint
+from polls.scraping.planner import CrawlPlanner, DateWindow
+from polls.business_logic import extract_pubmed_url, iter_result_pages
 from django.contrib.auth import get_user_model
 
 
 class ExtractArticlesTest(TestCase):
     def test_scrap_article_to_json(self):
         """
-        Test the function scrap_article_to_json for correctly scraping and storing article data as JSON.
+        Test the function scrap_article_to_json for correctly scraping and storing article data as JSONL.
 
-        This test mocks the behavior of BeautifulSoup to simulate the extraction of 
-        article details from PubMed URLs. It verifies that the JSON file is created at the 
-        expected path with the correct structure and data.
+        This test scrapes two PubMed article pages, served from the saved pages of data/html
+        instead of the network, and compares the JSONL file written by the scraper with the
+        committed fixture multiple_sclerosis_2024_test.jsonl. The export, crawl state and
+        archive directories are temporary, so every run scrapes the articles again into a
+        new file.
 
         Steps:
-        - Mocks two BeautifulSoup objects to simulate article data extraction.
-        - Calls scrap_article_to_json with test URLs and a suffix for the JSON file.
-        - Checks if the JSON file is created at the expected path.
-        - Loads the JSON data and verifies its structure and content, ensuring it contains
-        required fields such as 'title_review', 'date', 'title', 'abstract', 'pmid', 'doi',
-        'disclosure', 'mesh_terms', 'url', and 'authors_affiliations'.
-        - Validates specific attribute values to ensure correctness of the scraped data.
+        - Calls scrap_article_to_json with test URLs and a suffix for the JSONL file.
+        - Checks if the JSONL file is created at the path of the URL exports, named after
+        the current year.
+        - Reads the JSONL records with iter_jsonl and verifies its structure and content, ensuring
+        it contains required fields such as 'title_review', 'date', 'title', 'abstract', 'pmid',
+        'doi', 'disclosure', 'mesh_terms', 'url', and 'authors_affiliations'.
+        - Compares each scraped record with the record of the fixture with the same PMID.
 
         Assertions:
-        - The JSON file exists in the specified directory.
-        - The JSON data is a list with at least one entry.
-        - The first entry in the JSON data contains all necessary fields with expected values.
-        """
-
-        mock_soup_1 = MagicMock()
-        mock_soup_1.select_one.side_effect = lambda x: {
-            'button.journal-actions-trigger': MagicMock(title='Lancet (London, England)'),
-        }.get(x, None) 
-        mock_soup_2 = MagicMock()
-        mock_soup_2.select_one.side_effect = lambda x: {
-            'button.journal-actions-trigger': MagicMock(title= 'Medicine (Baltimore)'),
-        }.get(x, None) 
+        - The JSONL file exists in the export directory.
+        - Both articles are scraped.
+        - Each record contains all necessary fields and equals the record of the fixture.
+        """
+        fixture_path = Path(settings.EXPORT_JSON_DIR + "/multiple_sclerosis_2024_test.jsonl")
+        expected = {record['pmid']: record for record in iter_jsonl(fixture_path)}
         pubmed_url= ['https://pubmed.ncbi.nlm.nih.gov/37949093','https://pubmed.ncbi.nlm.nih.gov/38394496']
-        scrap_article_to_json(url=pubmed_url, suffix_article="test")
-        expected_json_path = Path(settings.EXPORT_JSON_DIR + "/multiple_sclerosis_2024_test.json")
-        self.assertTrue(expected_json_path.exists())
-        with expected_json_path.open('r', encoding='utf-8') as f:
-            json_data = json.load(f)
-        self.assertIsInstance(json_data, list)
-        self.assertGreater(len(json_data), 0)  
-        self.assertIn('title_review', json_data[0]) 
-        self.assertIn('date', json_data[0])  
-        self.assertIn('title', json_data[0])  
-        self.assertIn('abstract', json_data[0])
-        self.assertIn('pmid', json_data[0])  
-        self.assertIn('doi', json_data[0])  
-        self.assertIn('disclosure', json_data[0])  
-        self.assertIn('mesh_terms', json_data[0])  
-        self.assertIn('url', json_data[0]) 
-        self.assertIn('authors_affiliations', json_data[0])  
-        self.assertIn('2024-01-13', json_data[0]["date"])  
-        self.assertIn('Lancet (London, England)', json_data[0]["title_review"])  
-        self.assertIn('Multiple sclerosis', json_data[0]["title"]) 
-        self.assertIn('37949093', json_data[0]["pmid"]) 
-        self.assertIn('https://doi.org/10.1016/S0140-6736(23)01473-3', json_data[0]["doi"]) 
+        pages = {pmid: (Path(settings.BASE_DIR) / "data/html" / (pmid + ".html")).read_bytes() for pmid in expected}
+        with tempfile.TemporaryDirectory() as tmp, override_settings(
+                EXPORT_JSON_DIR=tmp, CRAWL_STATE_DIR=tmp, ARCHIVE_DIR=tmp, SCRAPER_CACHE_ENABLED=False), \
+                patch('polls.business_logic.fetch_page', side_effect=lambda url, session: pages[url.rstrip("/").split("/")[-1]]):
+            scrap_article_to_json(url=pubmed_url, suffix_article="test")
+            output_path = Path(tmp) / f"_{date.today().year}test.jsonl"
+            self.assertTrue(output_path.exists())
+            json_data = list(iter_jsonl(output_path))
+        self.assertEqual(sorted(record['pmid'] for record in json_data), sorted(expected))
+        for record in json_data:
+            for field in ('title_review', 'date', 'title', 'abstract', 'pmid', 'doi', 'disclosure',
+                          'mesh_terms', 'url', 'authors_affiliations'):
+                self.assertIn(field, record)
+            self.assertEqual(record, expected[record['pmid']])
 
 
     def test_article_json_to_database(self):
@@ -330,4 +352,1018 @@ class RAGTest(TestCase):
   
 
 
-    
\ No newline at end of file
+    
+
+
+@override_settings(SCRAPER_CACHE_ENABLED=False)
+class ScraperEngineTest(TestCase):
+    def test_token_bucket_throttles_requests(self):
+        """
+        Tests that the token bucket enforces the configured request rate.
+
+        With a rate of 20 requests per second and a burst of one request,
+        acquiring five tokens must take at least four refill periods (0.2s).
+        """
+        bucket = TokenBucket(rate=20, capacity=1)
+        start = time.monotonic()
+        for _ in range(5):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+
+    def test_fetcher_imap_keeps_input_order(self):
+        """
+        Tests that RateLimitedFetcher.imap returns results in the input order.
+
+        The fetch function sleeps longer for the first URLs so that they complete
+        last; the results must nevertheless be yielded in the order of the URLs.
+        """
+        fetcher = RateLimitedFetcher(MagicMock(), concurrency=4, rate=1000)
+        urls = [f"https://pubmed.ncbi.nlm.nih.gov/{pmid}" for pmid in range(8)]
+
+        def fake_fetch(url, session):
+            time.sleep(0.01 * (8 - int(url.rsplit('/', 1)[-1])))
+            return url.upper()
+
+        results = list(fetcher.imap(fake_fetch, urls))
+        self.assertEqual([url for url, _ in results], urls)
+        self.assertEqual([result for _, result in results], [url.upper() for url in urls])
+
+
+    def test_jsonl_writer_appends_and_skips_partial_lines(self):
+        """
+        Tests that JsonlWriter appends records and that iter_jsonl can read a file being written.
+
+        Two writers append to the same file one after the other; both batches must be read
+        back in order. A trailing record without its newline, as left by a crawl still
+        writing, must be ignored by the reader.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "export.jsonl"
+            with JsonlWriter(path, batch_size=2) as writer:
+                for pmid in ["1", "2", "3"]:
+                    writer.write({'pmid': pmid})
+            with JsonlWriter(path, batch_size=2) as writer:
+                writer.write({'pmid': "4"})
+            with path.open('a', encoding='utf-8') as f:
+                f.write('{"pmid": "5"')
+            self.assertEqual([record['pmid'] for record in iter_jsonl(path)], ["1", "2", "3", "4"])
+
+
+
+    def test_article_page_parser(self):
+        """
+        Tests that ArticlePageParser extracts the same record as the former BeautifulSoup code.
+
+        The saved PubMed pages of data/html are parsed and compared field by field with the
+        records of the scraped test export.
+        """
+        json_path = Path(settings.EXPORT_JSON_DIR + "/multiple_sclerosis_2024_test.json")
+        with json_path.open('r', encoding='utf-8') as f:
+            expected_records = {record['pmid']: record for record in json.load(f)}
+        parser = ArticlePageParser()
+        for pmid, expected_record in expected_records.items():
+            html_path = Path(settings.BASE_DIR) / "data/html" / (pmid + ".html")
+            record = parser.parse(html_path.read_bytes())
+            self.assertEqual(record.date, date.fromisoformat(expected_record['date']))
+            self.assertEqual(record.to_dict(), expected_record)
+
+
+    def test_crawl_checkpoint_resumes_and_skips_known_articles(self):
+        """
+        Tests that an interrupted crawl resumes from its checkpoint.
+
+        A first checkpoint records the page count, the first result page and one fetched
+        article. Reloaded from disk, it must let extract_pubmed_url rebuild the links of the
+        recorded page without any request, and `pending` must drop both the fetched article
+        and the article already stored in the database. An article fetched after the last flush
+        must not be recorded as fetched when the next result page is recorded.
+        """
+        Article.objects.create(title='Stored Article', pmid=222)
+        base_url = 'https://pubmed.ncbi.nlm.nih.gov'
+        links = [base_url + "/" + pmid + "/" for pmid in ["111", "222", "333"]]
+        with tempfile.TemporaryDirectory() as tmp_dir, override_settings(CRAWL_STATE_DIR=tmp_dir):
+            checkpoint = CrawlCheckpoint("test.jsonl")
+            checkpoint.page_max = 1
+            checkpoint.mark_page(1, links)
+            checkpoint.mark_fetched(links[0])
+            checkpoint.save()
+            resumed = CrawlCheckpoint("test.jsonl")
+            session = MagicMock()
+            self.assertEqual(extract_pubmed_url(base_url, "", "2025", session, resumed), links)
+            session.get.assert_not_called()
+            self.assertEqual(resumed.pending(links), [links[2]])
+            resumed.mark_fetched(links[2])
+            resumed.mark_page(2, links)
+            self.assertEqual(CrawlCheckpoint("test.jsonl").pending(links), [links[2]])
+
+
+    def test_result_pages_are_discovered_concurrently(self):
+        """
+        Tests that iter_result_pages streams de-duplicated links page by page.
+
+        The fake search returns three result pages, the second one repeating a link of
+        the first. Through a RateLimitedFetcher the pages are fetched concurrently; the
+        links must nevertheless come out in page order, without the duplicate, and the
+        first page must be downloaded only once.
+        """
+        base_url = 'https://pubmed.ncbi.nlm.nih.gov'
+        result_pages = {1: ["1", "2"], 2: ["2", "3"], 3: ["4"]}
+
+        def fake_get(url, **kwargs):
+            page = int(url.split("&page=")[1]) if "&page=" in url else 1
+            fake_response = Response()
+            fake_response.status_code = 200
+            fake_response._content = ('<label class="of-total-pages">of 3</label><div class="search-results-chunk">'
+                                      + "".join(f'<a href="/{pmid}/">{pmid}</a>' for pmid in result_pages[page])
+                                      + '</div>').encode()
+            return fake_response
+
+        session = MagicMock()
+        session.get.side_effect = fake_get
+        fetcher = RateLimitedFetcher(session, concurrency=4, rate=1000)
+        pages = list(iter_result_pages(base_url, "", "2025", fetcher))
+        self.assertEqual(pages, [[base_url + "/1/", base_url + "/2/"], [base_url + "/3/"], [base_url + "/4/"]])
+        self.assertEqual(session.get.call_count, 3)
+
+
+    def test_crawl_planner_splits_windows_and_resumes(self):
+        """
+        Tests that CrawlPlanner plans date windows under the result cap from the last crawl.
+
+        With ten articles a day and a cap of 100 results, January must be split into
+        contiguous windows of at most ten days. Once January is marked as crawled, the
+        next plan must start on January 31 instead of the configured start date.
+        """
+        def fake_count(term, mindate, maxdate, session):
+            start, end = (date(*map(int, day.split("/"))) for day in (mindate, maxdate))
+            return ((end - start).days + 1) * 10
+
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                override_settings(CRAWL_STATE_DIR=tmp_dir, CRAWL_MAX_RESULTS=100, CRAWL_START_DATE='2025-01-01'), \
+                patch('polls.scraping.planner.esearch_count', side_effect=fake_count):
+            windows = CrawlPlanner("multiple sclerosis").plan(MagicMock(), today=date(2025, 1, 31))
+            self.assertEqual(windows[0].start, date(2025, 1, 1))
+            self.assertEqual(windows[-1].end, date(2025, 1, 31))
+            for previous, window in zip(windows, windows[1:]):
+                self.assertEqual((window.start - previous.end).days, 1)
+            self.assertTrue(all((window.end - window.start).days < 10 for window in windows))
+            self.assertEqual(windows[0].search_filter, "dates.2025/01/01-2025/01/08")
+            CrawlPlanner("multiple sclerosis").mark_crawled(date(2025, 1, 31))
+            windows = CrawlPlanner("multiple sclerosis").plan(MagicMock(), today=date(2025, 2, 2))
+            self.assertEqual(windows, [DateWindow(date(2025, 1, 31), date(2025, 2, 2))])
+
+
+    def test_failed_downloads_do_not_advance_the_crawl_date(self):
+        """
+        Tests that a crawl with articles failing to download is planned again by the next run.
+
+        The first run cannot download one of the two articles of its window: the term must keep no
+        crawl date. Once both articles are downloaded, the crawl date must be recorded.
+        """
+        window = DateWindow(date(2025, 1, 1), date(2025, 1, 31))
+        links = ['https://pubmed.ncbi.nlm.nih.gov/1/', 'https://pubmed.ncbi.nlm.nih.gov/2/']
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                override_settings(EXPORT_JSON_DIR=tmp_dir, CRAWL_STATE_DIR=tmp_dir, SCRAPER_ARCHIVE_PAGES=False,
+                                  SCRAPER_CACHE_ENABLED=False), \
+                patch('polls.business_logic.CrawlPlanner.plan', return_value=[window]), \
+                patch('polls.business_logic.iter_result_pages', side_effect=lambda *args: iter([links])):
+            with patch('polls.business_logic.fetch_page', side_effect=lambda url, session: None if "/2/" in url else b"<html></html>"):
+                scrap_article_to_json(term="multiple sclerosis")
+            self.assertIsNone(CrawlPlanner("multiple sclerosis").last_crawled())
+            with patch('polls.business_logic.fetch_page', return_value=b"<html></html>") as fetch:
+                scrap_article_to_json(term="multiple sclerosis")
+            self.assertEqual([call.args[0] for call in fetch.call_args_list], [links[1]])
+            self.assertEqual(CrawlPlanner("multiple sclerosis").last_crawled(), date.today())
+
+
+    def test_response_cache_revalidates_and_evicts(self):
+        """
+        Tests that ResponseCache serves fresh pages from disk and revalidates stale ones.
+
+        A fresh entry must be returned without calling the network. Once stale, the entry
+        must be revalidated with its ETag and served from disk on a 304. Storing a second
+        page beyond the size bound must evict the least recently used one.
+        """
+        def response(status_code, content=b"", etag=None):
+            fake_response = Response()
+            fake_response.status_code = status_code
+            fake_response._content = content
+            if etag:
+                fake_response.headers['ETag'] = etag
+            return fake_response
+
+        url = 'https://pubmed.ncbi.nlm.nih.gov/37949093/'
+        fetch = MagicMock(side_effect=[response(200, b"<html>page</html>", '"v1"'), response(304),
+                                       response(200, b"<html>other page</html>")])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = ResponseCache(tmp_dir, ttl=3600, max_bytes=30)
+            self.assertFalse(cache.get(url, fetch).from_cache)
+            cached = cache.get(url, fetch)
+            self.assertTrue(cached.from_cache)
+            self.assertEqual(cached.content, b"<html>page</html>")
+            self.assertEqual(fetch.call_count, 1)
+            cache.ttl = 0
+            revalidated = cache.get(url, fetch)
+            self.assertEqual(fetch.call_args.kwargs['headers'], {'If-None-Match': '"v1"'})
+            self.assertTrue(revalidated.from_cache)
+            cache.get(url + "other/", fetch)
+            self.assertIsNone(cache.lookup(url))
+
+
+    def test_response_cache_skips_result_pages_and_evicted_bodies(self):
+        """
+        Tests that the search result pages bypass the cache and that an evicted body is a cache miss.
+
+        A request with a query string must go to the network without touching the cache. A cached
+        page whose body disappears between the lookup and the read, as when another thread evicts
+        it, must be downloaded again instead of raising.
+        """
+        def response(content):
+            fake_response = Response()
+            fake_response.status_code = 200
+            fake_response._content = content
+            return fake_response
+
+        cache = MagicMock()
+        session = MagicMock()
+        fetcher = RateLimitedFetcher(session, rate=1000, cache=cache)
+        fetcher.get('https://pubmed.ncbi.nlm.nih.gov/?term=multiple+sclerosis&page=2')
+        cache.get.assert_not_called()
+        fetcher.get('https://pubmed.ncbi.nlm.nih.gov/37949093/')
+        cache.get.assert_called_once()
+        url = 'https://pubmed.ncbi.nlm.nih.gov/37949093/'
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = ResponseCache(tmp_dir, ttl=3600)
+            fetch = MagicMock(side_effect=[response(b"<html>v1</html>"), response(b"<html>v2</html>")])
+            cache.get(url, fetch)
+            entry = cache.lookup(url)
+            cache.body_path(entry['body_hash']).unlink()
+            self.assertIsNone(cache.cached_response(url, entry))
+            with patch.object(cache, 'lookup', return_value=entry):
+                self.assertEqual(cache.get(url, fetch).content, b"<html>v2</html>")
+            self.assertEqual(fetch.call_count, 2)
+
+
+    def test_response_cache_stores_identical_bodies_concurrently(self):
+        """
+        Tests that threads storing the same body for different URLs do not collide.
+
+        The threads all find the body missing and write it at the same time, as with the error
+        pages of a burst of requests. Every URL must be cached with the single shared body, and no
+        temporary file may be left.
+        """
+        fake_response = Response()
+        fake_response.status_code = 200
+        fake_response._content = b"<html>Not found</html>" * 100000
+        urls = [f'https://pubmed.ncbi.nlm.nih.gov/{pmid}/' for pmid in range(8)]
+        barrier = threading.Barrier(len(urls))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = ResponseCache(tmp_dir, ttl=3600, max_bytes=10 ** 9)
+            with ThreadPoolExecutor(len(urls)) as executor, patch.object(Path, 'exists', lambda path: barrier.wait() < 0):
+                list(executor.map(lambda url: cache.store(url, fake_response), urls))
+            self.assertTrue(all(cache.lookup(url) for url in urls))
+            self.assertEqual(len(list((Path(tmp_dir) / "bodies").iterdir())), 1)
+
+
+    def test_page_archive_replay(self):
+        """
+        Tests that archived pages are replayed through the extractor in worker processes.
+
+        The saved PubMed pages of data/html are appended to a PageArchive, the first one
+        twice to mimic a page fetched again. Replaying the archive with two processes must
+        read the offset index, keep the last copy of each PMID and yield the records of the
+        scraped test export in archive order. The replay_archive command must rewrite the export
+        of every archive of ARCHIVE_DIR, and report an error when there is none.
+        """
+        json_path = Path(settings.EXPORT_JSON_DIR + "/multiple_sclerosis_2024_test.json")
+        with json_path.open('r', encoding='utf-8') as f:
+            expected_records = json.load(f)
+        pages = {record['pmid']: (Path(settings.BASE_DIR) / "data/html" / (record['pmid'] + ".html")).read_bytes()
+                 for record in expected_records}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive_path = Path(tmp_dir) / "test.zst"
+            with PageArchive(archive_path) as archive:
+                archive.write(expected_records[0]['pmid'], b"<html></html>")
+                for pmid, content in pages.items():
+                    archive.write(pmid, content)
+            self.assertEqual(list(read_index(archive_path)), list(pages))
+            self.assertEqual(list(replay_archive(archive_path, workers=2, chunk_size=1)), expected_records)
+            out = io.StringIO()
+            with override_settings(ARCHIVE_DIR=tmp_dir, EXPORT_JSON_DIR=tmp_dir):
+                call_command('commands', 'replay_archive', stdout=out)
+            self.assertIn("Successfully replayed 1 archives", out.getvalue())
+            self.assertEqual(list(iter_jsonl(Path(tmp_dir) / "test.jsonl")), expected_records)
+        with tempfile.TemporaryDirectory() as tmp_dir, override_settings(ARCHIVE_DIR=tmp_dir):
+            out = io.StringIO()
+            call_command('commands', 'replay_archive', stdout=out)
+            self.assertIn("No archive to replay", out.getvalue())
+
+class EfetchIngestTest(TestCase):
+    def test_parse_pubmed_xml_matches_scraped_records(self):
+        """
+        Tests that the efetch XML parser produces the same records as the HTML scraper.
+
+        The recorded efetch response contains the two articles of the scraped test export
+        plus an erratum without abstract. The erratum must be skipped and the two other
+        records must be identical to the scraped ones.
+        """
+        xml_path = Path(settings.BASE_DIR) / "data/xml/multiple_sclerosis_2024_test.xml"
+        json_path = Path(settings.EXPORT_JSON_DIR + "/multiple_sclerosis_2024_test.json")
+        with json_path.open('r', encoding='utf-8') as f:
+            expected_records = json.load(f)
+        records = list(parse_pubmed_xml(str(xml_path)))
+        self.assertEqual(records, expected_records)
+
+
+    def test_fetch_pubmed_articles_batches_pmids(self):
+        """
+        Tests that fetch_pubmed_articles sends one efetch request per batch of PMIDs.
+        """
+        xml_path = Path(settings.BASE_DIR) / "data/xml/multiple_sclerosis_2024_test.xml"
+        session = MagicMock()
+        session.get.side_effect = lambda url, params, stream: MagicMock(raw=io.BytesIO(xml_path.read_bytes()))
+        pmids = [str(pmid) for pmid in range(450)]
+        records = list(fetch_pubmed_articles(pmids, session, batch_size=200))
+        self.assertEqual(session.get.call_count, 3)
+        self.assertEqual(len(session.get.call_args_list[0].kwargs['params']['id'].split(",")), 200)
+        self.assertEqual(len(records), 6)
+
+
+    def test_esearch_pmids_warns_when_truncated(self):
+        """
+        Tests that esearch_pmids searches every article for an empty term and warns when the list is capped.
+        """
+        session = MagicMock()
+        session.get.return_value.json.return_value = {'esearchresult': {'count': "12000", 'idlist': ["1", "2"]}}
+        with self.assertLogs('polls.scraping.efetch', level='WARNING'):
+            self.assertEqual(esearch_pmids("", "2025/01/01", "2025/01/01", session), ["1", "2"])
+        self.assertEqual(session.get.call_args.kwargs['params']['term'], "all[sb]")
+
+
+    def test_efetch_article_to_json_splits_the_year_under_the_esearch_cap(self):
+        """
+        Tests that efetch_article_to_json lists the PMIDs of a year by date windows under the esearch cap.
+
+        With ten articles a day and a cap of 1000 results, the windows searched must cover the
+        whole year, without gap or overlap, and each must hold at most 1000 articles.
+        """
+        def fake_count(term, mindate, maxdate, session):
+            start, end = (date(*map(int, day.split("/"))) for day in (mindate, maxdate))
+            return ((end - start).days + 1) * 10
+
+        searched = []
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                override_settings(EXPORT_JSON_DIR=tmp_dir, CRAWL_STATE_DIR=tmp_dir, ESEARCH_MAX_RESULTS=1000), \
+                patch('polls.business_logic.esearch_count', side_effect=fake_count), \
+                patch('polls.business_logic.esearch_pmids',
+                      side_effect=lambda term, mindate, maxdate, session: searched.append((mindate, maxdate)) or []), \
+                patch('polls.business_logic.fetch_pubmed_articles', return_value=iter([])):
+            efetch_article_to_json(term="multiple sclerosis", filter="2024")
+        days = [[date(*map(int, day.split("/"))) for day in window] for window in searched]
+        self.assertEqual(days[0][0], date(2024, 1, 1))
+        self.assertEqual(days[-1][1], date(2024, 12, 31))
+        for (_, previous_end), (start, _) in zip(days, days[1:]):
+            self.assertEqual((start - previous_end).days, 1)
+        self.assertTrue(all(fake_count(None, *window, None) <= 1000 for window in searched))
+
+
+class IngestionTest(TestCase):
+    def test_iter_json_array_streams_items(self):
+        """
+        Tests that iter_json_array decodes a JSON array item by item.
+
+        The test export is read with chunks much smaller than one record, so that every
+        record spans several reads; the items must be identical to those of json.load.
+        """
+        json_path = Path(settings.EXPORT_JSON_DIR + "/multiple_sclerosis_2024_test.json")
+        with json_path.open('r', encoding='utf-8') as f:
+            expected_records = json.load(f)
+        self.assertEqual(list(iter_json_array(json_path, chunk_size=64)), expected_records)
+
+
+    def test_ingest_records_by_batches(self):
+        """
+        Tests that ingest_records saves the articles, authors, affiliations and authorships by batches.
+
+        The two records of the test export are ingested one per batch, then ingested again:
+        the second run must create nothing, and the progress callback must be called once
+        per batch with the throughput.
+        """
+        json_path = Path(settings.EXPORT_JSON_DIR + "/multiple_sclerosis_2024_test.json")
+        messages = []
+        created = ingest_records(iter_export(json_path), "multiple_sclerosis_2024", batch_size=1, progress=messages.append)
+        self.assertEqual(created, 2)
+        self.assertEqual(len(messages), 2)
+        self.assertIn("records/s", messages[-1])
+        self.assertEqual(ingest_records(iter_export(json_path), "multiple_sclerosis_2024", batch_size=1), 0)
+        self.assertEqual(Article.objects.count(), 2)
+        self.assertEqual(Authors.objects.count(), 12)
+        self.assertEqual(Affiliations.objects.count(), 10)
+        self.assertEqual(Authorship.objects.count(), 15)
+        article = Article.objects.get(pmid=37949093)
+        self.assertEqual(article.date, date(2024, 1, 13))
+        self.assertEqual(article.term, "multiple_sclerosis_2024")
+        self.assertEqual(article.authors.count(), 7)
+
+
+    @skipUnless(connection.vendor == 'postgresql', "PostgreSQL only")
+    def test_copy_ingest_records(self):
+        """
+        Tests that the COPY loader saves the same rows as the ORM loader.
+
+        The test export is loaded through COPY and the staging tables, with a title holding a
+        tab and a newline to check the escaping of the COPY text format. Loading it a second
+        time must not create any row.
+        """
+        json_path = Path(settings.EXPORT_JSON_DIR + "/multiple_sclerosis_2024_test.json")
+        records = list(iter_export(json_path))
+        records[0]['title'] = "Multiple\tsclerosis\n\\N"
+        self.assertEqual(ingest_records(records, "multiple_sclerosis_2024", method='copy'), 2)
+        self.assertEqual(ingest_records(records, "multiple_sclerosis_2024", method='copy'), 0)
+        self.assertEqual(Article.objects.count(), 2)
+        self.assertEqual(Authors.objects.count(), 12)
+        self.assertEqual(Affiliations.objects.count(), 10)
+        self.assertEqual(Authorship.objects.count(), 15)
+        article = Article.objects.get(pmid=37949093)
+        self.assertEqual(article.title, "Multiple\tsclerosis\n\\N")
+        self.assertEqual(article.date, date(2024, 1, 13))
+        self.assertEqual(article.authors.count(), 7)
+
+
+    def test_upsert_names_returns_existing_ids(self):
+        """
+        Tests that upsert_names returns the ids of existing rows and only creates the missing ones.
+
+        One author already exists: upserting it with a new name must return its id without
+        creating a duplicate, and the number of queries must not depend on the rows already
+        in the table. An affiliation longer than the maximum size of a btree index row must
+        be upserted on its md5 like any other name.
+        """
+        existing = Authors.objects.create(name="Jane Doe")
+        Authors.objects.bulk_create([Authors(name=f"Author {i}") for i in range(50)])
+        with self.assertNumQueries(1):
+            author_ids = upsert_names(Authors, ["Jane Doe", "John Doe", "John Doe"])
+        self.assertEqual(author_ids["Jane Doe"], existing.id)
+        self.assertEqual(Authors.objects.filter(name="John Doe").get().id, author_ids["John Doe"])
+        self.assertEqual(Authors.objects.count(), 52)
+        long_name = "".join(hashlib.sha256(str(i).encode()).hexdigest() for i in range(200))
+        affiliation_id = upsert_names(Affiliations, [long_name])[long_name]
+        self.assertEqual(upsert_names(Affiliations, [long_name, "Inserm"])[long_name], affiliation_id)
+        self.assertEqual(Affiliations.objects.count(), 2)
+
+
+    def test_read_records_normalizes_every_format(self):
+        """
+        Tests that the JSON, JSONL, CSV and Parquet readers yield the same normalized records.
+
+        The test export is written as JSONL with JsonlWriter, as CSV with CsvWriter, which stores
+        the authorships as JSON strings, and as Parquet when pyarrow is installed. Every file must
+        give back the records of the JSON export, with an int pmid and decoded authorships.
+        """
+        json_path = Path(settings.EXPORT_JSON_DIR + "/multiple_sclerosis_2024_test.json")
+        expected = list(read_records(json_path))
+        self.assertIsInstance(expected[0]['pmid'], int)
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [Path(tmp) / "articles.jsonl", Path(tmp) / "articles.csv"]
+            for path, writer_class in zip(paths, [JsonlWriter, CsvWriter]):
+                with writer_class(path) as writer:
+                    for record in iter_export(json_path):
+                        writer.write(record)
+            if pq is not None:
+                import pyarrow
+                paths.append(Path(tmp) / "articles.parquet")
+                pq.write_table(pyarrow.Table.from_pylist(list(iter_export(json_path))), paths[-1])
+            for path in paths:
+                self.assertEqual(list(read_records(path)), expected, path.suffix)
+            with self.assertRaises(ValueError):
+                list(read_records(Path(tmp) / "articles.xml"))
+
+
+    def test_ingest_inputs_loads_csv_authorships(self):
+        """
+        Tests that ingest_inputs finds the files of each term with the globs and loads CSV authorships.
+
+        The test export is written as a CSV file named after a term; ingesting it through the
+        CSV glob must create the same authorships as the JSON export, and a term without input
+        file must only be reported.
+        """
+        json_path = Path(settings.EXPORT_JSON_DIR + "/multiple_sclerosis_2024_test.json")
+        with tempfile.TemporaryDirectory() as tmp, override_settings(INGEST_INPUT_DIR=tmp):
+            with CsvWriter(Path(tmp) / "csv" / "multiple_sclerosis_2024.csv") as writer:
+                for record in iter_export(json_path):
+                    writer.write(record)
+            messages = []
+            created = ingest_inputs(["json/{term}.jsonl", "csv/{term}.csv"], ["multiple_sclerosis_2024", "herpes_zoster_2024"],
+                                    progress=messages.append)
+        self.assertEqual(created, 2)
+        self.assertEqual(messages[-1], "herpes_zoster_2024: no input file")
+        self.assertEqual(Authorship.objects.count(), 15)
+        self.assertEqual(Article.objects.get(pmid=37949093).authors.count(), 7)
+
+
+    def test_name_cache_resolves_without_queries(self):
+        """
+        Tests that resolve_names serves cached ids without queries and that the cache is bounded and invalidated.
+
+        Names are resolved once, which upserts them, then again after the commit, which must not run
+        any query, including for a name written with extra whitespace. A cache holding two entries
+        must evict the least recently used one, and deleting an author must drop its entry.
+        """
+        self.addCleanup(name_cache.clear)
+        with self.captureOnCommitCallbacks(execute=True):
+            author_ids = resolve_names(Authors, ["Jane Doe", "John Doe"])
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_names(Authors, ["Jane  Doe ", "John Doe"]),
+                             {"Jane  Doe ": author_ids["Jane Doe"], "John Doe": author_ids["John Doe"]})
+        Authors.objects.get(name="Jane Doe").delete()
+        self.assertEqual(name_cache.get_many(Authors, ["Jane Doe", "John Doe"]), {"John Doe": author_ids["John Doe"]})
+        cache = NameCache(max_bytes=2 * ENTRY_BYTES)
+        cache.set_many(Affiliations, {"A": 1, "B": 2})
+        cache.get_many(Affiliations, ["A"])
+        cache.set_many(Affiliations, {"C": 3})
+        self.assertEqual(cache.get_many(Affiliations, ["A", "B", "C"]), {"A": 1, "C": 3})
+        self.assertEqual(len(cache), 2)
+
+
+    @skipUnless(connection.vendor == 'postgresql', "PostgreSQL only")
+    def test_articles_with_authors_view_is_refreshed(self):
+        """
+        Tests that the ArticlesWithAuthors materialized view follows the articles once refreshed.
+
+        The test export is ingested and the view refreshed: each row must have the id of its
+        article and its authors with their affiliations. After an article is edited and the other
+        deleted, a concurrent refresh must show the edit and drop the deleted article.
+        """
+        json_path = Path(settings.EXPORT_JSON_DIR + "/multiple_sclerosis_2024_test.json")
+        ingest_records(iter_export(json_path), "multiple_sclerosis_2024")
+        articles_full_to_database()
+        article = Article.objects.get(pmid=37949093)
+        row = ArticlesWithAuthors.objects.get(id=article.id)
+        self.assertEqual(row.title, article.title)
+        self.assertEqual(len(row.affiliations_by_author), 7)
+        self.assertEqual(len(row.affiliations_by_author["Dejan Jakimovski"]), 1)
+        article.title = "Multiple sclerosis, edited"
+        article.save()
+        Article.objects.exclude(id=article.id).delete()
+        refresh_articles_with_authors()
+        self.assertEqual(list(ArticlesWithAuthors.objects.values_list('id', 'title')), [(article.id, "Multiple sclerosis, edited")])
+
+
+    def test_refresh_debouncer_coalesces_requests(self):
+        """
+        Tests that a burst of refresh requests only triggers one refresh.
+
+        Three refreshes are requested before the delay expires, then one more after the refresh:
+        the refresh must run twice.
+        """
+        refreshed = threading.Event()
+        refresh = MagicMock(side_effect=refreshed.set)
+        debouncer = RefreshDebouncer(delay=0.05, refresh=refresh)
+        for _ in range(3):
+            debouncer.schedule()
+        self.assertTrue(refreshed.wait(5))
+        refreshed.clear()
+        debouncer.schedule()
+        self.assertTrue(refreshed.wait(5))
+        self.assertEqual(refresh.call_count, 2)
+
+
+    def test_jsonl_ranges_cover_every_line_once(self):
+        """
+        Tests that the byte ranges of shard_ranges split a JSONL file without losing or repeating a line.
+
+        A JSONL file of 50 records is split in ranges much smaller than a line and of a few lines:
+        reading every range in order must give back the records of the whole file.
+        """
+        records = [{'pmid': str(pmid), 'title': "Article " + "x" * pmid, 'authors_affiliations': []} for pmid in range(1, 51)]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "articles.jsonl"
+            with JsonlWriter(path) as writer:
+                for record in records:
+                    writer.write(record)
+            expected = list(read_records(path))
+            for shard_bytes in [7, 150, 10**6]:
+                ranges = shard_ranges(path, shard_bytes)
+                self.assertEqual([record for start, end in ranges for record in read_jsonl_range(path, start, end)],
+                                 expected, shard_bytes)
+
+
+    def test_near_duplicate_articles_are_flagged(self):
+        """
+        Tests that an article whose abstract is a near-copy of an ingested one is flagged as its duplicate.
+
+        The test export is ingested, then a copy of its first article with another pmid and one word of
+        the abstract changed, and an article with an unrelated abstract, through COPY on PostgreSQL: only
+        the copy must point to the original. Flagging the original again, as a second ingestion process
+        inserting the same pmid does, must neither store its signature twice nor flag it. The signatures
+        of the ingested articles are then dropped, and flag_existing_duplicates must find the same
+        duplicate again.
+        """
+        json_path = Path(settings.EXPORT_JSON_DIR + "/multiple_sclerosis_2024_test.json")
+        records = list(iter_export(json_path))
+        ingest_records(records, "multiple_sclerosis_2024")
+        words = records[0]['abstract'].split()
+        words[len(words) // 2] = "relapsing"
+        copy = dict(records[0], pmid=1, abstract=" ".join(words))
+        other = dict(records[0], pmid=2, abstract="An unrelated abstract about herpes zoster vaccination in older adults.")
+        method = 'copy' if connection.vendor == 'postgresql' else 'orm'
+        self.assertEqual(ingest_records([copy, other], "multiple_sclerosis_2024", method=method), 2)
+        original = Article.objects.get(pmid=records[0]['pmid'])
+        self.assertEqual(Article.objects.get(pmid=1).duplicate_of, original)
+        self.assertIsNone(Article.objects.get(pmid=2).duplicate_of)
+        self.assertIsNone(original.duplicate_of)
+        hasher = MinHasher()
+        self.assertGreater(similarity(hasher.signature(records[0]['abstract']), hasher.signature(copy['abstract'])), 0.8)
+        signatures = ArticleSignature.objects.count()
+        self.assertEqual(flag_near_duplicates({original.id: hasher.signature(records[0]['abstract'])}), 0)
+        self.assertEqual(ArticleSignature.objects.count(), signatures)
+        self.assertIsNone(Article.objects.get(id=original.id).duplicate_of)
+        Article.objects.update(duplicate_of=None)
+        ArticleSignature.objects.all().delete()
+        self.assertEqual(flag_existing_duplicates(batch_size=2), 1)
+        self.assertEqual(Article.objects.get(pmid=1).duplicate_of, original)
+
+
+    def test_synthetic_corpus_reuses_names(self):
+        """
+        Tests that the synthetic corpus is reproducible and reuses its authors and affiliations.
+
+        Two corpora of 500 articles with the same seed must be identical, with distinct pmids.
+        The most frequent author must sign many articles while the median author signs a few, and the
+        records must go through the readers like the scraper exports.
+        """
+        records = list(SyntheticCorpus(500, seed=3).records())
+        self.assertEqual(records, list(SyntheticCorpus(500, seed=3).records()))
+        self.assertEqual(len({record['pmid'] for record in records}), 500)
+        counts = Counter(author['author_name'] for record in records for author in record['authors_affiliations'])
+        self.assertGreater(counts.most_common(1)[0][1], 20)
+        self.assertLessEqual(sorted(counts.values())[len(counts) // 2], 5)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = write_synthetic_corpus(Path(tmp) / "synthetic.jsonl", 500, seed=3)
+            self.assertEqual([record['pmid'] for record in read_records(path)], [int(record['pmid']) for record in records])
+
+
+    def test_benchmark_pipeline_measures_ingestion(self):
+        """
+        Tests that benchmark_pipeline reports the rows, throughput and queries of the ingestion stage.
+
+        A synthetic corpus of 200 articles is ingested: every article must be counted, the
+        queries of the batches must be counted, and an unknown stage must be rejected.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = write_synthetic_corpus(Path(tmp) / "synthetic.jsonl", 200)
+            [result] = benchmark_pipeline(path, stages=['ingestion'])
+            self.assertEqual(result['stage'], 'ingestion')
+            self.assertEqual(result['rows'], 200)
+            self.assertEqual(Article.objects.filter(term="synthetic").count(), 200)
+            self.assertGreater(result['rows_per_second'], 0)
+            self.assertGreater(result['queries'], 0)
+            self.assertGreater(result['peak_rss_mb'], 0)
+            with self.assertRaises(ValueError):
+                benchmark_pipeline(path, stages=['ingestion', 'unknown'])
+
+    @patch('polls.indexing.embeddings.model')
+    def test_benchmark_index_stage_keeps_the_embedding_store(self, mock_model):
+        """
+        Tests that the indexing stage of benchmark_pipeline encodes into a scratch embedding store.
+
+        The texts encoded by the stage must not be added to the store of settings.EMBEDDING_CACHE_DIR.
+        """
+        mock_model.encode.side_effect = lambda texts, batch_size: np.ones((len(texts), 2), dtype=np.float32)
+        with tempfile.TemporaryDirectory() as tmp, override_settings(EMBEDDING_CACHE_DIR=tmp), \
+                patch('polls.ingestion.benchmark.scratch_index'), \
+                patch('polls.indexing.bulk.bulk_index_articles', side_effect=lambda index: len(encode_texts(["a", "b"]))):
+            [result] = benchmark_pipeline("synthetic.jsonl", stages=['index_articles'])
+            self.assertEqual(result['rows'], 2)
+            self.assertEqual(mock_model.encode.call_count, 1)
+            self.assertEqual(list(Path(tmp).iterdir()), [])
+
+
+@skipUnless(connection.vendor == 'postgresql', "Worker processes need a database shared between connections")
+class ParallelIngestionTest(TransactionTestCase):
+    def test_ingest_inputs_with_workers(self):
+        """
+        Tests that ingest_inputs shares the files and JSONL ranges between worker processes.
+
+        Two terms are written as JSONL files of 60 articles sharing their authors and affiliations,
+        and ingested by 3 processes with ranges of a few lines. Every article and authorship must be
+        created once, and the concurrent upserts of the shared names must not create duplicates.
+        """
+        with tempfile.TemporaryDirectory() as tmp, override_settings(INGEST_INPUT_DIR=tmp, INGEST_SHARD_BYTES=2000):
+            for offset, term in enumerate(["term_a", "term_b"]):
+                with JsonlWriter(Path(tmp) / "json" / (term + ".jsonl")) as writer:
+                    for pmid in range(offset * 1000, offset * 1000 + 60):
+                        writer.write({'pmid': str(pmid + 1), 'title': f"Article {pmid}", 'date': "2024-01-01",
+                                      'authors_affiliations': [{'author_name': f"Author {pmid % 7}", 'affiliations': [f"Affiliation {pmid % 5}"]},
+                                                               {'author_name': "Shared Author", 'affiliations': ["Shared Affiliation"]}]})
+            messages = []
+            created = ingest_inputs(["json/{term}.jsonl"], ["term_a", "term_b"], progress=messages.append, workers=3)
+        self.assertEqual(created, 120)
+        self.assertGreater(len(messages), 2)
+        self.assertEqual(Article.objects.count(), 120)
+        self.assertEqual(Article.objects.filter(term="term_b").count(), 60)
+        self.assertEqual(Authors.objects.count(), 8)
+        self.assertEqual(Affiliations.objects.count(), 6)
+        self.assertEqual(Authorship.objects.count(), 240)
+
+
+class IndexingTest(TestCase):
+    @patch('polls.indexing.embeddings.model.encode')
+    @patch('polls.indexing.bulk.parallel_bulk')
+    @patch('polls.indexing.bulk.get_connection')
+    def test_bulk_index_articles(self, mock_connection, mock_parallel_bulk, mock_encode):
+        """
+        Tests that bulk_index_articles encodes the articles by chunks and sends them through the bulk API.
+
+        Three articles are indexed by chunks of two, one of them being a near-duplicate: the two others
+        must be encoded by one call per chunk and sent as index actions, and the refresh interval of the
+        index must be disabled during the load, then restored and followed by a refresh.
+        """
+        original = Article.objects.create(title="Multiple sclerosis", abstract="An abstract.", pmid=1)
+        Article.objects.create(title="Multiple sclerosis", abstract="An abstract!", pmid=2, duplicate_of=original)
+        other = Article.objects.create(title="Herpes zoster", abstract="Another abstract.", pmid=3)
+        client = mock_connection.return_value
+        client.indices.exists.return_value = True
+        client.indices.get_settings.return_value = {'medical-articles': {'settings': {'index': {'refresh_interval': "30s"}}}}
+        mock_encode.side_effect = lambda texts, batch_size: np.ones((len(texts), 768))
+        actions = []
+        mock_parallel_bulk.side_effect = lambda client, items, **kwargs: ((True, actions.append(item)) for item in items)
+        with tempfile.TemporaryDirectory() as tmp, override_settings(EMBEDDING_CACHE_DIR=tmp):
+            self.assertEqual(bulk_index_articles(index="medical-articles", chunk_size=2, batch_size=8), 2)
+        self.assertEqual([action['_id'] for action in actions], [original.id, other.id])
+        self.assertEqual(actions[1]['_source']['title'], "Herpes zoster")
+        self.assertEqual(len(actions[1]['_source']['title_abstract_vector']), 768)
+        mock_encode.assert_called_once_with(["multiple sclerosis an abstract.", "herpes zoster another abstract."], batch_size=8)
+        self.assertEqual([call.kwargs['settings'] for call in client.indices.put_settings.call_args_list],
+                         [{'index': {'refresh_interval': "-1"}}, {'index': {'refresh_interval': "30s"}}])
+        client.indices.refresh.assert_called_once_with(index="medical-articles")
+
+
+    def test_embedding_store_only_encodes_new_texts(self):
+        """
+        Tests that the EmbeddingStore encodes each distinct text once and keeps the vectors on disk.
+
+        A first call encodes three texts, one of them twice; a second call must only encode the new
+        text. After more rows than the initial capacity are added, a store opened again from the files
+        must return the same vectors without encoding anything.
+        """
+        def encoder(texts, batch_size):
+            encoded.append(texts)
+            return np.array([[len(text), sum(map(ord, text))] for text in texts], dtype=np.float32)
+
+        encoded = []
+        with tempfile.TemporaryDirectory() as tmp:
+            store = EmbeddingStore(tmp, "microsoft/model")
+            vectors = store.encode(["a", "bb", "a", "ccc"], encoder)
+            self.assertEqual(encoded, [["a", "bb", "ccc"]])
+            np.testing.assert_array_equal(vectors[2], vectors[0])
+            np.testing.assert_array_equal(store.encode(["ccc", "dddd"], encoder)[0], vectors[3])
+            self.assertEqual(encoded[-1], ["dddd"])
+            texts = [f"text {i}" for i in range(3000)]
+            expected = store.encode(texts, encoder, batch_size=64)
+            self.assertEqual(len(store), 3004)
+            encoded.clear()
+            reopened = EmbeddingStore(tmp, "microsoft/model")
+            np.testing.assert_array_equal(reopened.encode(texts + ["bb"], encoder), np.vstack([expected, vectors[1]]))
+            self.assertEqual(encoded, [])
+
+
+    def test_sharded_encoder_keeps_chunk_order(self):
+        """
+        Tests that the ShardedEncoder yields the vectors of the chunks in their order and only sends new texts.
+
+        The first chunks are encoded slower than the next ones, so their results complete last; each
+        chunk must still get the vectors of its own texts. Encoding the chunks again must send nothing
+        to the workers, the vectors being found in the embedding store.
+        """
+        def encode_chunk(texts, batch_size):
+            sent.append(texts)
+            time.sleep(0.05 if texts[0].startswith("chunk 0") else 0)
+            return np.array([[float(text.split()[1]), float(text.split()[3])] for text in texts], dtype=np.float32)
+
+        sent = []
+        chunks = [(i, [f"chunk {i} text {j}" for j in range(5)]) for i in range(6)]
+        with tempfile.TemporaryDirectory() as tmp, override_settings(EMBEDDING_CACHE_DIR=tmp), \
+                patch('polls.indexing.embeddings.encode_chunk', side_effect=encode_chunk):
+            with ShardedEncoder(2, threads=1, executor=ThreadPoolExecutor(2)) as encoder:
+                results = list(encoder.map(chunks))
+            self.assertEqual([i for i, _ in results], list(range(6)))
+            for i, vectors in results:
+                np.testing.assert_array_equal(vectors, [[i, j] for j in range(5)])
+            self.assertEqual(len(sent), 6)
+            sent.clear()
+            with ShardedEncoder(2, threads=1, executor=ThreadPoolExecutor(2)) as encoder:
+                np.testing.assert_array_equal(dict(encoder.map(chunks))[3], results[3][1])
+            self.assertEqual(sent, [])
+
+    @patch('polls.indexing.embeddings.model')
+    def test_embedding_stores_are_kept_per_backend(self, mock_model):
+        """
+        Tests that the vectors of the torch and onnx backends are stored apart.
+
+        A text encoded with the torch backend must be encoded again with the onnx backend, in another
+        store directory, instead of reusing the torch vector.
+        """
+        mock_model.encode.side_effect = lambda texts, batch_size: np.ones((len(texts), 2), dtype=np.float32)
+        with tempfile.TemporaryDirectory() as tmp, override_settings(EMBEDDING_CACHE_DIR=tmp):
+            for backend in ('torch', 'onnx', 'torch'):
+                with override_settings(INFERENCE_BACKEND=backend):
+                    encode_texts(["a text"])
+            self.assertEqual(mock_model.encode.call_count, 2)
+            self.assertEqual(sorted(path.name for path in Path(tmp).iterdir()),
+                             sorted(f"{EMBEDDING_MODEL.replace('/', '--')}-{backend}" for backend in ('torch', 'onnx-int8')))
+
+
+    def test_index_queue_coalesces_operations(self):
+        """
+        Tests that the IndexQueue sends the operations queued during its delay as one batch.
+
+        Three operations on two articles are queued before the delay expires: one batch must be sent
+        with the last operation of each article. A batch which fails must be sent again.
+        """
+        sent = threading.Event()
+        process = MagicMock(side_effect=lambda operations: sent.set())
+        queue = IndexQueue(delay=0.05, process=process)
+        queue.put(1, 'index')
+        queue.put(2, 'index')
+        queue.put(1, 'delete')
+        self.assertTrue(sent.wait(5))
+        process.assert_called_once_with({1: 'delete', 2: 'index'})
+        process.reset_mock(side_effect=True)
+        process.side_effect = [ConnectionError(), None]
+        with self.assertLogs('polls.indexing.realtime', level='ERROR'):
+            queue.put(3, 'index')
+            for _ in range(100):
+                if process.call_count == 2:
+                    break
+                time.sleep(0.05)
+        self.assertEqual([call.args for call in process.call_args_list], [({3: 'index'},), ({3: 'index'},)])
+
+
+    def test_index_queue_backs_off_and_drops_failures(self):
+        """
+        Tests that the IndexQueue retries failed batches with a growing delay and drops what keeps failing.
+
+        A batch failing every time must be sent `retries + 1` times, each attempt waiting longer than
+        the previous one, then dropped. The documents rejected by Elasticsearch must be dropped at once,
+        and the other operations of their batch sent again.
+        """
+        calls = []
+        process = MagicMock(side_effect=lambda operations: calls.append(time.perf_counter()) or 1 / 0)
+        queue = IndexQueue(delay=0.02, process=process, retries=2)
+        with self.assertLogs('polls.indexing.realtime', level='ERROR') as logs:
+            queue.put(1, 'index')
+            time.sleep(0.6)
+        self.assertEqual(process.call_count, 3)
+        self.assertGreater(calls[2] - calls[1], calls[1] - calls[0])
+        self.assertIn("Dropped the indexing of articles [1]", logs.output[-1])
+        self.assertEqual((queue.pending, queue.attempts, queue.failures), ({}, {}, 2))
+        rejected = BulkIndexError("1 document(s) failed to index.", [{'index': {'_id': '4', 'status': 400}}])
+        process.reset_mock(side_effect=True)
+        process.side_effect = [rejected, None]
+        queue = IndexQueue(delay=0.02, process=process, retries=2)
+        with self.assertLogs('polls.indexing.realtime', level='ERROR'):
+            queue.put(4, 'index')
+            queue.put(5, 'index')
+            for _ in range(100):
+                if process.call_count == 2:
+                    break
+                time.sleep(0.05)
+        self.assertEqual([call.args for call in process.call_args_list], [({4: 'index', 5: 'index'},), ({5: 'index'},)])
+
+
+    @patch('polls.indexing.embeddings.model.encode')
+    @patch('polls.indexing.realtime.bulk')
+    @patch('polls.indexing.realtime.get_connection')
+    def test_sync_articles_indexes_and_deletes(self, mock_connection, mock_bulk, mock_encode):
+        """
+        Tests that sync_articles indexes the saved articles and deletes the others from the index.
+
+        An article to index is sent with its vector, while a near-duplicate, a deleted article and an
+        article which no longer exists are sent as deletions, ignoring the documents already missing.
+        Nothing is written to the embedding store, whose only writers are the indexing commands.
+        """
+        original = Article.objects.create(title="Multiple sclerosis", abstract="An abstract.", pmid=1)
+        duplicate = Article.objects.create(title="Multiple sclerosis", abstract="An abstract!", pmid=2, duplicate_of=original)
+        mock_encode.side_effect = lambda texts, batch_size: np.ones((len(texts), 768))
+        with tempfile.TemporaryDirectory() as tmp, override_settings(EMBEDDING_CACHE_DIR=tmp):
+            sent = sync_articles({original.id: 'index', duplicate.id: 'index', 999: 'index', 998: 'delete'}, index="articles")
+            self.assertEqual(list(Path(tmp).iterdir()), [])
+        self.assertEqual(sent, 4)
+        [(client, actions), kwargs] = mock_bulk.call_args
+        self.assertEqual(client, mock_connection.return_value)
+        self.assertEqual(kwargs, {'ignore_status': (404,)})
+        self.assertEqual([(action['_op_type'], action['_id']) for action in actions],
+                         [('index', original.id), ('delete', duplicate.id), ('delete', 999), ('delete', 998)])
+        self.assertEqual(actions[0]['_source']['title'], "Multiple sclerosis")
+
+
+    def test_article_writes_queue_index_updates(self):
+        """
+        Tests that saving and deleting an article queue its index updates once committed.
+        """
+        with patch.object(index_queue, 'put') as put:
+            with self.captureOnCommitCallbacks(execute=True):
+                article = Article.objects.create(title="Multiple sclerosis", abstract="An abstract.", pmid=1)
+            pk = article.pk
+            put.assert_called_once_with(pk, 'index')
+            with self.captureOnCommitCallbacks(execute=True):
+                article.delete()
+            put.assert_called_with(pk, 'delete')
+
+
+    @patch('polls.indexing.versions.scan')
+    @patch('polls.indexing.versions.sync_articles')
+    @patch('polls.indexing.versions.bulk_index_articles')
+    @patch('polls.indexing.versions.article_index')
+    @patch('polls.indexing.versions.get_connection')
+    @patch('polls.indexing.embeddings.model.encode')
+    def test_reindex_swaps_alias_and_collects_old_versions(self, mock_encode, mock_connection, mock_index, mock_bulk, mock_sync, mock_scan):
+        """
+        Tests that reindex_articles builds a new version, swaps the alias to it and deletes the old versions.
+
+        With versions 1 and 2, the alias reading version 2, a reindex must create version 3, point the
+        alias to it alone and delete version 1, then delete from it the document of an article deleted
+        during the build. A new version holding fewer documents than indexed must be deleted without
+        touching the alias.
+        """
+        articles = [Article.objects.create(title=f"Article {pmid}", abstract="An abstract.", pmid=pmid) for pmid in [1, 2]]
+        indices = {"medical-articles-v1", "medical-articles-v2"}
+        alias = {"medical-articles-v2"}
+
+        def update_aliases(actions):
+            for action in actions:
+                if 'add' in action:
+                    alias.add(action['add']['index'])
+                elif 'remove' in action:
+                    alias.discard(action['remove']['index'])
+
+        client = mock_connection.return_value
+        client.indices.get.side_effect = lambda index: dict.fromkeys(indices, {})
+        client.indices.exists.side_effect = lambda index: index in indices or (index == "medical-articles" and bool(alias))
+        client.indices.exists_alias.side_effect = lambda name: bool(alias)
+        client.indices.get_alias.side_effect = lambda name: dict.fromkeys(alias, {})
+        client.indices.update_aliases.side_effect = update_aliases
+        client.indices.delete.side_effect = lambda index, **kwargs: indices.discard(index)
+        client.count.return_value = {'count': 2}
+        client.search.return_value = {'hits': {'hits': [{'_id': str(article.id)} for article in articles]}}
+        mock_index.clone.side_effect = lambda name: MagicMock(create=lambda using: indices.add(name))
+        mock_bulk.return_value = 2
+        mock_scan.return_value = [{'_id': str(article.id)} for article in articles] + [{'_id': "999"}]
+        mock_encode.side_effect = lambda texts, batch_size: np.ones((len(texts), 768))
+        with tempfile.TemporaryDirectory() as tmp, override_settings(EMBEDDING_CACHE_DIR=tmp):
+            self.assertEqual(reindex_articles(), "medical-articles-v3")
+            self.assertEqual(alias, {"medical-articles-v3"})
+            self.assertEqual(indices, {"medical-articles-v2", "medical-articles-v3"})
+            mock_bulk.assert_called_once_with(index="medical-articles-v3", progress=ANY, workers=None)
+            mock_sync.assert_called_once_with({999: 'delete'}, index="medical-articles-v3")
+            mock_bulk.return_value = 3
+            with self.assertRaises(ValueError):
+                reindex_articles()
+        self.assertEqual(alias, {"medical-articles-v3"})
+        self.assertEqual(indices, {"medical-articles-v2", "medical-articles-v3"})
+
+
+class InferenceTest(TestCase):
+    def test_pool_matches_sentence_transformers_pooling(self):
+        """
+        Tests that pool averages the token embeddings of the attention mask, or keeps the CLS token.
+
+        The padding tokens of the second text must not change its mean embedding, and the normalized
+        embeddings must have unit length.
+        """
+        hidden = np.array([[[1, 2], [3, 4], [5, 6]], [[2, 0], [4, 2], [100, 100]]], dtype=np.float32)
+        mask = np.array([[1, 1, 1], [1, 1, 0]])
+        np.testing.assert_allclose(pool(hidden, mask, 'mean'), [[3, 4], [3, 1]])
+        np.testing.assert_allclose(pool(hidden, mask, 'cls'), [[1, 2], [2, 0]])
+        np.testing.assert_allclose(np.linalg.norm(pool(hidden, mask, 'mean', normalize=True), axis=1), [1, 1], rtol=1e-6)
+        with override_settings(INFERENCE_BACKEND='tensorflow'), self.assertRaises(ImproperlyConfigured):
+            load_encoder("microsoft/model")
+
+    def test_parity_detects_diverging_models(self):
+        """
+        Tests that the parity check accepts a slightly perturbed model and rejects a diverging one.
+
+        A reference encoder and cross-encoder are compared with copies adding small noise, which must
+        keep the neighbours and the top documents, then with a cross-encoder reversing the scores,
+        which validate_parity must reject.
+        """
+        rng = np.random.default_rng(0)
+        table = {text: rng.normal(size=16) for text in [f"text {i}" for i in range(30)]}
+        reference = MagicMock(encode=lambda texts: np.array([table[text] for text in texts]))
+        noisy = MagicMock(encode=lambda texts: reference.encode(texts) + 0.01 * rng.normal(size=(len(texts), 16)))
+        report = encoder_parity(reference, noisy, list(table))
+        self.assertGreater(report['cosine_min'], 0.99)
+        self.assertGreater(report['neighbour_overlap'], 0.95)
+        scores = MagicMock(predict=lambda pairs: np.array([float(document.split()[1]) for _, document in pairs]))
+        close = MagicMock(predict=lambda pairs: scores.predict(pairs) + 0.01)
+        reversed_scores = MagicMock(predict=lambda pairs: -scores.predict(pairs))
+        queries, documents = ["query 1", "query 2"], list(table)[:10]
+        parity = reranker_parity(scores, close, queries, documents)
+        self.assertEqual(parity['top_overlap'], 1.0)
+        self.assertAlmostEqual(parity['rank_correlation'], 1.0)
+        self.assertAlmostEqual(parity['score_error'], 0.01, places=5)
+        validate_parity({**report, **parity})
+        with self.assertRaises(ValueError):
+            validate_parity({**report, **reranker_parity(scores, reversed_scores, queries, documents)})
@@ -147,7 +147,7 @@ def article_list(request):
     :param request: The request object
     :return: A rendered template with the paginated list of articles
     """
-    articles = ArticlesWithAuthors.objects.all()
+    articles = ArticlesWithAuthors.objects.order_by('id')
     paginator = Paginator(articles, 3)
     page_number = request.GET.get('page', 1)
     page_obj = paginator.get_page(page_number)
@@ -26,11 +26,124 @@ EXPORT_JSON_DIR = os.path.join(BASE_DIR, 'data/json')
 if not os.path.exists(EXPORT_JSON_DIR):
     os.makedirs(EXPORT_JSON_DIR)
 
+EXPORT_CSV_DIR = os.path.join(BASE_DIR, 'data/csv')
+
+if not os.path.exists(EXPORT_CSV_DIR):
+    os.makedirs(EXPORT_CSV_DIR)
+
+CRAWL_STATE_DIR = os.path.join(BASE_DIR, 'data/crawl_state')
+
+if not os.path.exists(CRAWL_STATE_DIR):
+    os.makedirs(CRAWL_STATE_DIR)
+
 RAG_JSON_DIR = os.path.join(BASE_DIR, 'polls/rag_evaluation/data/json')
 
 if not os.path.exists(RAG_JSON_DIR):
     os.makedirs(RAG_JSON_DIR)
 
+# Scraper politeness budget: NCBI allows 3 requests per second without an API key
+SCRAPER_CONCURRENCY = int(os.getenv('SCRAPER_CONCURRENCY', 8))
+SCRAPER_RATE_LIMIT = float(os.getenv('SCRAPER_RATE_LIMIT', 3))
+SCRAPER_FLUSH_EVERY = int(os.getenv('SCRAPER_FLUSH_EVERY', 50))
+
+# On-disk HTTP cache of the scraped article pages, revalidated once older than the TTL (in seconds); the
+# search result pages are never cached
+SCRAPER_CACHE_ENABLED = os.getenv('SCRAPER_CACHE_ENABLED', 'True') == 'True'
+SCRAPER_CACHE_DIR = os.path.join(BASE_DIR, 'data/http_cache')
+SCRAPER_CACHE_TTL = float(os.getenv('SCRAPER_CACHE_TTL', 7 * 24 * 3600))
+SCRAPER_CACHE_MAX_BYTES = int(os.getenv('SCRAPER_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+
+# Raw page archive (zstd frames indexed by PMID), replayed by the extractor in worker processes
+SCRAPER_ARCHIVE_PAGES = os.getenv('SCRAPER_ARCHIVE_PAGES', 'False') == 'True'
+ARCHIVE_DIR = os.path.join(BASE_DIR, 'data/archive')
+ARCHIVE_ZSTD_LEVEL = int(os.getenv('ARCHIVE_ZSTD_LEVEL', 10))
+REPLAY_WORKERS = int(os.getenv('REPLAY_WORKERS', os.cpu_count() or 1))
+REPLAY_CHUNK_SIZE = int(os.getenv('REPLAY_CHUNK_SIZE', 200))
+
+# PubMed E-utilities: an API key raises the NCBI limit to 10 requests per second
+NCBI_API_KEY = os.getenv('NCBI_API_KEY')
+EFETCH_BATCH_SIZE = int(os.getenv('EFETCH_BATCH_SIZE', 200))
+ESEARCH_MAX_RESULTS = 9999
+
+# Incremental crawls start from the last crawl of each term, or from this date for a new term.
+# PubMed shows at most 10,000 results per search, so larger date windows are split.
+CRAWL_START_DATE = os.getenv('CRAWL_START_DATE', '2025-01-01')
+CRAWL_MAX_RESULTS = 10000
+
+# Number of articles saved per transaction by the ingestion. The 'copy' method streams
+# the batches through PostgreSQL COPY and staging tables instead of the ORM.
+INGEST_METHOD = os.getenv('INGEST_METHOD', 'orm')
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', 1000))
+COPY_BATCH_SIZE = int(os.getenv('COPY_BATCH_SIZE', 20000))
+# Processes of `commands article_to_database --workers N`; JSONL files are split in ranges of INGEST_SHARD_BYTES
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', 1))
+INGEST_SHARD_BYTES = int(os.getenv('INGEST_SHARD_BYTES', 64 * 1024 * 1024))
+
+# Near-duplicate abstracts: MinHash signatures of word shingles, split in LSH bands. With 16 bands
+# of 8 rows, abstracts with a 0.8 Jaccard similarity share a bucket with a probability of 0.95,
+# and abstracts with a 0.5 similarity with a probability of 0.06.
+MINHASH_ENABLED = os.getenv('MINHASH_ENABLED', 'True') == 'True'
+MINHASH_PERMUTATIONS = 128
+MINHASH_BANDS = 16
+MINHASH_SHINGLE_SIZE = 3
+MINHASH_THRESHOLD = float(os.getenv('MINHASH_THRESHOLD', 0.8))
+
+# Terms ingested into the database and their input files. Each pattern is a glob relative to
+# INGEST_INPUT_DIR where {term} is replaced by the term; the first pattern matching files wins.
+INGEST_INPUT_DIR = os.path.join(BASE_DIR, 'data')
+INGEST_TERMS = os.getenv('INGEST_TERMS', 'multiple_sclerosis_2024,herpes_zoster_2024').split(',')
+INGEST_PATTERNS = os.getenv('INGEST_PATTERNS', 'json/{term}.jsonl,json/{term}.json,csv/{term}.csv,parquet/{term}.parquet').split(',')
+
+# Memory budget of the process-level cache of author and affiliation ids (about 400 bytes per name)
+NAME_CACHE_MAX_BYTES = int(os.getenv('NAME_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+# Seconds between a write to the articles and the refresh of the ArticlesWithAuthors view it triggers.
+# 'off' disables these refreshes, e.g. when `commands article_full_to_database` is run on a schedule.
+ARTICLES_REFRESH_DELAY = None if os.getenv('ARTICLES_REFRESH_DELAY') == 'off' else float(os.getenv('ARTICLES_REFRESH_DELAY', 5))
+
+# `commands index_articles` reads and encodes the articles by chunks of INDEX_CHUNK_SIZE, with
+# INDEX_ENCODE_BATCH_SIZE texts per forward pass, and sends them to Elasticsearch in bulk
+# requests of INDEX_BULK_CHUNK_SIZE documents from INDEX_BULK_THREADS threads.
+INDEX_CHUNK_SIZE = int(os.getenv('INDEX_CHUNK_SIZE', 2000))
+INDEX_ENCODE_BATCH_SIZE = int(os.getenv('INDEX_ENCODE_BATCH_SIZE', 64))
+INDEX_BULK_CHUNK_SIZE = int(os.getenv('INDEX_BULK_CHUNK_SIZE', 500))
+INDEX_BULK_THREADS = int(os.getenv('INDEX_BULK_THREADS', 4))
+# Encoding processes of `commands index_articles --workers N`, each running the inference backend with
+# INDEX_TORCH_THREADS threads; 0 shares the cores between the processes
+INDEX_WORKERS = int(os.getenv('INDEX_WORKERS', 1))
+INDEX_TORCH_THREADS = int(os.getenv('INDEX_TORCH_THREADS', 0))
+
+# `commands reindex` builds a new version of the article index, checked on the nearest neighbours
+# of INDEX_SMOKE_SAMPLE random articles before the alias is swapped, and keeps INDEX_KEEP_VERSIONS versions
+INDEX_SMOKE_SAMPLE = int(os.getenv('INDEX_SMOKE_SAMPLE', 20))
+INDEX_MIN_RECALL = float(os.getenv('INDEX_MIN_RECALL', 0.9))
+INDEX_KEEP_VERSIONS = int(os.getenv('INDEX_KEEP_VERSIONS', 2))
+
+# Seconds between a write to an article and the batch of Elasticsearch updates it triggers, which
+# gathers the writes of these seconds. 'off' disables these updates.
+INDEX_REALTIME_DELAY = None if os.getenv('INDEX_REALTIME_DELAY') == 'off' else float(os.getenv('INDEX_REALTIME_DELAY', 2))
+# Failed batches sent again before their articles are dropped until the next reindex, after a delay
+# doubling with each failure
+INDEX_REALTIME_RETRIES = int(os.getenv('INDEX_REALTIME_RETRIES', 5))
+
+# Embeddings stored by model, inference backend and hash of the encoded text, so that reindexing
+# only encodes new or edited texts; queries are encoded directly and never written to the store
+EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE_ENABLED', 'True') == 'True'
+EMBEDDING_CACHE_DIR = os.path.join(BASE_DIR, 'data/embeddings')
+
+# Synthetic corpora of `commands generate_corpus` and results of `commands benchmark_ingestion`
+BENCHMARK_DIR = os.path.join(BASE_DIR, 'data/benchmark')
+
+# Inference backend of the embedding model and the reranker: 'torch', or 'onnx' for the int8 ONNX Runtime
+# models exported by `commands export_onnx` in ONNX_MODEL_DIR; INFERENCE_THREADS 0 uses every core
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'torch')
+INFERENCE_THREADS = int(os.getenv('INFERENCE_THREADS', 0))
+ONNX_MODEL_DIR = os.path.join(BASE_DIR, 'data/onnx')
+# Articles compared by the parity check of the export, and minimum agreement with the PyTorch models
+ONNX_PARITY_SAMPLE = int(os.getenv('ONNX_PARITY_SAMPLE', 200))
+ONNX_MIN_COSINE = float(os.getenv('ONNX_MIN_COSINE', 0.98))
+ONNX_MIN_OVERLAP = float(os.getenv('ONNX_MIN_OVERLAP', 0.8))
+
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'rag_articles'  
 LOGOUT_REDIRECT_URL = 'login'  